@@ -0,0 +1,618 @@
+############################################################################################
+# Asyncio backend for main.py: the same lookups driven from one thread with httpx
+# Every fetch runs as a task on a single event loop, so thousands of lookups (a whole-account
+# crawl, many users' permissions) can be in flight without a thread each. Requests are bounded
+# by ASYNC_CONCURRENCY and go through main.py's rate limiters, retries, token refresh rules,
+# policy cache and request instrumentation, so results and --profile output match the threads.
+#
+# Run:   python main.py --backend async who-has --permission storage:logs:read
+# Use:   async with AsyncIamClient() as client:
+#            result = await client.get_user_permissions(ACCOUNT_ID, ENVIRONMENT_ID, "user@example.com")
+# Needs: pip install httpx
+############################################################################################
+import asyncio
+import json
+import sys
+import time
+
+import main
+from main import ApiRequestError, log
+
+try:
+    import httpx  # Optional: only needed for the async backend
+except ImportError:
+    httpx = None
+
+# Subcommands the async backend runs; the others only exist on the threaded backend
+ASYNC_COMMANDS = ["user-permissions", "group-users", "group-policies", "group-lookup", "policies", "policy", "check", "who-has"]
+
+
+############################################################################################
+## Token manager: one token per account, refreshed single-flight shortly before expiry or on a 401
+############################################################################################
+class AsyncTokenManager:
+    """Access tokens of AsyncIamClient, one per account, fetched on first use.
+
+    There is no refresh thread: a token is renewed when a request finds it within
+    TOKEN_REFRESH_MARGIN of expiry, or after a 401. While one task refreshes an account's
+    token, the others wait for it instead of calling SSO themselves.
+    """
+
+    def __init__(self, client, credentials=None):
+        self.client = client
+        self.credentials = credentials or {}  # account_id -> (client_id, client_secret); CLIENT_ID/SECRET otherwise
+        self.tokens = {}  # account_id -> {"token", "expires_at"}
+        self.locks = {}
+
+    async def get(self, account_id):
+        """Return the account's current token, fetching or refreshing it first if needed."""
+        state = self.tokens.get(account_id)
+        if state and time.time() < state["expires_at"] - main.TOKEN_REFRESH_MARGIN:
+            return state["token"]
+        return await self.refresh(account_id, state["token"] if state else None)
+
+    async def refresh(self, account_id, stale_token=None):
+        """Replace `stale_token` with a new token, unless another task already did. Raises ApiRequestError on failure."""
+        lock = self.locks.setdefault(account_id, asyncio.Lock())
+        async with lock:
+            state = self.tokens.get(account_id)
+            if state and state["token"] != stale_token and time.time() < state["expires_at"] - main.TOKEN_REFRESH_MARGIN:
+                return state["token"]
+
+            if stale_token:
+                log(f"\nRefreshing Access Token for account {account_id}...\n")
+            client_id, client_secret = self.credentials.get(account_id, (main.CLIENT_ID, main.CLIENT_SECRET))
+            response = await self.client.request(
+                "POST", main.SSO_TOKEN_URL, headers={"content-type": "application/x-www-form-urlencoded"},
+                data=main.get_token_request_data(client_id, client_secret, account_id)
+            )
+            if response.status_code != 200:
+                raise ApiRequestError(response)
+
+            token_data = response.json()
+            self.tokens[account_id] = {
+                "token": token_data.get("access_token"),
+                "expires_at": time.time() + int(token_data.get("expires_in", 300)),
+            }
+            return self.tokens[account_id]["token"]
+
+
+############################################################################################
+## Client: httpx connection pool, concurrency bound and the retry loop of main.api_request
+############################################################################################
+class AsyncIamClient:
+    """Async counterpart of main.py's library API, one instance per event loop.
+
+    Methods take the same arguments as the main.py functions of the same name, without the
+    access token (tokens are per account, see AsyncTokenManager) and without offline mode
+    (the async backend always asks the live API). Functions that main.py calls without an
+    account (policies, bindings) take an optional `account_id` for the token, default ACCOUNT_ID.
+    """
+
+    def __init__(self, credentials=None, concurrency=None):
+        if httpx is None:
+            raise ValueError("httpx is not installed. To use the async backend, run: pip install httpx")
+        self.concurrency = concurrency or main.ASYNC_CONCURRENCY
+        self.http = httpx.AsyncClient(
+            verify=False, timeout=main.REQUEST_TIMEOUT, headers={"accept": "application/json"},
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        )
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.lanes = list(range(self.concurrency, 0, -1))  # Free connection slots, the trace rows of --trace-file
+        self.tokens = AsyncTokenManager(self, credentials)
+        self.in_flight = {}  # Key -> task shared by concurrent lookups of one policy, group list or index
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the connection pool."""
+        await self.http.aclose()
+
+    async def request(self, method, url, account_id=None, headers=None, **kwargs):
+        """Send a request like main.api_request, adding the bearer token of `account_id` when one is given.
+
+        At most `concurrency` requests are on the wire at once. Waiting for a free slot counts as
+        wait time in the request record. Retries, backoff and the 401 refresh follow api_request.
+        """
+        details = {"retries": 0, "wait": 0.0, "server": 0.0, "refreshed": False}
+        started_at = time.monotonic()
+        try:
+            response = await self.send(method, url, account_id, headers, details, **kwargs)
+        except Exception as e:
+            main.record_request(method, url, e.__class__.__name__, 0, time.monotonic() - started_at, details)
+            if isinstance(e, httpx.TransportError):
+                raise ApiRequestError(error=e) from e
+            raise
+        main.record_request(method, url, response.status_code, len(response.content), time.monotonic() - started_at, details)
+        return response
+
+    async def send(self, method, url, account_id, headers, details, **kwargs):
+        """The retry loop of request, as main.send_api_request with asyncio sleeps."""
+        request_headers = dict(headers or {})
+        endpoint = main.get_endpoint_name(url)
+        limiters = main.get_request_limiters(endpoint, account_id or main.ACCOUNT_ID)
+
+        attempt = 0
+        while True:
+            details["retries"] = attempt
+            waiting_since = time.monotonic()
+            for limiter in limiters:
+                wait = limiter.try_acquire()
+                while wait:
+                    await asyncio.sleep(wait)
+                    wait = limiter.try_acquire()
+
+            sent_token = None
+            if account_id:
+                sent_token = await self.tokens.get(account_id)
+                request_headers["Authorization"] = f"Bearer {sent_token}"
+
+            async with self.semaphore:
+                details["wait"] += time.monotonic() - waiting_since
+                lane = self.lanes.pop()
+                details["lane"] = lane
+                try:
+                    response = await self.http.request(method, url, headers=request_headers, **kwargs)
+                except httpx.TransportError as e:
+                    if method != "GET" or attempt == main.MAX_RETRIES:
+                        raise
+                    response = None
+                    error = e
+                finally:
+                    self.lanes.append(lane)
+
+            if response is None:
+                delay = main.get_retry_delay(attempt)
+                log(f"\n Connection error on {endpoint} request ({error.__class__.__name__}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                details["wait"] += delay
+                attempt += 1
+                continue
+            details["server"] += response.elapsed.total_seconds()
+
+            # Token expired or was revoked mid-operation: refresh once (single-flight) and resend
+            if response.status_code == 401 and sent_token and not details["refreshed"]:
+                details["refreshed"] = True
+                try:
+                    await self.tokens.refresh(account_id, sent_token)
+                    continue
+                except ApiRequestError as e:
+                    log(f"\nFailed to refresh token. {e}\n")
+
+            retryable = response.status_code == 429 or (response.status_code >= 500 and method == "GET")
+            if not retryable or attempt == main.MAX_RETRIES:
+                return response
+
+            delay = main.get_retry_delay(attempt, response.headers.get("Retry-After"))
+            if response.status_code == 429:
+                # Back off every task (and thread) using this endpoint, not just the one that was throttled
+                # (only this endpoint's bucket: other endpoints keep their own budgets)
+                limiters[-1].pause(delay)
+            log(f"\n {endpoint} request returned {response.status_code}, retrying in {delay:.1f}s ({attempt + 1}/{main.MAX_RETRIES})...")
+            await asyncio.sleep(delay)
+            details["wait"] += delay
+            attempt += 1
+
+    async def run_once(self, key, compute):
+        """Await compute() once for all concurrent callers with the same key. Failures are not kept."""
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # A cancelled caller must not cancel the lookup the other callers are waiting for
+        return await asyncio.shield(task)
+
+    ########################################################################################
+    ## Data helpers: users, groups and policies
+    ########################################################################################
+    async def fetch_user_groups(self, account_id, email):
+        """Return the groups ({uuid, groupName}) a user is a member of, or None if the user does not exist."""
+        encoded_email = email.replace("@", "%40")  # Encoding '@' for API URL
+        url = f"{main.API_BASE_URL}/iam/v1/accounts/{account_id}/users/{encoded_email}"
+        response = await self.request("GET", url, account_id)
+
+        if response.status_code == 200:
+            return main.sort_user_groups(response.json().get("groups", []))
+        if response.status_code == 404:
+            return None
+        raise ApiRequestError(response)
+
+    async def iter_api_items(self, url, items_key, params=None, account_id=None):
+        """Yield the items of a list endpoint page by page, following nextPageKey. Raises ApiRequestError if a page fails."""
+        params = dict(params or {})
+        if main.PAGE_SIZE and "nextPageKey" not in params:
+            params["pageSize"] = main.PAGE_SIZE
+
+        while True:
+            response = await self.request("GET", url, account_id or main.ACCOUNT_ID, params=params)
+            if response.status_code != 200:
+                raise ApiRequestError(response)
+
+            page = response.json()
+            for item in page.get(items_key, []):
+                yield item
+
+            next_page_key = page.get("nextPageKey")
+            if not next_page_key:
+                return
+            # Dynatrace list APIs expect only the page key on follow-up requests
+            params = {"nextPageKey": next_page_key}
+
+    async def fetch_group_users(self, account_id, group_id):
+        """Return all users of a group."""
+        url = f"{main.API_BASE_URL}/iam/v1/accounts/{account_id}/groups/{group_id}/users"
+        return [user async for user in self.iter_api_items(url, "items", account_id=account_id)]
+
+    async def fetch_groups(self, account_id):
+        """Return every group in the account."""
+        url = f"{main.API_BASE_URL}/iam/v1/accounts/{account_id}/groups"
+        return [group async for group in self.iter_api_items(url, "items", account_id=account_id)]
+
+    async def fetch_policies(self, level_type, level_id, policy_name=None, account_id=None):
+        """Return the policies defined at a level (optionally filtered by name)."""
+        if level_type == "global":
+            url = f"{main.API_BASE_URL}/iam/v1/repo/global/global/policies"
+        else:
+            url = f"{main.API_BASE_URL}/iam/v1/repo/{level_type}/{level_id}/policies"
+
+        params = {"name": policy_name} if policy_name else None
+        return [policy async for policy in self.iter_api_items(url, "policies", params, account_id)]
+
+    async def get_policy(self, level_type, level_id, policy_uuid, account_id=None):
+        """Return a policy definition from main.py's policy cache, downloading it once if it is missing or stale.
+
+        Returns None if the policy does not exist.
+        """
+        key = (level_type, level_id, policy_uuid)
+        with main.policy_cache_lock:
+            cached = main.get_cached_policy(key)
+        if cached is not None:
+            return cached
+        return await self.run_once(("policy",) + key, lambda: self.download_policy(key, account_id))
+
+    async def download_policy(self, key, account_id):
+        """Fetch one policy definition into main.py's policy cache."""
+        url = main.get_policy_url(*key)
+        if not url:
+            return None
+        response = await self.request("GET", url, account_id or main.ACCOUNT_ID)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise ApiRequestError(response)
+
+        policy_data = response.json()
+        with main.policy_cache_lock:
+            main.cache_policy(key, policy_data)
+        return policy_data
+
+    async def get_permissions_for_policy(self, policy_uuid, level_type, level_id, account_id, environment_id):
+        """Return a policy's permission rows (PermissionRow records), [] if it was not found, None for an unknown level."""
+        level_id = main.get_policy_level_id(level_type, level_id, account_id, environment_id)
+        if level_id is None:
+            return None
+
+        policy_data = await self.get_policy(level_type, level_id, policy_uuid, account_id)
+        if not policy_data:
+            log(f"\n Policy {policy_uuid} ({level_type}) was not found, skipping its permissions.\n")
+            return []
+        return main.get_policy_permission_rows(policy_data, policy_uuid, level_type, level_id)
+
+    ########################################################################################
+    ## Bindings and group directory
+    ########################################################################################
+    async def get_group_bindings_for_scope(self, scope, group_id, account_id=None):
+        """Return the policy bindings of a group for one scope (global, account/<id> or environment/<id>)."""
+        url = f"{main.API_BASE_URL}/iam/v1/repo/{scope}/bindings/groups/{group_id}?details=true"
+        response = await self.request("GET", url, account_id or main.ACCOUNT_ID)
+        if response.status_code != 200:
+            raise ApiRequestError(response)
+        return [main.compact_binding(binding) for binding in response.json().get("bindingsDetails", [])]
+
+    async def get_group_bindings_cached(self, scope, group_id, binding_cache=None, account_id=None):
+        """Like get_group_bindings_for_scope, but memoised in `binding_cache` (scope, group_id) -> task."""
+        if binding_cache is None:
+            return await self.get_group_bindings_for_scope(scope, group_id, account_id)
+
+        key = (scope, group_id)
+        task = binding_cache.get(key)
+        if task is None:
+            task = binding_cache[key] = asyncio.ensure_future(self.get_group_bindings_for_scope(scope, group_id, account_id))
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            # Waiting lookups get the error, later ones try again
+            if binding_cache.get(key) is task:
+                binding_cache.pop(key)
+            raise
+
+    async def load_group_directory(self, account_id, refresh=False):
+        """Return main.py's cached group directory of an account, downloading the group list if it is stale."""
+        with main.group_directory_lock:
+            directory = main.group_directories.get((account_id, False))
+        if not refresh and directory is not None and time.time() - directory["loaded_at"] < main.GROUP_DIRECTORY_TTL:
+            return directory
+        return await self.run_once(("groups", account_id), lambda: self.download_group_directory(account_id))
+
+    async def download_group_directory(self, account_id):
+        """Fetch the group list into main.py's group directory cache."""
+        directory = main.build_group_directory(await self.fetch_groups(account_id))
+        with main.group_directory_lock:
+            main.group_directories[(account_id, False)] = directory
+        return directory
+
+    async def resolve_group_id(self, account_id, value):
+        """Resolve a group UUID or name to a group UUID, or None if no group matches."""
+        if not value:
+            return None
+        if main.UUID_PATTERN.match(value):
+            return value
+
+        try:
+            directory = await self.load_group_directory(account_id)
+        except ApiRequestError:
+            return value  # Could not load the group list, let the caller try the value as an ID
+
+        group = main.find_group(directory, value)
+        return group.get("uuid") if group else None
+
+    ########################################################################################
+    ## Library API: Options 2-5, 7 and 8
+    ########################################################################################
+    async def get_user_permissions(self, account_id, environment_id, email, binding_cache=None):
+        """Option 2: return {"email", "groups", "permissions"} for a user, or None if the user does not exist."""
+        groups = await self.fetch_user_groups(account_id, email)
+        if groups is None:
+            return None
+
+        rows = await self.resolve_user_permissions(account_id, environment_id, groups, binding_cache) if groups else []
+        return {"email": email, "groups": groups, "permissions": main.as_dicts(rows)}
+
+    async def resolve_user_permissions(self, account_id, environment_id, groups, binding_cache=None):
+        """Return the permission rows granted through a user's groups, in group/scope/binding order."""
+        bindings = await self.resolve_user_bindings(account_id, environment_id, groups, binding_cache)
+        results = await asyncio.gather(*(
+            self.get_permissions_for_policy(
+                binding["policyUuid"], binding["levelType"], binding["levelId"], account_id, environment_id
+            )
+            for binding in bindings
+        ))
+        return [row for rows in results for row in rows or []]
+
+    async def resolve_user_bindings(self, account_id, environment_id, groups, binding_cache=None):
+        """Return the policy bindings of a user's groups for all three scopes, in group/scope order."""
+        scopes = main.get_policy_scopes(account_id, environment_id)
+        results = await asyncio.gather(*(
+            self.get_group_bindings_cached(scope, group["uuid"], binding_cache, account_id)
+            for group in groups
+            for scope in scopes
+        ))
+        return [binding for bindings in results for binding in bindings]
+
+    async def list_group_users(self, account_id, group):
+        """Option 3: return the members of a group (UUID or name), or None if no group matches."""
+        group_id = await self.resolve_group_id(account_id, group)
+        if not group_id:
+            return None
+        return await self.fetch_group_users(account_id, group_id)
+
+    async def list_group_bindings(self, account_id, environment_id, group, binding_cache=None):
+        """Option 4: return a group's policy bindings (Global, Account, Environment order), or None if no group matches."""
+        group_id = await self.resolve_group_id(account_id, group)
+        if not group_id:
+            return None
+
+        results = await asyncio.gather(*(
+            self.get_group_bindings_cached(scope, group_id, binding_cache, account_id)
+            for scope in main.get_policy_scopes(account_id, environment_id)
+        ))
+        return [binding for bindings in results for binding in bindings]
+
+    async def lookup_group(self, account_id, query, refresh=False):
+        """Option 5: return the group whose UUID or name is `query`, or None."""
+        return main.find_group(await self.load_group_directory(account_id, refresh), query)
+
+    async def find_groups(self, account_id, text, limit=50, refresh=False):
+        """Option 5: return the groups whose name starts with (first) or contains `text`."""
+        return main.search_groups(await self.load_group_directory(account_id, refresh), text, limit)
+
+    async def list_policies(self, account_id, environment_id, scope="global", name=None):
+        """Option 7: return the policies defined at a scope (global, account or environment), optionally filtered by name."""
+        scope_path = main.get_scope_path(scope, account_id, environment_id)
+        if scope_path is None:
+            raise ValueError(f"Invalid scope '{scope}', expected global, account or environment")
+        return await self.fetch_policies(*main.parse_scope(scope_path), name, account_id)
+
+    async def get_policy_details(self, account_id, policy_id):
+        """Option 8: return an account-level policy definition, or None if it does not exist."""
+        return await self.get_policy("account", account_id, policy_id, account_id)
+
+    ########################################################################################
+    ## Options 12 and 13: permission checks and the account-wide reverse index
+    ########################################################################################
+    async def compile_permission_index(self, account_id, environment_id, bindings):
+        """Download the policies of `bindings` concurrently and compile them with main.index_grants."""
+        definitions = await asyncio.gather(*(
+            self.get_policy(
+                binding["levelType"],
+                main.get_policy_level_id(binding["levelType"], binding.get("levelId"), account_id, environment_id),
+                binding["policyUuid"], account_id
+            )
+            for binding in bindings
+        ))
+        return main.index_grants(bindings, definitions)
+
+    async def get_user_permission_index(self, account_id, environment_id, email, refresh=False):
+        """Return a user's compiled permission index from main.py's cache (USER_INDEX_TTL), or None if the user does not exist."""
+        key = (email.lower(), account_id, environment_id, False)
+        if not refresh:
+            with main.user_index_cache_lock:
+                index = main.get_cached_user_index(key)
+            if index is not None:
+                return index
+
+        groups = await self.fetch_user_groups(account_id, email)
+        if groups is None:
+            return None
+        bindings = await self.resolve_user_bindings(account_id, environment_id, groups)
+        index = await self.compile_permission_index(account_id, environment_id, bindings)
+
+        with main.user_index_cache_lock:
+            main.cache_user_index(key, index)
+        return index
+
+    async def check_user_permission(self, account_id, environment_id, email, permission, context=None):
+        """Option 12: the evaluate_permission result in `environment_id` (grants as dicts), or None if the user does not exist."""
+        index = await self.get_user_permission_index(account_id, environment_id, email)
+        if index is None:
+            return None
+        result = main.evaluate_permission(index, permission, environment_id, context)
+        return {**result, "grants": main.as_dicts(result["grants"])}
+
+    async def build_reverse_index(self, account_id, environment_id, refresh=False):
+        """Option 13: crawl every group's members and bindings at once into main.py's reverse index cache.
+
+        The result has the same shape as main.build_reverse_index, for main.find_permission_holders.
+        """
+        key = (account_id, environment_id, False)
+        with main.reverse_index_lock:
+            cached = main.reverse_indexes.get(key)
+        if cached and not refresh and time.time() - cached["built_at"] < main.REVERSE_INDEX_TTL:
+            return cached
+        return await self.run_once(("reverse",) + key, lambda: self.crawl_account(account_id, environment_id, refresh))
+
+    async def crawl_account(self, account_id, environment_id, refresh=False):
+        """Build and cache the reverse index of build_reverse_index."""
+        directory = await self.load_group_directory(account_id, refresh)
+        groups = directory["groups"]
+        scopes = main.get_policy_scopes(account_id, environment_id)
+        log(f"\n Crawling members and bindings of {len(groups)} groups...\n")
+
+        async def crawl_group(group):
+            users, *scope_bindings = await asyncio.gather(
+                self.fetch_group_users(account_id, group["uuid"]),
+                *(self.get_group_bindings_for_scope(scope, group["uuid"], account_id) for scope in scopes)
+            )
+            bindings = [{**binding, "groupUuid": group["uuid"]} for bindings in scope_bindings for binding in bindings]
+            return group["uuid"], users, bindings
+
+        users_by_uid = {}
+        group_members = {}
+        all_bindings = []
+        for group_uuid, users, bindings in await asyncio.gather(*(crawl_group(group) for group in groups)):
+            # A user in many groups is listed under one shared UID string
+            group_members[group_uuid] = [main.intern_text(user.get("uid")) for user in users]
+            for user in users:
+                users_by_uid.setdefault(main.intern_text(user.get("uid")), user)
+            all_bindings.extend(bindings)
+
+        reverse_index = {
+            "permission_index": await self.compile_permission_index(account_id, environment_id, all_bindings),
+            "groups": directory["by_uuid"],
+            "group_members": group_members,
+            "users": users_by_uid,
+            "built_at": time.time(),
+        }
+        with main.reverse_index_lock:
+            main.reverse_indexes[(account_id, environment_id, False)] = reverse_index
+        return reverse_index
+
+
+############################################################################################
+## Command line: main.py --backend async <command>
+############################################################################################
+async def run_command(args):
+    """Run a parsed main.py subcommand on the async backend (output as with the threaded backend). Returns the exit status."""
+    if args.command not in ASYNC_COMMANDS:
+        raise ValueError(f"'{args.command}' is not available with --backend async (use: {', '.join(ASYNC_COMMANDS)}).")
+    if getattr(args, "offline", False):
+        raise ValueError("--backend async works against the live API only (drop --offline).")
+    if getattr(args, "targets", None) or getattr(args, "environments", None):
+        raise ValueError("--targets and --environments run on the threaded backend only (drop --backend async).")
+
+    account_id, environment_id = main.ACCOUNT_ID, main.ENVIRONMENT_ID
+    async with AsyncIamClient() as client:
+        if args.command == "user-permissions":
+            if args.format:
+                groups = await client.fetch_user_groups(account_id, args.email)
+                if groups is None:
+                    print(f"User '{args.email}' was not found.", file=sys.stderr)
+                    return 1
+                rows = await client.resolve_user_permissions(account_id, environment_id, groups) if groups else []
+                main.write_output(args, (row._asdict() for row in rows), main.PERMISSION_FIELDS)
+                return 0
+
+            result = await client.get_user_permissions(account_id, environment_id, args.email)
+            if result is None:
+                print(f"User '{args.email}' was not found.", file=sys.stderr)
+                return 1
+            print(json.dumps(result))
+            return 0
+
+        if args.command in ("group-users", "group-policies"):
+            group_id = await client.resolve_group_id(account_id, args.group)
+            if not group_id:
+                print(f"No group found with ID or Name '{args.group}'.", file=sys.stderr)
+                return 1
+            if args.command == "group-users":
+                main.write_output(args, await client.fetch_group_users(account_id, group_id), main.USER_FIELDS)
+            else:
+                main.write_output(args, await client.list_group_bindings(account_id, environment_id, group_id), main.BINDING_FIELDS)
+            return 0
+
+        if args.command == "group-lookup":
+            if args.search is not None:
+                for group in await client.find_groups(account_id, args.search, args.limit, args.refresh):
+                    print(json.dumps(group))
+                return 0
+            group = await client.lookup_group(account_id, args.query, args.refresh)
+            if group is None:
+                print(f"No group found with ID or Name '{args.query}'.", file=sys.stderr)
+                return 1
+            print(json.dumps(group))
+            return 0
+
+        if args.command == "policies":
+            main.write_output(args, await client.list_policies(account_id, environment_id, args.scope, args.name), main.POLICY_FIELDS)
+            return 0
+
+        if args.command == "policy":
+            policy = await client.get_policy_details(account_id, args.id)
+            if policy is None:
+                print(f"Policy '{args.id}' was not found.", file=sys.stderr)
+                return 1
+            print(json.dumps(policy))
+            return 0
+
+        if args.command == "check":
+            # Same exit status as the threaded check: 0 ALLOW, 1 DENY/NOT_ALLOWED, 2 CONDITIONAL, 3 lookup failed
+            environment_id = args.environment or environment_id
+            index = await client.get_user_permission_index(account_id, environment_id, args.email)
+            if index is None:
+                print(f"User '{args.email}' was not found.", file=sys.stderr)
+                return 3
+
+            context = main.parse_context(args.context)
+            decisions = set()
+            for permission in args.permission:
+                result = main.evaluate_permission(index, permission, environment_id, context)
+                decisions.add(result["decision"])
+                print(json.dumps({"email": args.email, **result, "grants": main.as_dicts(result["grants"])}))
+
+            if decisions & {"DENY", "NOT_ALLOWED"}:
+                return 1
+            return 2 if "CONDITIONAL" in decisions else 0
+
+        # who-has
+        environment_id = args.environment or environment_id
+        reverse_index = await client.build_reverse_index(account_id, environment_id)
+        holders = main.find_permission_holders(
+            reverse_index, args.permission, environment_id, main.parse_context(args.context), args.include_denied
+        )
+        main.write_output(args, holders, main.HOLDER_FIELDS)
+        return 0
@@ -0,0 +1,265 @@
+############################################################################################
+# Benchmark for main.py Options 2-8 and 13 against the local mock IAM server (mock_server.py)
+# Reports per option: calls, API requests, 429s, wall time and p50/p99/max latency per call.
+#
+# Run:   python benchmark.py --groups 200 --users 5000 --policies 300 --latency 40 --iterations 50
+#        python benchmark.py --cold              # clear main.py's caches before every call
+#        python benchmark.py --url http://127.0.0.1:8999   # use an already running mock_server.py
+#        python benchmark.py --profile --trace-file trace.json   # where each option spends its request time
+#        python benchmark.py --backend async --options 2,13 --concurrency 50   # async_client.py on one event loop
+############################################################################################
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tabulate import tabulate
+
+import main
+import mock_server
+
+OPTION_NAMES = {
+    "2": "User's groups & permissions",
+    "3": "Users in group",
+    "4": "Policies for group",
+    "5": "Look up group by name",
+    "6": "Bind policy to group",
+    "7": "Policies at a level",
+    "8": "Policy by ID",
+    "13": "Who has a permission (account crawl)",
+}
+CRAWL_PERMISSION = "storage:logs:read"  # Looked up by Option 13 (every mock policy may grant it)
+
+
+def get_mock_stats(base_url):
+    """Read the mock server's request counters (not counted, not rate limited)."""
+    return main.session.get(f"{base_url}/mock/stats", timeout=main.REQUEST_TIMEOUT).json()
+
+
+def clear_caches():
+    """Empty every in-process cache of main.py, so the next call starts cold (except the token)."""
+    with main.policy_cache_lock:
+        main.policy_cache.clear()
+    with main.group_directory_lock:
+        main.group_directories.clear()
+    with main.membership_cache_lock:
+        main.membership_cache.clear()
+    with main.user_index_cache_lock:
+        main.user_index_cache.clear()
+    with main.reverse_index_lock:
+        main.reverse_indexes.clear()
+    main.clear_binding_caches()
+
+
+def configure_main(base_url, account_id, environment_id, workers=None, client_rate_limit=True):
+    """Point main.py at the mock server and apply benchmark overrides before the first request."""
+    main.API_BASE_URL = base_url
+    main.SSO_TOKEN_URL = f"{base_url}/sso/oauth2/token"
+    main.ACCOUNT_ID = account_id
+    main.ENVIRONMENT_ID = environment_id
+    if workers:
+        main.MAX_WORKERS = workers
+    if not client_rate_limit:
+        main.RATE_LIMIT_PER_SECOND = main.RATE_LIMIT_BURST = 10 ** 6
+        main.ENDPOINT_RATE_LIMITS = {name: 10 ** 6 for name in main.ENDPOINT_RATE_LIMITS}
+    main.rate_limiters.clear()
+
+
+def pick_samples(token, rng):
+    """Pick sample user emails, groups and account-level policies from the API."""
+    account_id, environment_id = main.ACCOUNT_ID, main.ENVIRONMENT_ID
+    groups = main.fetch_groups(token, account_id)
+    sample_groups = rng.sample(groups, min(20, len(groups)))
+    emails = sorted({
+        user["email"]
+        for group in sample_groups[:5]
+        for user in main.fetch_group_users(token, account_id, group["uuid"])
+    })
+    account_policies = main.list_policies(token, account_id, environment_id, "account")
+    if not emails or not account_policies:
+        raise SystemExit("The mock account needs users and account-level policies.")
+    return emails, sample_groups, account_policies
+
+
+def build_calls(token, rng):
+    """Return option -> zero-argument call on sample users, groups and policies."""
+    account_id, environment_id = main.ACCOUNT_ID, main.ENVIRONMENT_ID
+    emails, sample_groups, account_policies = pick_samples(token, rng)
+
+    return {
+        "2": lambda: main.get_user_permissions(token, account_id, environment_id, rng.choice(emails)),
+        "3": lambda: main.list_group_users(token, account_id, rng.choice(sample_groups)["name"]),
+        "4": lambda: main.list_group_bindings(token, account_id, environment_id, rng.choice(sample_groups)["uuid"]),
+        "5": lambda: main.lookup_group(token, account_id, rng.choice(sample_groups)["name"]),
+        "6": lambda: main.bind_policy(
+            token, account_id, environment_id, rng.choice(sample_groups)["uuid"],
+            rng.choice(account_policies)["uuid"], scope="account"
+        ),
+        "7": lambda: main.list_policies(token, account_id, environment_id, rng.choice(["global", "account", "environment"])),
+        "8": lambda: main.get_policy_details(token, account_id, rng.choice(account_policies)["uuid"]),
+        "13": lambda: main.find_permission_holders(
+            main.build_reverse_index(token, account_id, environment_id), CRAWL_PERMISSION, environment_id
+        ),
+    }
+
+
+def build_async_calls(token, rng, client, loop):
+    """Like build_calls, but every call runs on `client` (an AsyncIamClient) in the event loop of another thread.
+
+    The calling threads only wait for their results, so --concurrency is the number of lookups in flight.
+    Option 6 (writes) has no async version.
+    """
+    account_id, environment_id = main.ACCOUNT_ID, main.ENVIRONMENT_ID
+    emails, sample_groups, account_policies = pick_samples(token, rng)
+
+    def run(coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    async def who_has():
+        reverse_index = await client.build_reverse_index(account_id, environment_id)
+        return main.find_permission_holders(reverse_index, CRAWL_PERMISSION, environment_id)
+
+    return {
+        "2": lambda: run(client.get_user_permissions(account_id, environment_id, rng.choice(emails))),
+        "3": lambda: run(client.list_group_users(account_id, rng.choice(sample_groups)["name"])),
+        "4": lambda: run(client.list_group_bindings(account_id, environment_id, rng.choice(sample_groups)["uuid"])),
+        "5": lambda: run(client.lookup_group(account_id, rng.choice(sample_groups)["name"])),
+        "7": lambda: run(client.list_policies(account_id, environment_id, rng.choice(["global", "account", "environment"]))),
+        "8": lambda: run(client.get_policy_details(account_id, rng.choice(account_policies)["uuid"])),
+        "13": lambda: run(who_has()),
+    }
+
+
+def start_async_client(account_id, concurrency=None):
+    """Start an event loop on a background thread and create an AsyncIamClient in it. Returns (loop, client)."""
+    import async_client  # Needs httpx, only for --backend async
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def create_client():
+        return async_client.AsyncIamClient({account_id: ("benchmark", "benchmark")}, concurrency)
+
+    return loop, asyncio.run_coroutine_threadsafe(create_client(), loop).result()
+
+
+def run_option(call, iterations, concurrency, cold):
+    """Run `call` `iterations` times on `concurrency` threads. Returns (per-call seconds, wall seconds)."""
+    def timed(_):
+        if cold:
+            clear_caches()
+        started_at = time.perf_counter()
+        call()
+        return time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        durations = list(executor.map(timed, range(iterations)))
+    return durations, time.perf_counter() - started_at
+
+
+def main_benchmark(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark main.py Options 2-8 and 13 against the local mock IAM server.")
+    parser.add_argument("--url", help="Base URL of a running mock_server.py (default: start one in-process)")
+    parser.add_argument("--account-id", default=mock_server.MOCK_ACCOUNT_ID)
+    parser.add_argument("--environment-id", default=mock_server.MOCK_ENVIRONMENT_ID)
+    parser.add_argument("--groups", type=int, default=100, help="In-process mock: number of groups")
+    parser.add_argument("--users", type=int, default=1000, help="In-process mock: number of users")
+    parser.add_argument("--policies", type=int, default=60, help="In-process mock: number of policies")
+    parser.add_argument("--latency", type=float, default=30, help="In-process mock: mean latency in milliseconds")
+    parser.add_argument("--rate-limit", type=int, help="In-process mock: requests per second before 429")
+    parser.add_argument("--throttle-probability", type=float, default=0.0, help="In-process mock: probability of a random 429")
+    parser.add_argument("--page-size", type=int, default=100, help="In-process mock: items per page")
+    parser.add_argument("--options", default="2,3,4,5,6,7,8", help="Comma separated options to run")
+    parser.add_argument("--iterations", type=int, default=20, help="Calls per option")
+    parser.add_argument("--concurrency", type=int, default=1, help="Calls run in parallel per option")
+    parser.add_argument("--workers", type=int, help="Override main.MAX_WORKERS")
+    parser.add_argument("--cold", action="store_true", help="Clear main.py's caches before every call")
+    parser.add_argument("--no-client-rate-limit", action="store_true", help="Disable main.py's client-side rate limits")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--profile", action="store_true", help="Print main.py's per-endpoint request summary for every option")
+    parser.add_argument("--trace-file", help="Write every API request as a Chrome trace to this file")
+    parser.add_argument("--backend", choices=["threads", "async"], default="threads", help="Run the calls with main.py's thread pools or async_client.py")
+    parser.add_argument("--async-concurrency", type=int, help="Override main.ASYNC_CONCURRENCY (requests in flight with --backend async)")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        account = mock_server.MockAccount(
+            args.groups, args.users, args.policies, account_id=args.account_id, environment_id=args.environment_id
+        )
+        server = mock_server.start_mock_server(
+            account, latency=args.latency / 1000, rate_limit=args.rate_limit,
+            throttle_probability=args.throttle_probability, page_size=args.page_size
+        )
+        base_url = server.base_url
+
+    configure_main(base_url, args.account_id, args.environment_id, args.workers, not args.no_client_rate_limit)
+    main.verbose = False
+    main.profile_requests = args.profile
+    if args.profile or args.trace_file:
+        main.start_request_recording()
+    rng = random.Random(args.seed)
+    loop = client = None
+
+    try:
+        token = main.request_access_token("benchmark", "benchmark")
+        if args.backend == "async":
+            loop, client = start_async_client(args.account_id, args.async_concurrency)
+            calls = build_async_calls(token, rng, client, loop)
+        else:
+            calls = build_calls(token, rng)
+
+        results = []
+        for option in [option.strip() for option in args.options.split(",") if option.strip()]:
+            if option not in calls:
+                print(f"Skipping option '{option}': expected one of {', '.join(calls)} with --backend {args.backend}", file=sys.stderr)
+                continue
+            clear_caches()  # Every option starts cold; later calls show the effect of the caches unless --cold
+            before = get_mock_stats(base_url)
+            operation = main.begin_operation()
+            durations, wall = run_option(calls[option], args.iterations, args.concurrency, args.cold)
+            main.end_operation(f"Option {option}: {OPTION_NAMES[option]}", operation)
+            after = get_mock_stats(base_url)
+
+            requests_made = sum(count - before.get(key, 0) for key, count in after.items() if key not in ("401", "429", "304"))
+            results.append({
+                "option": option,
+                "name": OPTION_NAMES[option],
+                "calls": len(durations),
+                "requests": requests_made,
+                "throttled": after.get("429", 0) - before.get("429", 0),
+                "wall_s": round(wall, 3),
+                "p50_ms": round(main.percentile(durations, 0.50) * 1000, 1),
+                "p99_ms": round(main.percentile(durations, 0.99) * 1000, 1),
+                "max_ms": round(max(durations) * 1000, 1),
+            })
+    finally:
+        if client:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        if server:
+            server.shutdown()
+        if args.trace_file:
+            main.write_request_trace(args.trace_file)
+
+    print(tabulate(
+        [[r["option"], r["name"], r["calls"], r["requests"], round(r["requests"] / r["calls"], 1), r["throttled"],
+          r["wall_s"], r["p50_ms"], r["p99_ms"], r["max_ms"]] for r in results],
+        headers=["Option", "Name", "Calls", "Requests", "Req/call", "429s", "Wall s", "p50 ms", "p99 ms", "Max ms"],
+        tablefmt="grid"
+    ))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump({"settings": vars(args), "results": results}, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
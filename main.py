@@ -3,72 +3,947 @@
 # Script to look through user, group, and policies
 # 1. Get Access Token
 # 2. User/Group: Get User's Groups & Permissions
-# 3. User/Group: Get Users in Group (Enter Group ID)
+# 3. User/Group: Get Users in Group (Enter Group ID or Name)
 # 4. Group: Get Policies for a Group
 # 5. Group: Look up Group by ID or Name
 # 6. Policy: Bind a Policy to a Group
 # 7. Policy: Get Policy metadata by name
 # 8. Policy: Get Policy metadata by ID
 # 9. Exit
+# 10. Snapshot: Sync IAM data to local store
+# 11. Snapshot: Toggle offline mode
+# 12. Permission: Check if a user has a permission
+# 13. Permission: Who has a permission
+# 14. Policy: Bulk bind policies from a manifest
+# 15. Snapshot: Drift report against the previous snapshot
 # Owner: Christian.Yap@dynatrace.com
 ############################################################################################
+import argparse
+import asyncio
+import bisect
+import csv
+import fnmatch
+import hashlib
+import json
+import os
+import random
+import re
 import requests
+import shutil
+import sqlite3
+import sys
 import threading
 import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, nullcontext
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from requests.adapters import HTTPAdapter
 from tabulate import tabulate
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+try:
+    import yaml  # Optional: only needed for YAML binding manifests
+except ImportError:
+    yaml = None
+
+try:
+    import pyarrow  # Optional: only needed for --format parquet
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:
+    pyarrow = None
+
 # Constants
 CLIENT_ID = "CHANGEME" # Generated from your OAuth
 CLIENT_SECRET = "CHANGEME" # Generated from your OAuth
 ACCOUNT_ID = "CHANGEME"  # Dynatrace account ID
 ENVIRONMENT_ID = "CHANGEME"  # Hardcoded environment ID
 DEFAULT_GROUP_ID = "CHANGEME"  # Default example group ID
+API_BASE_URL = os.environ.get("DT_API_BASE_URL", "https://api.dynatrace.com")  # IAM API (point at mock_server.py for benchmarks)
+SSO_TOKEN_URL = os.environ.get("DT_SSO_TOKEN_URL", "https://sso.dynatrace.com/sso/oauth2/token")  # OAuth token endpoint
+MAX_WORKERS = 8  # Max concurrent API requests when fanning out group/policy lookups
+POOL_MAXSIZE = 16  # Keep-alive connections kept open per host in the shared HTTP session
+TOKEN_REFRESH_MARGIN = 60  # Seconds before expiry at which the access token is proactively refreshed
+TOKEN_REFRESH_RETRY_DELAY = 5  # Seconds after a failed refresh before SSO is asked again (the still-valid token is used meanwhile)
+REQUEST_TIMEOUT = 30  # Seconds before a single HTTP request is abandoned
+MAX_RETRIES = 5  # Retries on 429, 5xx and connection errors before giving up
+RETRY_BACKOFF_BASE = 0.5  # Seconds; doubled on every retry (with jitter)
+RETRY_BACKOFF_MAX = 30  # Upper bound for a single backoff/Retry-After wait
+# The rate limits below are conservative placeholders, not published Dynatrace quotas: tune them to your
+# account's limits with DT_RATE_LIMIT_PER_SECOND, DT_RATE_LIMIT_BURST and DT_ENDPOINT_RATE_LIMITS ("users=10,bindings=5")
+RATE_LIMIT_PER_SECOND = float(os.environ.get("DT_RATE_LIMIT_PER_SECOND", 20))  # Client-side request budget across all IAM endpoints
+RATE_LIMIT_BURST = float(os.environ.get("DT_RATE_LIMIT_BURST", 20))  # Requests allowed in a burst before the budget applies
+ENDPOINT_RATE_LIMITS = {  # Per-endpoint requests per second (each also counts against RATE_LIMIT_PER_SECOND)
+    "sso": 2,
+    "users": 10,
+    "groups": 10,
+    "bindings": 10,
+    "policies": 10,
+}
+ENDPOINT_RATE_LIMITS.update(
+    (name.strip(), float(rate))
+    for name, _, rate in (item.partition("=") for item in os.environ.get("DT_ENDPOINT_RATE_LIMITS", "").split(","))
+    if name.strip()
+)
+POLICY_CACHE_TTL = 300  # Seconds a downloaded policy definition is reused before re-fetching
+POLICY_CACHE_MAX_SIZE = 1000  # Max policy definitions kept in memory (least recently used are evicted)
+SNAPSHOT_DB_PATH = "iam_snapshot.db"  # Local SQLite snapshot written by the Sync option
+SNAPSHOT_PREVIOUS_PATH = "iam_snapshot.previous.db"  # Copy of the last snapshot kept for drift reports
+SNAPSHOT_MAX_AGE = 86400  # Seconds before an incremental sync re-fetches an unchanged group/policy
+PAGE_SIZE = None  # Items requested per page from list endpoints (None = API default)
+TABLE_CHUNK_SIZE = 500  # Rows rendered per table block when streaming large results to the console
+GROUP_DIRECTORY_TTL = 600  # Seconds the cached group list used for name/ID lookups is reused
+USER_INDEX_TTL = 300  # Seconds a user's compiled permission index is reused by permission checks
+USER_INDEX_CACHE_MAX_SIZE = 1000  # Max compiled user indexes kept in memory (least recently used are evicted)
+REVERSE_INDEX_TTL = 900  # Seconds the account-wide "who has permission X" index is reused
+BULK_USER_WORKERS = 4  # Users resolved in parallel by the bulk command (each one fans out on a shared pool)
+ENVIRONMENT_WORKERS = 4  # Environments resolved in parallel by --targets/--environments (each one fans out on a shared pool)
+BINDING_CACHE_TTL = 300  # Seconds the service mode reuses a group's bindings before re-reading them
+MEMBERSHIP_CACHE_TTL = 300  # Seconds a group's member list is reused; after that it is revalidated by ETag (or re-fetched)
+MEMBERSHIP_CACHE_MAX_SIZE = 500  # Max group member lists kept in memory (least recently used are evicted)
+SERVE_HOST = "127.0.0.1"  # Address the service mode listens on (keep it local: responses are not authenticated)
+SERVE_PORT = 8765  # Port the service mode listens on
+LATENCY_BUCKETS = [0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # Seconds; request duration histogram for --metrics-file and /metrics
+PROFILE_SLOWEST = 5  # Slowest individual requests listed under each --profile summary
+PROFILE_MAX_RECORDS = 50000  # Request records kept for --profile/--trace-file (the oldest are dropped beyond that)
+ASYNC_CONCURRENCY = 32  # Requests in flight at once with --backend async (lookups waiting beyond that are cheap tasks on one thread)
+
+BINDING_SUCCESS_CODES = [200, 201, 204]  # Accepting 204 as a success
+PERMISSION_HEADERS = ["Policy UUID", "Level Type", "Level ID", "Effect", "Permission", "Conditions"]
+PERMISSION_FIELDS = ["policy_uuid", "level_type", "level_id", "effect", "permission", "conditions"]  # Library/JSON keys
+USER_FIELDS = ["uid", "email", "name", "surname"]  # Columns written for group members
+MEMBER_FIELDS = USER_FIELDS + ["groups"]  # Columns written for the deduplicated members of several groups
+BINDING_FIELDS = ["policyUuid", "levelType", "levelId", "groups", "parameters", "metadata", "boundaries"]
+POLICY_FIELDS = ["uuid", "name", "description", "category"]
+HOLDER_FIELDS = ["uid", "email", "decision", "groups", "policies"]
+TARGET_FIELDS = ["account_id", "environment_id"]  # Prepended to every row of a multi-environment run
+GRANT_FIELDS = ["effect", "permission", "policy_uuid", "level_type", "level_id", "conditions", "boundaries", "group_uuid"]
+OUTPUT_FORMATS = ["jsonl", "csv", "parquet", "table"]  # Formats understood by RowWriter
 
 # Global variable to store the access token
 access_token = None
+token_expires_at = 0  # Epoch seconds at which access_token expires (from the SSO expires_in)
+token_credentials = None  # (client_id, client_secret) used for refreshes
+# Tokens are issued per account (the SSO urn); the ACCOUNT_ID token is also kept in the globals above.
+account_tokens = {}  # account_id -> {"token", "expires_at", "credentials", "handed_out"}
+token_accounts = {}  # Tokens handed out and each account's current token -> account_id, so holders of a rotated token get the current one
+token_lock = threading.Lock()  # Single-flight lock: only one thread refreshes the token at a time
 token_refresh_thread = None
 stop_token_refresh = False
 
+# Policy definitions cache: (level_type, level_id, policy_uuid) -> (fetched_at, policy_data)
+policy_cache = OrderedDict()
+policy_cache_lock = threading.Lock()
+policy_requests_in_flight = {}  # Same key -> Future shared by concurrent lookups of one policy
+binding_cache_lock = threading.Lock()  # Guards the group binding caches used by bulk and service mode
+shared_binding_cache = {}  # Service mode: (scope, group_id) -> Future, dropped every BINDING_CACHE_TTL seconds
+shared_binding_cache_at = 0
+
+# Group directories: the account's groups indexed by UUID and normalized name (Options 3-6),
+# one per account and source (live API / local snapshot)
+group_directories = {}
+group_directory_lock = threading.Lock()
+group_directory_requests_in_flight = {}  # (account_id, offline) -> Future shared by concurrent downloads of one group list
+
+# Group member lists for the bulk expander, least recently used first: (account_id, group_id) -> {"checked_at", "etag", "users"}
+membership_cache = OrderedDict()
+membership_cache_lock = threading.Lock()
+
+# Client-side rate limiters, created on first use: (account_id, endpoint name) -> TokenBucket
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+# Compiled permission indexes per user, least recently used first: (email, account_id, environment_id, offline) -> (built_at, index)
+user_index_cache = OrderedDict()
+user_index_cache_lock = threading.Lock()
+
+# Account-wide reverse index (permission -> grants -> groups -> users), one per source (live/snapshot)
+reverse_indexes = {}
+reverse_index_lock = threading.Lock()
+
+UUID_PATTERN = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+# Per-run memo used by the multi-environment fan-out (see run_once)
+fan_out_lock = threading.Lock()
+
+# Offline mode: answer Options 2-5, 7 and 8 from the local snapshot instead of the live API
+use_snapshot = False
+
+# Request instrumentation (see record_request): totals per (endpoint, scope, method, status) are always
+# kept; individual request records only while profiling or tracing (request_records is then a deque
+# of the last PROFILE_MAX_RECORDS, and request_records_total counts every record ever added)
+request_stats = {}
+request_records = None
+request_records_total = 0
+request_operations = []  # (name, started_at, seconds) of profiled commands and menu options, for the trace file
+request_stats_lock = threading.Lock()
+profile_requests = False  # --profile: print a request summary after every command or menu option
+
+# Progress messages (retries, token refreshes, sync/crawl progress) go to stderr only when verbose.
+# The menu and the command line turn this on; library callers stay silent unless they opt in.
+verbose = False
+
+
+############################################################################################
+## Shared HTTP session: every Dynatrace call reuses one keep-alive connection pool
+############################################################################################
+def create_session():
+    """Create a requests Session with a connection pool sized for concurrent lookups.
+
+    One pool is kept per host the script talks to (the IAM API and SSO), over HTTPS or, for
+    mock_server.py, plain HTTP.
+    """
+    new_session = requests.Session()
+    hosts = {urlsplit(API_BASE_URL).netloc, urlsplit(SSO_TOKEN_URL).netloc}
+    adapter = HTTPAdapter(pool_connections=len(hosts), pool_maxsize=max(POOL_MAXSIZE, MAX_WORKERS))
+    new_session.mount("https://", adapter)
+    new_session.mount("http://", adapter)
+    new_session.headers.update({"accept": "application/json", "Connection": "keep-alive"})
+    new_session.verify = False
+    return new_session
+
+session = create_session()
+
+def api_request(method, url, access_token=None, headers=None, **kwargs):
+    """Send a request through the shared session, adding the bearer token when one is given.
+
+    Every attempt waits for the global and per-endpoint rate limiters. 429 responses (any method),
+    5xx responses and connection errors (GET only) are retried up to MAX_RETRIES times with
+    exponential backoff and jitter, honouring Retry-After. The last response is returned as-is;
+    when no response came back (connection error, timeout), ApiRequestError is raised.
+
+    When a token is given, the current managed token of its account is sent instead (see
+    get_current_token), and a 401 triggers one token refresh and resend.
+
+    Each call (all of its attempts) is recorded once by record_request.
+    """
+    details = {"retries": 0, "wait": 0.0, "server": 0.0, "refreshed": False}
+    started_at = time.monotonic()
+    try:
+        response = send_api_request(method, url, access_token, headers, details, **kwargs)
+    except Exception as e:
+        record_request(method, url, e.__class__.__name__, 0, time.monotonic() - started_at, details)
+        if isinstance(e, requests.RequestException):
+            raise ApiRequestError(error=e) from e
+        raise
+    record_request(method, url, response.status_code, len(response.content), time.monotonic() - started_at, details)
+    return response
+
+def send_api_request(method, url, access_token, headers, details, **kwargs):
+    """The retry loop of api_request. Counts retries, rate limit/backoff waits and server time into `details`."""
+    request_headers = dict(headers or {})
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+
+    endpoint = get_endpoint_name(url)
+    account_id = get_token_account(access_token)
+    limiters = get_request_limiters(endpoint, account_id)
+
+    attempt = 0
+    while True:
+        details["retries"] = attempt
+        waiting_since = time.monotonic()
+        for limiter in limiters:
+            limiter.acquire()
+        details["wait"] += time.monotonic() - waiting_since
+
+        # Read the token at send time: callers may hold a value that has since been rotated
+        sent_token = None
+        if access_token:
+            sent_token = get_current_token(access_token) or access_token
+            request_headers["Authorization"] = f"Bearer {sent_token}"
+
+        try:
+            response = session.request(method, url, headers=request_headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if method != "GET" or attempt == MAX_RETRIES:
+                raise
+            delay = get_retry_delay(attempt)
+            log(f"\n Connection error on {endpoint} request ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            details["wait"] += delay
+            attempt += 1
+            continue
+        details["server"] += response.elapsed.total_seconds()
+
+        # Token expired or was revoked mid-operation: refresh once (single-flight) and resend
+        if response.status_code == 401 and sent_token and not details["refreshed"] and account_tokens:
+            details["refreshed"] = True
+            if refresh_access_token(sent_token, account_id):
+                continue
+
+        retryable = response.status_code == 429 or (response.status_code >= 500 and method == "GET")
+        if not retryable or attempt == MAX_RETRIES:
+            return response
+
+        delay = get_retry_delay(attempt, response.headers.get("Retry-After"))
+        if response.status_code == 429:
+            # Back off every thread using this endpoint, not just the one that was throttled
+            # (only this endpoint's bucket: other endpoints keep their own budgets)
+            limiters[-1].pause(delay)
+        log(f"\n {endpoint} request returned {response.status_code}, retrying in {delay:.1f}s ({attempt + 1}/{MAX_RETRIES})...")
+        time.sleep(delay)
+        details["wait"] += delay
+        attempt += 1
+
+############################################################################################
+## Rate limiting and backoff for api_request
+############################################################################################
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self):
+        """Take one request without blocking. Returns 0 if it was taken, else the seconds to wait before trying again."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Hold back all requests for `seconds` (used when the API answers 429)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+def get_endpoint_name(url):
+    """Classify a request URL into the endpoint budget it counts against."""
+    if url.startswith(SSO_TOKEN_URL):
+        return "sso"
+    for name in ("bindings", "policies", "users", "groups"):
+        if f"/{name}" in url:
+            return name
+    return "default"
+
+def get_rate_limiter(name, account_id=None):
+    """Return the token bucket for an endpoint ("global" for the overall budget) of an account, creating it on first use."""
+    with rate_limiters_lock:
+        limiter = rate_limiters.get((account_id, name))
+        if limiter is None:
+            rate = RATE_LIMIT_PER_SECOND if name == "global" else ENDPOINT_RATE_LIMITS.get(name, RATE_LIMIT_PER_SECOND)
+            limiter = TokenBucket(rate, max(1, min(RATE_LIMIT_BURST, rate * 2)))
+            rate_limiters[(account_id, name)] = limiter
+        return limiter
+
+def get_request_limiters(endpoint, account_id):
+    """Return the [global, endpoint] buckets a request waits for. IAM budgets are per account, so a
+    throttled account does not slow down the others; the SSO endpoint is shared by every account."""
+    if endpoint == "sso":
+        account_id = None
+    return [get_rate_limiter("global", account_id), get_rate_limiter(endpoint, account_id)]
+
+def get_retry_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number `attempt` + 1: Retry-After if given, else exponential backoff with full jitter."""
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0), RETRY_BACKOFF_MAX)
+
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt)))
+
+def is_offline(offline=None):
+    """Return True if a lookup should be answered from the local snapshot (defaults to the global mode)."""
+    return use_snapshot if offline is None else offline
+
+def log(message):
+    """Print a progress message to stderr when verbose output is enabled."""
+    if verbose:
+        print(message, file=sys.stderr, flush=True)
+
+############################################################################################
+## Request instrumentation: per-request timing for --profile, --metrics-file and --trace-file
+############################################################################################
+SCOPE_PATTERN = re.compile(r"/repo/(global|account|environment)/")
+
+def get_request_scope(url):
+    """Classify a request URL by IAM level: global, account or environment ("-" for the token endpoint)."""
+    match = SCOPE_PATTERN.search(url)
+    if match:
+        return match.group(1)
+    return "account" if "/accounts/" in url else "-"
+
+def record_request(method, url, status, size, seconds, details):
+    """Add one finished api_request call to the totals (and to request_records while recording).
+
+    `status` is the final HTTP status, or the exception class name when no response came back.
+    `details` carries the retries, rate limit/backoff wait, server time and 401 refresh of the call,
+    and for the async backend the "lane" (connection slot) it ran in, shown as its trace row.
+    """
+    global request_records_total
+    endpoint, scope = get_endpoint_name(url), get_request_scope(url)
+    key = (endpoint, scope, method, str(status))
+    with request_stats_lock:
+        stats = request_stats.get(key)
+        if stats is None:
+            stats = request_stats[key] = {
+                "count": 0, "retries": 0, "refreshes": 0, "bytes": 0, "seconds": 0.0, "wait": 0.0,
+                "buckets": [0] * len(LATENCY_BUCKETS),
+            }
+        stats["count"] += 1
+        stats["retries"] += details["retries"]
+        stats["refreshes"] += details["refreshed"]
+        stats["bytes"] += size
+        stats["seconds"] += seconds
+        stats["wait"] += details["wait"]
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        if index < len(LATENCY_BUCKETS):
+            stats["buckets"][index] += 1
+
+        if request_records is not None:
+            request_records_total += 1
+            request_records.append({
+                "started_at": time.time() - seconds,
+                "thread": details.get("lane", threading.get_ident()),
+                "method": method,
+                "endpoint": endpoint,
+                "scope": scope,
+                "path": urlsplit(url).path,
+                "status": status,
+                "bytes": size,
+                "seconds": seconds,
+                "server": details["server"],
+                "wait": details["wait"],
+                "retries": details["retries"],
+                "refreshed": details["refreshed"],
+            })
+
+def start_request_recording():
+    """Keep a record of every request from now on, up to the last PROFILE_MAX_RECORDS (used by --profile and --trace-file)."""
+    global request_records
+    with request_stats_lock:
+        if request_records is None:
+            request_records = deque(maxlen=PROFILE_MAX_RECORDS)
+
+def count_connections():
+    """Number of connections (TCP + TLS handshakes) the shared session has opened so far."""
+    total = 0
+    for adapter in set(session.adapters.values()):  # One adapter is mounted for both schemes
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            total += pool.num_connections if pool else 0
+    return total
+
+def begin_operation():
+    """Mark the start of a command or menu option. Pass the result to end_operation."""
+    with request_stats_lock:
+        recorded = request_records_total
+    return recorded, time.time(), time.monotonic(), count_connections()
+
+def end_operation(name, marker):
+    """Close an operation started with begin_operation; prints its request summary to stderr with --profile."""
+    recorded, started_at, started, connections = marker
+    seconds = time.monotonic() - started
+    with request_stats_lock:
+        records = []
+        if request_records is not None:
+            count = min(request_records_total - recorded, len(request_records))
+            records = list(islice(request_records, len(request_records) - count, None))
+            request_operations.append((name, started_at, seconds))
+    if profile_requests:
+        print_request_summary(records, name, seconds, count_connections() - connections)
+    return records
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def summarize_requests(records):
+    """Group request records by endpoint and scope. Returns one table row per group, slowest total first."""
+    groups = {}
+    for record in records:
+        groups.setdefault((record["endpoint"], record["scope"]), []).append(record)
+
+    rows = []
+    for (endpoint, scope), group in groups.items():
+        latencies = [record["seconds"] for record in group]
+        rows.append([
+            endpoint, scope, len(group),
+            sum(1 for record in group if not isinstance(record["status"], int) or record["status"] >= 400),
+            sum(record["retries"] for record in group),
+            sum(record["refreshed"] for record in group),
+            round(sum(record["bytes"] for record in group) / 1024, 1),
+            round(sum(record["wait"] for record in group), 3),
+            round(sum(record["server"] for record in group), 3),
+            round(percentile(latencies, 0.50) * 1000, 1),
+            round(percentile(latencies, 0.99) * 1000, 1),
+            round(max(latencies) * 1000, 1),
+            round(sum(latencies), 3),
+        ])
+    rows.sort(key=lambda row: row[-1], reverse=True)
+    return rows
+
+def print_request_summary(records, title, seconds, new_connections, file=None):
+    """Print where an operation's time went: per endpoint/scope totals and the slowest single requests."""
+    file = file or sys.stderr
+    print(f"\n Profile: {title} - {len(records)} API requests, {new_connections} new connections, {seconds:.3f}s wall", file=file)
+    if not records:
+        return
+    print(tabulate(
+        summarize_requests(records),
+        headers=["Endpoint", "Scope", "Requests", "Errors", "Retries", "401 refresh", "KB",
+                 "Wait s", "Server s", "p50 ms", "p99 ms", "Max ms", "Total s"],
+        tablefmt="grid"
+    ), file=file)
+    print(" Slowest requests:", file=file)
+    for record in sorted(records, key=lambda record: record["seconds"], reverse=True)[:PROFILE_SLOWEST]:
+        print(
+            f"  {record['seconds'] * 1000:8.1f} ms  {record['method']} {record['path']} -> {record['status']}"
+            f" (wait {record['wait'] * 1000:.0f} ms, retries {record['retries']})", file=file
+        )
+
+def format_request_metrics():
+    """Return the request totals in the Prometheus text exposition format."""
+    def labels(key):
+        endpoint, scope, method, status = key
+        return f'endpoint="{endpoint}",scope="{scope}",method="{method}",status="{status}"'
+
+    with request_stats_lock:
+        stats = {key: dict(value, buckets=list(value["buckets"])) for key, value in sorted(request_stats.items())}
+
+    lines = []
+    for name, field, kind, description in [
+        ("dt_iam_requests_total", "count", "counter", "IAM API calls by endpoint, scope, method and final status."),
+        ("dt_iam_request_retries_total", "retries", "counter", "Retries after 429, 5xx and connection errors."),
+        ("dt_iam_request_token_refreshes_total", "refreshes", "counter", "Token refreshes triggered by a 401."),
+        ("dt_iam_response_bytes_total", "bytes", "counter", "Response body bytes received."),
+        ("dt_iam_request_wait_seconds_total", "wait", "counter", "Seconds spent in client rate limiting and retry backoff."),
+    ]:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{{{labels(key)}}} {value[field]}" for key, value in stats.items())
+
+    lines.append("# HELP dt_iam_request_duration_seconds IAM API call duration including retries.")
+    lines.append("# TYPE dt_iam_request_duration_seconds histogram")
+    for key, value in stats.items():
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, value["buckets"]):
+            cumulative += count
+            lines.append(f'dt_iam_request_duration_seconds_bucket{{{labels(key)},le="{bound}"}} {cumulative}')
+        lines.append(f'dt_iam_request_duration_seconds_bucket{{{labels(key)},le="+Inf"}} {value["count"]}')
+        lines.append(f"dt_iam_request_duration_seconds_sum{{{labels(key)}}} {value['seconds']:.6f}")
+        lines.append(f"dt_iam_request_duration_seconds_count{{{labels(key)}}} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+def write_request_trace(path):
+    """Write the recorded requests and operations as a Chrome trace (open in chrome://tracing or Perfetto)."""
+    with request_stats_lock:
+        records = list(request_records or [])
+        operations = list(request_operations)
+    starts = [record["started_at"] for record in records] + [started_at for _, started_at, _ in operations]
+    origin = min(starts, default=0)
+
+    events = [
+        {"name": name, "cat": "operation", "ph": "X", "pid": 1, "tid": 0,
+         "ts": round((started_at - origin) * 1e6), "dur": round(seconds * 1e6)}
+        for name, started_at, seconds in operations
+    ]
+    for record in records:
+        events.append({
+            "name": f"{record['method']} {record['endpoint']}", "cat": record["scope"], "ph": "X", "pid": 1,
+            "tid": record["thread"], "ts": round((record["started_at"] - origin) * 1e6),
+            "dur": round(record["seconds"] * 1e6),
+            "args": {key: record[key] for key in ("path", "status", "bytes", "retries", "wait", "server", "refreshed")},
+        })
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, output)
+
+############################################################################################
+## Pagination: lazy iterators over list endpoints and chunked table output
+############################################################################################
+class ApiRequestError(Exception):
+    """Raised by the data helpers and library functions when a Dynatrace API request fails.
+
+    `response` is the failed response, or None when no response came back; `error` is then the
+    underlying connection error or timeout.
+    """
+
+    def __init__(self, response=None, error=None):
+        if response is not None:
+            message = f"Status Code: {response.status_code}, Response: {response.text}"
+        else:
+            message = f"No response: {error.__class__.__name__}: {error}"
+        super().__init__(message)
+        self.response = response
+        self.error = error
+
+def iter_api_items(url, access_token, items_key, params=None):
+    """Yield the items of a list endpoint lazily, page by page, following nextPageKey until the last page.
+
+    Raises ApiRequestError if any page fails, so a partial result is never mistaken for a complete one.
+    """
+    params = dict(params or {})
+    if PAGE_SIZE and "nextPageKey" not in params:
+        params["pageSize"] = PAGE_SIZE
+
+    while True:
+        response = api_request("GET", url, access_token, params=params)
+        if response.status_code != 200:
+            raise ApiRequestError(response)
+
+        page = response.json()
+        yield from page.get(items_key, [])
+
+        next_page_key = page.get("nextPageKey")
+        if not next_page_key:
+            return
+        # Dynatrace list APIs expect only the page key on follow-up requests
+        params = {"nextPageKey": next_page_key}
+
+def iter_chunks(items, size):
+    """Group an iterable into lists of at most `size` items without materializing it."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def print_table_stream(rows, headers, title=None, file=None):
+    """Print rows as grid tables of TABLE_CHUNK_SIZE rows as they arrive. Returns the number of rows printed."""
+    total = 0
+    for chunk in iter_chunks(rows, TABLE_CHUNK_SIZE):
+        if total == 0 and title:
+            print(title, file=file)
+        print(tabulate(chunk, headers=headers, tablefmt="grid"), file=file)
+        total += len(chunk)
+    return total
+
+############################################################################################
+## Output writers: stream rows as JSONL, CSV, Parquet or console tables
+############################################################################################
+def format_cell(value):
+    """Flatten a value for a CSV/Parquet/table cell: lists and dicts become JSON, None stays empty."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return str(value)
+
+class RowWriter:
+    """Write dict rows to an open file as they are produced, without building the whole result.
+
+    jsonl writes every row as-is (one JSON object per line); csv, parquet and table keep only
+    `fieldnames`, with nested values flattened to JSON. `headers` (default `fieldnames`) are the
+    column titles of the console table. Parquet needs pyarrow and a binary file; its columns are
+    strings, written as one row group per TABLE_CHUNK_SIZE rows.
+    """
+
+    def __init__(self, output, fieldnames, output_format="jsonl", headers=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}")
+        if output_format == "parquet" and pyarrow is None:
+            raise ValueError("pyarrow is not installed. Use jsonl or csv, or run: pip install pyarrow")
+
+        self.output = output
+        self.fieldnames = fieldnames
+        self.headers = headers or fieldnames
+        self.output_format = output_format
+        self.count = 0
+        self.csv_writer = None
+        self.parquet_writer = None
+        if output_format == "csv":
+            self.csv_writer = csv.writer(output)
+            self.csv_writer.writerow(fieldnames)
+        elif output_format == "parquet":
+            self.schema = pyarrow.schema([(name, pyarrow.string()) for name in fieldnames])
+            self.parquet_writer = pyarrow_parquet.ParquetWriter(output, self.schema)
+
+    def write(self, rows):
+        """Write an iterable of dict rows, TABLE_CHUNK_SIZE at a time. Returns the number of rows written.
+
+        If the output is stdout and its reader goes away (e.g. `| head`), stdout is pointed at
+        devnull and BrokenPipeError is raised, so the caller can stop without a second error at exit.
+        """
+        written = 0
+        try:
+            for chunk in iter_chunks(rows, TABLE_CHUNK_SIZE):
+                if self.output_format == "jsonl":
+                    self.output.writelines(json.dumps(row) + "\n" for row in chunk)
+                elif self.output_format == "csv":
+                    self.csv_writer.writerows([format_cell(row.get(name)) for name in self.fieldnames] for row in chunk)
+                elif self.output_format == "parquet":
+                    columns = {name: [format_cell(row.get(name)) for row in chunk] for name in self.fieldnames}
+                    self.parquet_writer.write_table(pyarrow.table(columns, schema=self.schema))
+                else:
+                    print_table_stream(([format_cell(row.get(name)) for name in self.fieldnames] for row in chunk), self.headers, file=self.output)
+                self.output.flush()
+                written += len(chunk)
+        except BrokenPipeError:
+            if self.output in (sys.stdout, getattr(sys.stdout, "buffer", None)):
+                silence_stdout()
+            raise
+        finally:
+            self.count += written
+        return written
+
+    def close(self):
+        """Finish the file (Parquet writes its footer here)."""
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def silence_stdout():
+    """Point stdout at devnull after its reader went away, so later writes and the flush at exit do not fail again."""
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+def open_output(path, output_format):
+    """Open `path` ('-' for stdout) for a RowWriter: binary for parquet, text otherwise. Use with `with`."""
+    binary = output_format == "parquet"
+    if binary and pyarrow is None:
+        raise ValueError("pyarrow is not installed. Use jsonl or csv, or run: pip install pyarrow")
+    if path == "-":
+        return nullcontext(sys.stdout.buffer if binary else sys.stdout)
+    if binary:
+        return open(path, "wb")
+    return open(path, "w", newline="", encoding="utf-8")
+
+############################################################################################
+## Compact records: permission rows and grants as tuples, IDs as shared (interned) strings
+############################################################################################
+# namedtuples have no per-instance dict, so a row costs about as much as a plain tuple
+PermissionRow = namedtuple("PermissionRow", PERMISSION_FIELDS)
+Grant = namedtuple("Grant", GRANT_FIELDS)
+
+def intern_text(value):
+    """Return the shared copy of a string (policy UUIDs, level IDs, effects...), so repeats cost nothing. Other values pass through."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+def compact_binding(binding):
+    """Keep only the BINDING_FIELDS of a bindingsDetails entry, with IDs and bind parameters interned."""
+    compact = {}
+    for field in BINDING_FIELDS:
+        if field not in binding:
+            continue
+        value = binding[field]
+        if isinstance(value, dict):
+            value = {intern_text(key): intern_text(item) for key, item in value.items()}
+        elif isinstance(value, list):
+            value = [intern_text(item) for item in value]
+        compact[field] = intern_text(value)
+    return compact
+
+def as_dicts(records):
+    """Turn records into dicts, for JSON output and library results."""
+    return [record._asdict() for record in records]
+
+############################################################################################
+## Data helpers: fetch users, groups and policies (live API or local snapshot)
+############################################################################################
+def fetch_user_groups(access_token, account_id, email, offline=None):
+    """Return the groups ({uuid, groupName}) a user is a member of, or None if the user does not exist.
+
+    Raises ApiRequestError if the lookup failed for any other reason.
+    """
+    if is_offline(offline):
+        return snapshot_get_user_groups(email)
+
+    encoded_email = email.replace("@", "%40")  # Encoding '@' for API URL
+    url = f"{API_BASE_URL}/iam/v1/accounts/{account_id}/users/{encoded_email}"
+    response = api_request("GET", url, access_token)
+
+    if response.status_code == 200:
+        return sort_user_groups(response.json().get("groups", []))
+    if response.status_code == 404:
+        return None
+    raise ApiRequestError(response)
+
+def sort_user_groups(groups):
+    """Order a user's groups by name (then UUID), so the live API, the snapshot and the async backend agree."""
+    return sorted(groups, key=lambda group: ((group.get("groupName") or "").lower(), group.get("uuid") or ""))
+
+def iter_group_users(access_token, account_id, group_id, offline=None):
+    """Yield the users of a group lazily across all pages. Raises ApiRequestError on failure."""
+    if is_offline(offline):
+        yield from snapshot_get_group_users(group_id)
+        return
+
+    url = f"{API_BASE_URL}/iam/v1/accounts/{account_id}/groups/{group_id}/users"
+    yield from iter_api_items(url, access_token, "items")
+
+def fetch_group_users(access_token, account_id, group_id, offline=None):
+    """Return all users of a group. Raises ApiRequestError on failure."""
+    return list(iter_group_users(access_token, account_id, group_id, offline))
+
+def iter_groups(access_token, account_id, offline=None):
+    """Yield every group in the account lazily across all pages. Raises ApiRequestError on failure."""
+    if is_offline(offline):
+        yield from snapshot_get_groups()
+        return
+
+    url = f"{API_BASE_URL}/iam/v1/accounts/{account_id}/groups"
+    yield from iter_api_items(url, access_token, "items")
+
+def fetch_groups(access_token, account_id, offline=None):
+    """Return every group in the account. Raises ApiRequestError on failure."""
+    return list(iter_groups(access_token, account_id, offline))
+
+def iter_policies(access_token, level_type, level_id, policy_name=None, offline=None):
+    """Yield the policies defined at a level (optionally filtered by name) lazily. Raises ApiRequestError on failure."""
+    if is_offline(offline):
+        yield from snapshot_get_policies(level_type, level_id, policy_name)
+        return
+
+    if level_type == "global":
+        url = f"{API_BASE_URL}/iam/v1/repo/global/global/policies"
+    else:
+        url = f"{API_BASE_URL}/iam/v1/repo/{level_type}/{level_id}/policies"
+
+    params = {"name": policy_name} if policy_name else None
+    yield from iter_api_items(url, access_token, "policies", params)
+
+def fetch_policies(access_token, level_type, level_id, policy_name=None, offline=None):
+    """Return the policies defined at a level (optionally filtered by name). Raises ApiRequestError on failure."""
+    return list(iter_policies(access_token, level_type, level_id, policy_name, offline))
 
 ############################################################################################
 ## Menu Option 1: Generate New SSO
 ############################################################################################
-def get_token(client_id, client_secret):
-    """Retrieve an access token from Dynatrace SSO."""
-    url = "https://sso.dynatrace.com/sso/oauth2/token"
+def request_access_token(client_id, client_secret, account_id=None, refresh=False):
+    """Retrieve an access token for an account (default ACCOUNT_ID) from Dynatrace SSO and make it that
+    account's current token. Raises ApiRequestError on failure.
+
+    The token a refresh replaces is forgotten: callers only hold the token handed out by a plain
+    request (which keeps mapping to the account's current token), so token_accounts stays bounded.
+    """
+    global access_token, token_expires_at, token_credentials
+    account_id = account_id or ACCOUNT_ID
+    url = SSO_TOKEN_URL
     headers = {"content-type": "application/x-www-form-urlencoded"}
-    data = {
+    data = get_token_request_data(client_id, client_secret, account_id)
+
+    response = api_request("POST", url, headers=headers, data=data)
+    if response.status_code != 200:
+        raise ApiRequestError(response)
+
+    token_data = response.json()
+    token = token_data.get("access_token")
+    expires_at = time.time() + int(token_data.get("expires_in", 300))
+    previous = account_tokens.get(account_id)
+    handed_out = previous["handed_out"] if refresh and previous else token
+    if previous and previous["token"] != previous["handed_out"]:
+        token_accounts.pop(previous["token"], None)
+    token_accounts[token] = account_id
+    account_tokens[account_id] = {
+        "token": token, "expires_at": expires_at, "credentials": (client_id, client_secret), "handed_out": handed_out
+    }
+    if account_id == ACCOUNT_ID:
+        token_expires_at = expires_at
+        token_credentials = (client_id, client_secret)
+        access_token = token
+    return token
+
+def get_token_request_data(client_id, client_secret, account_id):
+    """Return the SSO client-credentials form for an account."""
+    return {
         "grant_type": "client_credentials",
         "client_id": client_id,
         "client_secret": client_secret,
         "scope": "account-idm-read account-idm-write iam-policies-management iam:bindings:read iam:effective-permissions:read",
-        "urn": f"dtaccount:{ACCOUNT_ID}"
+        "urn": f"dtaccount:{account_id}"
     }
 
-    response = requests.post(url, headers=headers, data=data, verify=False)
-    
-    if response.status_code == 200:
-        global access_token
-        access_token = response.json().get("access_token")
-        print(f"\nAccess Token Retrieved: \n{access_token}\n")
-        return access_token
-    else:
-        print(f"\nFailed to get token. Status Code: {response.status_code}, Response: {response.text}\n")
+def get_token(client_id, client_secret):
+    """Retrieve an access token from Dynatrace SSO."""
+    try:
+        token = request_access_token(client_id, client_secret)
+    except ApiRequestError as e:
+        print(f"\nFailed to get token. {e}\n")
         return None
 
+    print(f"\nAccess Token Retrieved: \n{token}\n")
+    return token
+
 ############################################################################################
-## Automatically refresh token once a token is generated
+## Token manager: expiry-driven refresh, read by every request at send time
 ############################################################################################
+def get_token_account(token=None):
+    """Return the account a token was issued for (ACCOUNT_ID for unknown tokens)."""
+    return token_accounts.get(token, ACCOUNT_ID)
+
+def refresh_access_token(stale_token=None, account_id=None):
+    """Refresh an account's access token (default: the account of `stale_token`), single-flight across threads.
+
+    If `stale_token` is given and another thread already replaced it, the newer token is returned
+    without another SSO call. Returns the current token, or None if the refresh failed. For
+    TOKEN_REFRESH_RETRY_DELAY seconds after a failure, None is returned without calling SSO, so
+    threads do not queue up behind a failing SSO endpoint.
+    """
+    account_id = account_id or get_token_account(stale_token)
+    with token_lock:
+        state = account_tokens.get(account_id)
+        if not state:
+            return None
+        if stale_token is not None and state["token"] != stale_token:
+            return state["token"]
+        if time.time() - state.get("failed_at", 0) < TOKEN_REFRESH_RETRY_DELAY:
+            return None
+        log(f"\nRefreshing Access Token for account {account_id}...\n")
+        try:
+            return request_access_token(*state["credentials"], account_id, refresh=True)
+        except ApiRequestError as e:
+            state["failed_at"] = time.time()  # A successful refresh replaces the state, clearing this
+            log(f"\nFailed to refresh token. {e}\n")
+            return None
+
+def get_current_token(token=None):
+    """Return the current access token of `token`'s account (default ACCOUNT_ID), refreshing it first
+    if it is within TOKEN_REFRESH_MARGIN of expiry. None if that account has no managed token."""
+    account_id = get_token_account(token)
+    state = account_tokens.get(account_id)
+    if not state:
+        return None
+    if time.time() >= state["expires_at"] - TOKEN_REFRESH_MARGIN:
+        return refresh_access_token(state["token"], account_id) or state["token"]
+    return state["token"]
+
 def auto_refresh_token():
-    """Automatically refreshes the access token every 4 minutes."""
-    global access_token, stop_token_refresh
+    """Refreshes every account's access token shortly before it expires, based on the SSO expires_in."""
     while not stop_token_refresh:
-        time.sleep(240)  # Wait 4 minutes
-        if access_token:  # Only refresh if we already have a token
-            print("\nRefreshing Access Token...\n")
-            get_token(CLIENT_ID, CLIENT_SECRET)
+        # Sleep in short steps so exiting the menu stops the thread promptly
+        next_expiry = min((state["expires_at"] for state in list(account_tokens.values())), default=time.time() + 5)
+        time.sleep(max(1, min(5, next_expiry - TOKEN_REFRESH_MARGIN - time.time())))
+        for account_id, state in list(account_tokens.items()):
+            if time.time() >= state["expires_at"] - TOKEN_REFRESH_MARGIN:
+                if not refresh_access_token(state["token"], account_id):
+                    time.sleep(5)  # SSO failed; get_current_token/401 handling will retry on the next request
 
 def start_token_refresh_thread():
     """Starts the background thread to refresh the token."""
@@ -85,20 +960,12 @@ def get_user_groups_and_permissions(access_token, account_id, environment_id):
     """Retrieve a user's groups and list all their associated permissions."""
     
     email = input("\nEnter the User's Email: ").strip()
-    encoded_email = email.replace("@", "%40")  # Encoding '@' for API URL
-
-    url = f"https://api.dynatrace.com/iam/v1/accounts/{account_id}/users/{encoded_email}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {access_token}"
-    }
-
-    response = requests.get(url, headers=headers, verify=False)
-
-    if response.status_code == 200:
-        user_data = response.json()
-        groups = user_data.get("groups", [])
 
+    try:
+        groups = fetch_user_groups(access_token, account_id, email)
+        if groups is None:
+            print(f"\n User '{email}' was not found.")
+            return
         if not groups:
             print(f"\n User '{email}' is not assigned to any groups.")
             return
@@ -107,189 +974,582 @@ def get_user_groups_and_permissions(access_token, account_id, environment_id):
         table_data = [[group["uuid"], group["groupName"]] for group in groups]
         print(tabulate(table_data, headers=["Group UUID", "Group Name"], tablefmt="grid"))
 
-        # Store permissions in a list
-        all_permissions = []
-
+        # Print the permissions table in chunks as policies are resolved
         print("\n🔎 Fetching policies and permissions for each group...\n")
+        total = print_table_stream(
+            (row._replace(conditions=row.conditions or "None") for row in iter_user_permissions(access_token, account_id, environment_id, groups)),
+            PERMISSION_HEADERS, title="\n Final List of User Permissions:\n"
+        )
+    except ApiRequestError as e:
+        print(f"\n Failed to retrieve user permissions. {e}\n")
+        return
 
-        # Loop through each group to get policies
-        for group in groups:
-            group_id = group["uuid"]
-            group_name = group["groupName"]
-
-            print(f"\n🔹 Checking Policies for Group: {group_name} ({group_id})\n")
-            policies = get_policies_for_group(access_token, account_id, environment_id, group_id, return_policies=True)
-
-            if policies:
-                for policy in policies:
-                    policy_uuid = policy["policyUuid"]
-                    level_type = policy["levelType"]
-                    level_id = policy["levelId"]
-
-                    # Fetch permissions for this policy
-                    permissions = get_permissions_for_policy(access_token, policy_uuid, level_type, level_id, account_id, environment_id)
+    if not total:
+        print("\n No permissions found for this user.")
 
-                    # Store results
-                    all_permissions.extend(permissions)
+def resolve_user_permissions(access_token, account_id, environment_id, groups, binding_cache=None, executor=None,
+                             offline=None):
+    """Return the permission rows granted through a user's groups across all three scopes.
 
-        # Print the final permissions table
-        if all_permissions:
-            print("\n Final List of User Permissions:\n")
-            print(tabulate(all_permissions, headers=["Policy UUID", "Level Type", "Level ID", "Effect", "Permission", "Conditions"], tablefmt="grid"))
-        else:
-            print("\n No permissions found for this user.")
+    Scope binding lookups and then policy detail fetches are fanned out on `executor` (a new
+    MAX_WORKERS pool if omitted). executor.map keeps submission order, so the rows are deterministic.
+    Pass the same `binding_cache` dict across calls to share group bindings between users (of one
+    source: live API or snapshot).
+    """
+    return list(iter_user_permissions(access_token, account_id, environment_id, groups, binding_cache, executor, offline))
+
+def iter_user_permissions(access_token, account_id, environment_id, groups, binding_cache=None, executor=None,
+                          offline=None):
+    """Like resolve_user_permissions, but yield each policy's rows as soon as it (and every earlier one) is resolved."""
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+    try:
+        policies = resolve_user_bindings(access_token, account_id, environment_id, groups, binding_cache, executor, offline)
+
+        permission_results = executor.map(
+            lambda policy: get_permissions_for_policy(
+                access_token, policy["policyUuid"], policy["levelType"], policy["levelId"], account_id, environment_id,
+                offline
+            ) or [],
+            policies
+        )
+        for permissions in permission_results:
+            yield from permissions
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+def resolve_user_bindings(access_token, account_id, environment_id, groups, binding_cache, executor, offline=None):
+    """Return the policy bindings of a user's groups for all three scopes, in group/scope order."""
+    scopes = get_policy_scopes(account_id, environment_id)
+    binding_tasks = [(group["uuid"], scope) for group in groups for scope in scopes]
+
+    binding_results = executor.map(
+        lambda task: get_group_bindings_cached(access_token, task[1], task[0], binding_cache, offline),
+        binding_tasks
+    )
+    return [binding for bindings in binding_results for binding in bindings]
 
-    else:
-        print(f"\n Failed to retrieve user groups. Status Code: {response.status_code}, Response: {response.text}\n")
+############################################################################################
+## Bulk mode: check the permissions of many users from a file (non-interactive)
+############################################################################################
+def read_lines(source):
+    """Read one value (email, group ID or name) per line from an open file, skipping blanks, '#' comments and duplicates."""
+    seen = set()
+    values = []
+    for line in source:
+        value = line.strip()
+        if value and not value.startswith("#") and value.lower() not in seen:
+            seen.add(value.lower())
+            values.append(value)
+    return values
+
+def read_lines_from(path):
+    """read_lines for a file path ('-' for stdin). Raises OSError if the file cannot be read."""
+    if path == "-":
+        return read_lines(sys.stdin)
+    with open(path, encoding="utf-8") as source:
+        return read_lines(source)
+
+def map_in_window(executor, function, items, window):
+    """Like executor.map, but with at most `window` calls submitted ahead of the result being consumed."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def bulk_check_permissions(access_token, account_id, environment_id, emails, output, output_format="csv"):
+    """Resolve the permissions of many users and stream them to `output` (see RowWriter for the formats).
+
+    Group bindings and policy definitions are shared across users, so overlapping groups and
+    global policies are only fetched once per run. Users are resolved BULK_USER_WORKERS at a time
+    (at most twice that many are queued), and each user's rows are written as soon as the user is
+    resolved. A user whose lookups fail is reported and skipped. Progress messages go to stderr (see log).
+    Returns the number of users that could not be resolved.
+    """
+    fieldnames = ["email"] + PERMISSION_FIELDS
+    binding_cache = {}
+    failed = 0
+
+    def resolve(email):
+        try:
+            groups = fetch_user_groups(access_token, account_id, email)
+            if groups is None:
+                return email, None, "user not found"
+            return email, resolve_user_permissions(access_token, account_id, environment_id, groups, binding_cache, lookup_executor), None
+        except ApiRequestError as e:
+            return email, None, str(e)
+
+    with RowWriter(output, fieldnames, output_format, ["Email"] + PERMISSION_HEADERS) as writer, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as lookup_executor, \
+            ThreadPoolExecutor(max_workers=BULK_USER_WORKERS) as user_executor:
+        results = map_in_window(user_executor, resolve, emails, BULK_USER_WORKERS * 2)
+        for index, (email, permissions, error) in enumerate(results, start=1):
+            if permissions is None:
+                failed += 1
+                log(f" [{index}/{len(emails)}] {email}: failed ({error})")
+                continue
+
+            written = writer.write({"email": email, **permission._asdict()} for permission in permissions)
+            log(f" [{index}/{len(emails)}] {email}: {written} permission rows")
+
+    log(f"\n Bulk check finished: {len(emails) - failed} users resolved, {failed} failed.")
+    return failed
 
 ############################################################################################
 ## Menu Option 3: Get Users in Group
 ############################################################################################
 def get_users_in_group(access_token, account_id):
-    """Retrieve users in a specific group."""
-    group_id = input("\nEnter the Group ID: ").strip() or DEFAULT_GROUP_ID
+    """Retrieve users in a specific group (or the deduplicated members of several groups)."""
+    group_value = input("\nEnter the Group ID or Name (several: comma separated, * for all groups): ").strip() or DEFAULT_GROUP_ID
+    is_list = group_value == "*"
+    if "," in group_value:
+        # A name that itself contains commas is one group, not a list: that needs the group list,
+        # and without it the value must not be guessed to be a single group ID
+        try:
+            directory = load_group_directory(access_token, account_id)
+        except ApiRequestError as e:
+            print(f"\n Failed to load the group list. {e}\n")
+            return
+        is_list = find_group(directory, group_value) is None
+    if is_list:
+        expand_groups_from_menu(access_token, account_id, group_value)
+        return
 
-    url = f"https://api.dynatrace.com/iam/v1/accounts/{account_id}/groups/{group_id}/users"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {access_token}"
-    }
+    group_id = resolve_group_from_menu(access_token, account_id, group_value)
+    if not group_id:
+        return
 
-    response = requests.get(url, headers=headers, verify=False)
+    # Stream members page by page so very large groups are never held in memory at once
+    user_rows = (
+        [user["uid"], user["email"], user["name"], user["surname"]]
+        for user in iter_group_users(access_token, account_id, group_id)
+    )
 
-    if response.status_code == 200:
-        users_data = response.json()
-        if "items" in users_data and users_data["items"]:
-            print("\n Users in Group:")
-            user_table = [[user["uid"], user["email"], user["name"], user["surname"]] for user in users_data["items"]]
-            print(tabulate(user_table, headers=["User ID", "Email", "First Name", "Last Name"], tablefmt="grid"))
-        else:
-            print("\n No users found in this group.")
+    try:
+        total = print_table_stream(user_rows, ["User ID", "Email", "First Name", "Last Name"], title="\n Users in Group:")
+    except ApiRequestError as e:
+        print(f"\n Failed to get users. {e}\n")
+        return
+
+    if total:
+        print(f"\n {total} users in this group.")
     else:
-        print(f"\n Failed to get users. Status Code: {response.status_code}, Response: {response.text}\n")
+        print("\n No users found in this group.")
 
 ############################################################################################
-## Menu Option 4: Geta group's policies
+## Bulk membership: many groups' members as one deduplicated user table (Option 3 with several groups)
 ############################################################################################
-def get_policies_for_group(access_token, account_id, environment_id, group_id=None, return_policies=False, is_from_menu=False):
-    """Retrieve and display policies for a user group from all three levels (Global, Account, Environment).
-    
-    - If called from the menu (Option #4), prompt the user for a Group ID and display the results.
-    - Otherwise, use the provided `group_id` (e.g., when calling from `get_user_groups_and_permissions`).
+def get_group_members_cached(access_token, account_id, group_id, refresh=False):
+    """Return a group's members, reused from the membership cache for MEMBERSHIP_CACHE_TTL seconds.
+
+    After that the list is revalidated with If-None-Match when the API sent an ETag (a 304 keeps
+    the cached list), otherwise downloaded again. ETags are only kept for single-page lists, since
+    one covers the first page only. Raises ApiRequestError on failure.
     """
-    
-    if is_from_menu:  # Only prompt for Group ID if coming from the menu
-        group_id = input("\nEnter the Group ID: ").strip()
-        if not group_id:
-            print("\n No Group ID provided. Exiting...")
-            return None
+    key = (account_id, group_id)
+    with membership_cache_lock:
+        cached = membership_cache.get(key)
+        if cached:
+            membership_cache.move_to_end(key)
+    if cached and not refresh and time.time() - cached["checked_at"] < MEMBERSHIP_CACHE_TTL:
+        return cached["users"]
+
+    url = f"{API_BASE_URL}/iam/v1/accounts/{account_id}/groups/{group_id}/users"
+    headers = {"If-None-Match": cached["etag"]} if cached and cached["etag"] and not refresh else None
+    response = api_request("GET", url, access_token, headers=headers, params={"pageSize": PAGE_SIZE} if PAGE_SIZE else None)
+
+    if response.status_code == 304:
+        entry = dict(cached, checked_at=time.time())
+    elif response.status_code == 200:
+        page = response.json()
+        users = page.get("items", [])
+        etag = response.headers.get("ETag")
+        if page.get("nextPageKey"):
+            users = users + list(iter_api_items(url, access_token, "items", {"nextPageKey": page["nextPageKey"]}))
+            etag = None
+        entry = {"checked_at": time.time(), "etag": etag, "users": users}
+    else:
+        raise ApiRequestError(response)
+
+    with membership_cache_lock:
+        membership_cache[key] = entry
+        membership_cache.move_to_end(key)
+        while len(membership_cache) > MEMBERSHIP_CACHE_MAX_SIZE:
+            membership_cache.popitem(last=False)
+    return entry["users"]
+
+def expand_group_memberships(access_token, account_id, groups=None, refresh=False, offline=None):
+    """Fetch the members of many groups concurrently and merge them into one deduplicated user table.
+
+    `groups` are group IDs or names (None = every group in the account). Each user appears once,
+    with the UUIDs of the selected groups they belong to. Returns {"groups": uuid -> group,
+    "users": uid -> user, "user_groups": uid -> [group uuids], "memberships": total, "missing":
+    values that matched no group}. Raises ApiRequestError if any member list could not be retrieved.
+    """
+    directory = load_group_directory(access_token, account_id, offline=offline)
+    missing = []
+    if groups is None:
+        selected = directory["by_uuid"]
+    else:
+        selected = {}
+        for value in groups:
+            group = find_group(directory, value)
+            if group:
+                selected[group["uuid"]] = group
+            else:
+                missing.append(value)
+
+    def get_members(group_uuid):
+        if is_offline(offline):
+            return fetch_group_users(access_token, account_id, group_uuid, offline)
+        return get_group_members_cached(access_token, account_id, group_uuid, refresh)
+
+    log(f"\n Expanding the members of {len(selected)} groups...")
+    users = {}
+    user_groups = {}
+    memberships = 0
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for group_uuid, members in zip(selected, executor.map(get_members, selected)):
+            group_uuid = intern_text(group_uuid)
+            memberships += len(members)
+            for user in members:
+                uid = intern_text(user.get("uid"))
+                users.setdefault(uid, user)
+                user_groups.setdefault(uid, []).append(group_uuid)
+
+    log(f" {memberships} memberships, {len(users)} unique users.")
+    return {"groups": selected, "users": users, "user_groups": user_groups, "memberships": memberships, "missing": missing}
+
+def iter_member_rows(expansion):
+    """Yield one MEMBER_FIELDS dict per user of an expansion, by email, with the names of their groups."""
+    groups = expansion["groups"]
+    for uid, user in sorted(expansion["users"].items(), key=lambda item: (item[1].get("email") or "").lower()):
+        row = {field: user.get(field) for field in USER_FIELDS}
+        row["groups"] = [groups[group_uuid].get("name", group_uuid) for group_uuid in expansion["user_groups"][uid]]
+        yield row
+
+def expand_groups_from_menu(access_token, account_id, group_value):
+    """Menu Option 3 with several groups: print each member once, with the groups they belong to."""
+    values = None if group_value == "*" else [value.strip() for value in group_value.split(",") if value.strip()]
+    try:
+        expansion = expand_group_memberships(access_token, account_id, values)
+    except ApiRequestError as e:
+        print(f"\n Failed to get users. {e}\n")
+        return
 
-    if not group_id:
-        print("\n No valid Group ID found. Exiting...")
-        return None
+    for value in expansion["missing"]:
+        print(f"\n No group found with ID or Name '{value}', skipping it.")
+    rows = (
+        [row["uid"], row["email"], row["name"], row["surname"], ", ".join(row["groups"])]
+        for row in iter_member_rows(expansion)
+    )
+    total = print_table_stream(rows, ["User ID", "Email", "First Name", "Last Name", "Groups"], title="\n Users in Groups:")
+    print(f"\n {total} unique users in {len(expansion['groups'])} groups ({expansion['memberships']} memberships).")
+
+############################################################################################
+## Menu Option 4: Geta group's policies
+############################################################################################
+def get_policies_for_group(access_token, account_id, environment_id, group_id=None, offline=None):
+    """Display the policies bound to a group at all three levels (Global, Account, Environment).
 
-    scopes = ["global", f"account/{account_id}", f"environment/{environment_id}"]
-    policies = []
+    - If called from the menu (Option #4), prompt the user for a Group ID or Name.
+    - Otherwise, use the provided `group_id` (e.g., to validate a new binding from Option #6).
+    """
+    if group_id is None:  # Only prompt for Group ID if coming from the menu
+        group_value = input("\nEnter the Group ID or Name: ").strip()
+        if not group_value:
+            print("\n No Group ID provided. Exiting...")
+            return
+        group_id = resolve_group_from_menu(access_token, account_id, group_value, offline)
+        if not group_id:
+            return
 
-    for scope in scopes:
-        scope_display = "Global" if scope == "global" else "Account" if "account" in scope else "Environment"
-        print(f"\n Checking {scope_display} policies for Group {group_id}...\n")
+    try:
+        policies = list_group_bindings(access_token, account_id, environment_id, group_id, offline)
+    except ApiRequestError as e:
+        print(f"\n Failed to get group policies. {e}\n")
+        return
 
-        url = f"https://api.dynatrace.com/iam/v1/repo/{scope}/bindings/groups/{group_id}?details=true"
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {access_token}"
-        }
+    if not policies:
+        print(f"\n No policies found for Group {group_id}.")
+        return
 
-        response = requests.get(url, headers=headers, verify=False)
+    print("\n Retrieved Policies for the Group:\n")
 
-        if response.status_code == 200:
-            policies_data = response.json()
-            policy_details = policies_data.get("bindingsDetails", [])
+    table_data = []
+    for policy in policies:
+        policy_uuid = policy.get("policyUuid", "N/A")
+        level_type = policy.get("levelType", "N/A")
+        level_id = policy.get("levelId", "N/A")
+        groups = ", ".join(policy.get("groups", [])) if policy.get("groups") else "None"
 
-            if policy_details:
-                policies.extend(policy_details)  # Store policies for later use
-            else:
-                print(f"\n No {scope_display} policies found for Group {group_id}.")
+        # Extract parameters, metadata, and boundaries
+        parameters = policy.get("parameters", {})
+        param_str = ", ".join([f"{key}: {value}" for key, value in parameters.items()]) if parameters else "None"
 
-        else:
-            print(f"\n Failed to get {scope_display} policies. Status Code: {response.status_code}, Response: {response.text}\n")
+        metadata = policy.get("metadata", {})
+        metadata_str = ", ".join([f"{key}: {value}" for key, value in metadata.items()]) if metadata else "None"
 
-    # If called from the menu, print the policies in a structured format
-    if is_from_menu and policies:
-        print("\n Retrieved Policies for the Group:\n")
+        boundaries = policy.get("boundaries", [])
+        boundary_str = ", ".join(boundaries) if boundaries else "None"
 
-        table_data = []
-        for policy in policies:
-            policy_uuid = policy.get("policyUuid", "N/A")
-            level_type = policy.get("levelType", "N/A")
-            level_id = policy.get("levelId", "N/A")
-            groups = ", ".join(policy.get("groups", [])) if policy.get("groups") else "None"
+        table_data.append([policy_uuid, level_type, level_id, groups, param_str, metadata_str, boundary_str])
 
-            # Extract parameters, metadata, and boundaries
-            parameters = policy.get("parameters", {})
-            param_str = ", ".join([f"{key}: {value}" for key, value in parameters.items()]) if parameters else "None"
+    print(tabulate(table_data, headers=["Policy UUID", "Level Type", "Level ID", "Groups", "Parameters", "Metadata", "Boundaries"], tablefmt="grid"))
 
-            metadata = policy.get("metadata", {})
-            metadata_str = ", ".join([f"{key}: {value}" for key, value in metadata.items()]) if metadata else "None"
+############################################################################################
+## Helper for 2/4/6: Get a group's policy bindings for a single scope
+############################################################################################
+def get_policy_scopes(account_id, environment_id):
+    """Return the binding scopes (Global, Account, Environment) in display order."""
+    return ["global", f"account/{account_id}", f"environment/{environment_id}"]
 
-            boundaries = policy.get("boundaries", [])
-            boundary_str = ", ".join(boundaries) if boundaries else "None"
+def run_once(cache, key, compute, lock=fan_out_lock):
+    """Return compute() for `key`, computed once per `cache` even when many threads ask at the same time.
 
-            table_data.append([policy_uuid, level_type, level_id, groups, param_str, metadata_str, boundary_str])
+    `lock` guards `cache`. Errors are not kept: waiting threads get the error, later ones try again.
+    """
+    with lock:
+        future = cache.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            cache[key] = future
+
+    if is_owner:
+        try:
+            future.set_result(compute())
+        except Exception as e:
+            with lock:
+                cache.pop(key, None)
+            future.set_exception(e)
+    return future.result()
+
+def get_group_bindings_cached(access_token, scope, group_id, binding_cache=None, offline=None):
+    """Like get_group_bindings_for_scope, but memoised in `binding_cache` (one API call per group/scope)."""
+    if binding_cache is None:
+        return get_group_bindings_for_scope(access_token, scope, group_id, offline)
+    return run_once(
+        binding_cache, (scope, group_id),
+        lambda: get_group_bindings_for_scope(access_token, scope, group_id, offline), binding_cache_lock
+    )
+
+def get_shared_binding_cache():
+    """Return the long-lived binding cache used by the service mode, emptied once it is BINDING_CACHE_TTL old."""
+    global shared_binding_cache_at
+    with binding_cache_lock:
+        if time.time() - shared_binding_cache_at >= BINDING_CACHE_TTL:
+            shared_binding_cache.clear()
+            shared_binding_cache_at = time.time()
+        return shared_binding_cache
+
+def parse_scope(scope):
+    """Split a scope string into (level_type, level_id), e.g. "account/<id>" -> ("account", "<id>")."""
+    if scope == "global":
+        return "global", "global"
+    level_type, level_id = scope.split("/", 1)
+    return level_type, level_id
+
+def get_scope_path(scope, account_id, environment_id):
+    """Map a scope name (global, account, environment) to its scope path, or None if it is not valid."""
+    return dict(zip(("global", "account", "environment"), get_policy_scopes(account_id, environment_id))).get(scope)
+
+def get_group_bindings_for_scope(access_token, scope, group_id, offline=None):
+    """Retrieve the policy bindings of a group for one scope (global, account/<id> or environment/<id>).
+
+    Raises ApiRequestError if the bindings could not be retrieved.
+    """
+    if is_offline(offline):
+        return snapshot_get_bindings(scope, group_id)
 
-        print(tabulate(table_data, headers=["Policy UUID", "Level Type", "Level ID", "Groups", "Parameters", "Metadata", "Boundaries"], tablefmt="grid"))
+    scope_display = "Global" if scope == "global" else "Account" if "account" in scope else "Environment"
+    log(f"\n Checking {scope_display} policies for Group {group_id}...\n")
 
-    return policies if return_policies else None
-        
+    url = f"{API_BASE_URL}/iam/v1/repo/{scope}/bindings/groups/{group_id}?details=true"
+    response = api_request("GET", url, access_token)
+    if response.status_code != 200:
+        raise ApiRequestError(response)
+    return [compact_binding(binding) for binding in response.json().get("bindingsDetails", [])]
 
 ############################################################################################
 ## Menu Option 5: Lookup group by ID or Name
 ############################################################################################
 def lookup_group_by_id_or_name(access_token, account_id):
     """Look up a group by its UUID or name."""
-    url = f"https://api.dynatrace.com/iam/v1/accounts/{account_id}/groups"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {access_token}"
-    }
+    print("\nChoose search method:")
+    print("1. Search by Group UUID")
+    print("2. Search by Group Name")
+    print("3. Search by partial Group Name")
+    print("4. Refresh cached group list")
+    search_choice = input("Enter your choice: ").strip()
+
+    try:
+        directory = load_group_directory(access_token, account_id, refresh=(search_choice == "4"))
+    except ApiRequestError as e:
+        print(f"\n Failed to retrieve groups. {e}\n")
+        return
+    if not directory["groups"]:
+        print("\n No groups found.")
+        return
 
-    response = requests.get(url, headers=headers, verify=False)
+    if search_choice == "1":
+        group_uuid = input("\nEnter Group UUID: ").strip()
+        group = directory["by_uuid"].get(group_uuid)
 
-    if response.status_code == 200:
-        groups_data = response.json().get("items", [])
-        if not groups_data:
-            print("\n No groups found.")
-            return
+        if group:
+            print(f"\n Group UUID '{group_uuid}' matches Group Name: {group.get('name', 'Unknown')}")
+        else:
+            print(f"\n No group found with UUID '{group_uuid}'.")
 
-        print("\nChoose search method:")
-        print("1. Search by Group UUID")
-        print("2. Search by Group Name")
-        search_choice = input("Enter your choice: ").strip()
+    elif search_choice == "2":
+        group_name = input("\nEnter Group Name: ").strip()
+        group = directory["by_name"].get(normalize_group_name(group_name))
 
-        if search_choice == "1":
-            group_uuid = input("\nEnter Group UUID: ").strip()
-            matching_groups = [g for g in groups_data if g.get("uuid") == group_uuid]
+        if group:
+            print(f"\n Group Name '{group_name}' matches Group UUID: {group.get('uuid', 'Unknown')}")
+        else:
+            print(f"\n No group found with Name '{group_name}'.")
 
-            if matching_groups:
-                print(f"\n Group UUID '{group_uuid}' matches Group Name: {matching_groups[0].get('name', 'Unknown')}")
-            else:
-                print(f"\n No group found with UUID '{group_uuid}'.")
+    elif search_choice == "3":
+        text = input("\nEnter part of the Group Name: ").strip()
+        matches = search_groups(directory, text)
 
-        elif search_choice == "2":
-            group_name = input("\nEnter Group Name: ").strip()
-            matching_groups = [g for g in groups_data if g.get("name", "").lower() == group_name.lower()]
+        if matches:
+            table_data = [[g.get("uuid", "N/A"), g.get("name", "N/A")] for g in matches]
+            print(tabulate(table_data, headers=["Group UUID", "Group Name"], tablefmt="grid"))
+        else:
+            print(f"\n No group names contain '{text}'.")
 
-            if matching_groups:
-                print(f"\n Group Name '{group_name}' matches Group UUID: {matching_groups[0].get('uuid', 'Unknown')}")
-            else:
-                print(f"\n No group found with Name '{group_name}'.")
+    elif search_choice == "4":
+        print(f"\n Group list refreshed ({len(directory['groups'])} groups).")
 
-        else:
-            print("\n Invalid choice. Please enter '1' or '2'.")
-    
     else:
-        print(f"\n Failed to retrieve groups. Status Code: {response.status_code}, Response: {response.text}\n")
+        print("\n Invalid choice. Please enter '1', '2', '3' or '4'.")
+
+############################################################################################
+## Helper for 3-6: Cached group directory for name <-> ID resolution
+############################################################################################
+def normalize_group_name(name):
+    """Normalize a group name for lookups (case-insensitive, collapsed whitespace)."""
+    return " ".join((name or "").split()).casefold()
+
+def load_group_directory(access_token, account_id, refresh=False, offline=None):
+    """Return the cached group directory, downloading the group list if it is stale or a refresh is requested.
+
+    The directory holds the raw group list plus hash indexes by UUID and normalized name and a
+    sorted name list for prefix search. Concurrent loads of one account's list share a single download;
+    other accounts are not held up by it. Raises ApiRequestError if the group list could not be retrieved.
+    """
+    key = (account_id, is_offline(offline))
+    with group_directory_lock:
+        directory = group_directories.get(key)
+        if not refresh and directory is not None and time.time() - directory["loaded_at"] < GROUP_DIRECTORY_TTL:
+            return directory
+
+        in_flight = group_directory_requests_in_flight.get(key)
+        is_owner = in_flight is None
+        if is_owner:
+            in_flight = Future()
+            group_directory_requests_in_flight[key] = in_flight
+
+    # Another thread is already downloading this group list, wait for its result
+    if not is_owner:
+        return in_flight.result()
+
+    try:
+        directory = build_group_directory(fetch_groups(access_token, account_id, offline=key[1]))
+    except Exception as e:
+        with group_directory_lock:
+            group_directory_requests_in_flight.pop(key, None)
+        in_flight.set_exception(e)
+        raise
+
+    with group_directory_lock:
+        group_directories[key] = directory
+        group_directory_requests_in_flight.pop(key, None)
+    in_flight.set_result(directory)
+    return directory
+
+def build_group_directory(groups):
+    """Index a group list by UUID and normalized name, with sorted names for prefix search."""
+    by_name = {}
+    for group in groups:
+        by_name.setdefault(normalize_group_name(group.get("name")), group)  # First match wins, as before
+
+    return {
+        "groups": groups,
+        "by_uuid": {group.get("uuid"): group for group in groups},
+        "by_name": by_name,
+        "sorted_names": sorted(by_name),
+        "loaded_at": time.time(),
+    }
+
+def search_groups(directory, text, limit=50):
+    """Return groups whose name starts with `text` (first), then groups whose name contains it."""
+    needle = normalize_group_name(text)
+    names = directory["sorted_names"]
+
+    # Prefix matches are a contiguous range of the sorted names
+    start = bisect.bisect_left(names, needle)
+    prefix_names = []
+    for name in names[start:]:
+        if not name.startswith(needle) or len(prefix_names) >= limit:
+            break
+        prefix_names.append(name)
+
+    prefix_set = set(prefix_names)
+    substring_names = [name for name in names if needle in name and name not in prefix_set]
+    return [directory["by_name"][name] for name in (prefix_names + substring_names)[:limit]]
+
+def find_group(directory, value):
+    """Return the group in a directory whose UUID or (normalized) name is `value`, or None."""
+    return directory["by_uuid"].get(value) or directory["by_name"].get(normalize_group_name(value))
+
+def resolve_group_id(access_token, account_id, value, offline=None):
+    """Resolve a group UUID or name to a group UUID, or None if no group matches.
+
+    UUIDs are used as-is without downloading the group list; names go through the cached directory.
+    """
+    if not value:
+        return None
+    if UUID_PATTERN.match(value):
+        return value
+
+    try:
+        directory = load_group_directory(access_token, account_id, offline=offline)
+    except ApiRequestError:
+        return value  # Could not load the group list, let the caller try the value as an ID
+
+    group = find_group(directory, value)
+    return group.get("uuid") if group else None
+
+def resolve_group_from_menu(access_token, account_id, value, offline=None):
+    """Like resolve_group_id, but tells the menu user which group was picked or suggests close matches."""
+    if not value:
+        print("\n No Group ID provided.")
+        return None
+
+    group_id = resolve_group_id(access_token, account_id, value, offline)
+    if UUID_PATTERN.match(value) or group_id == value:
+        return group_id
+
+    # The directory is cached by resolve_group_id, so this does not download the group list again
+    directory = load_group_directory(access_token, account_id, offline=offline)
+    if group_id:
+        print(f"\n Using Group '{directory['by_uuid'][group_id].get('name')}' ({group_id})")
+        return group_id
+
+    print(f"\n No group found with ID or Name '{value}'.")
+    suggestions = search_groups(directory, value, limit=5)
+    if suggestions:
+        print(" Did you mean: " + ", ".join(g.get("name", "") for g in suggestions))
+    return None
 
 ############################################################################################
 ## Menu Option 6: Bind a policy to a group
@@ -298,7 +1558,9 @@ def bind_policy_to_group(access_token, environment_id, account_id):
     """Bind a policy to a group."""
     print("\n🔗 Bind a Policy to a Group")
 
-    group_id = input("Enter Group ID: ").strip()
+    group_id = resolve_group_from_menu(access_token, account_id, input("Enter Group ID or Name: ").strip(), offline=False)
+    if not group_id:
+        return
     policy_id = input("Enter Policy ID: ").strip()
 
     # Collect parameters
@@ -336,28 +1598,228 @@ def bind_policy_to_group(access_token, environment_id, account_id):
         if add_more != "yes":
             break
 
-    url = f"https://api.dynatrace.com/iam/v1/repo/environment/{environment_id}/bindings/{policy_id}/{group_id}"
-    headers = {
-        "accept": "*/*",
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    try:
+        result = bind_policy(access_token, account_id, environment_id, group_id, policy_id, parameters, metadata, boundaries)
+    except ApiRequestError as e:
+        print(f"\n Failed to bind policy. {e}\n")
+        return
+
+    if result["status"] == "bound":
+        print("\n Policy successfully bound to group!")
+    elif result["status"] == "already bound":
+        print("\n The group already has this policy with the same parameters and boundaries.")
+    elif result["status"] == "not found after binding":
+        print("\n Policy was bound, but it does not show up in the group's policies yet.")
+    else:
+        print(f"\n Failed to bind policy: {result['status']}\n")
+        return
+
+    # Show the group's policies, which now include the validated binding
+    get_policies_for_group(access_token, account_id, environment_id, group_id, offline=False)
+
+def create_binding(access_token, scope, policy_id, group_id, parameters=None, metadata=None, boundaries=None):
+    """POST a policy binding for a group at a scope (global, account/<id> or environment/<id>). Returns the response."""
+    url = f"{API_BASE_URL}/iam/v1/repo/{scope}/bindings/{policy_id}/{group_id}"
+    headers = {"accept": "*/*"}
     payload = {
-        "parameters": parameters,
-        "metadata": metadata,
-        "boundaries": boundaries  # Now supports multiple boundary IDs
+        "parameters": parameters or {},
+        "metadata": metadata or {},
+        "boundaries": boundaries or []  # Now supports multiple boundary IDs
     }
 
-    response = requests.post(url, headers=headers, json=payload, verify=False)
+    response = api_request("POST", url, access_token, headers=headers, json=payload)
+    if response.status_code in BINDING_SUCCESS_CODES:
+        clear_binding_caches()
+    return response
 
-    if response.status_code in [200, 201, 204]:  # Accepting 204 as a success
-        print("\n Policy successfully bound to group!")
+def clear_binding_caches():
+    """Forget cached bindings and compiled permission indexes after bindings change, so checks see the new binding."""
+    with binding_cache_lock:
+        shared_binding_cache.clear()
+    with user_index_cache_lock:
+        user_index_cache.clear()
+    with reverse_index_lock:
+        reverse_indexes.clear()
 
-        # Call "Get Policies for a Group" to validate binding
-        print("\n Validating binding by retrieving updated group policies...\n")
-        get_policies_for_group(access_token, account_id, environment_id, group_id)
-    else:
-        print(f"\n Failed to bind policy. Status Code: {response.status_code}, Response: {response.text}\n")
+############################################################################################
+## Menu Option 14: Bulk policy binding from a manifest
+############################################################################################
+def parse_key_values(text):
+    """Parse "key=value;key2=value2" (CSV manifest cells) into a dict."""
+    pairs = {}
+    for item in (text or "").split(";"):
+        key, separator, value = item.partition("=")
+        if separator and key.strip():
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+def load_binding_manifest(path):
+    """Load binding entries from a YAML, JSON or CSV manifest.
+
+    Each entry has: group (ID or name), policy (UUID), scope (global/account/environment,
+    default environment), parameters, metadata and boundaries. In CSV, parameters/metadata are
+    "key=value;..." and boundaries are ";"-separated. Returns a list of dicts; raises OSError or
+    ValueError if the manifest cannot be read.
+    """
+    lower_path = path.lower()
+    with open(path, encoding="utf-8", newline="") as manifest:
+        if lower_path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ValueError("PyYAML is not installed. Use a CSV/JSON manifest or run: pip install pyyaml")
+            try:
+                data = yaml.safe_load(manifest) or []
+            except yaml.YAMLError as e:
+                raise ValueError(f"invalid YAML: {e}") from e
+        elif lower_path.endswith(".json"):
+            data = json.load(manifest)
+        else:
+            data = [
+                {
+                    "group": row.get("group", ""),
+                    "policy": row.get("policy", ""),
+                    "scope": row.get("scope", ""),
+                    "parameters": parse_key_values(row.get("parameters")),
+                    "metadata": parse_key_values(row.get("metadata")),
+                    "boundaries": [b.strip() for b in (row.get("boundaries") or "").split(";") if b.strip()],
+                }
+                for row in csv.DictReader(manifest)
+            ]
+
+    if isinstance(data, dict):
+        data = data.get("bindings") or []
+    if not isinstance(data, list):
+        raise ValueError("expected a list of bindings (or a 'bindings' list)")
+
+    entries = []
+    for number, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"entry {number} is not a mapping")
+        for field in ("parameters", "metadata"):
+            if not isinstance(item.get(field) or {}, dict):
+                raise ValueError(f"entry {number}: '{field}' must be a mapping of key: value")
+        if not isinstance(item.get("boundaries") or [], list):
+            raise ValueError(f"entry {number}: 'boundaries' must be a list")
+
+        group = str(item.get("group") or "").strip()
+        policy = str(item.get("policy") or "").strip()
+        if not group or not policy:
+            log(f"\n Manifest entry {number} is missing a group or policy, skipping.")
+            continue
+        entries.append({
+            "group": group,
+            "policy": policy,
+            "scope": str(item.get("scope") or "environment").strip().lower(),
+            "parameters": {str(k): str(v) for k, v in (item.get("parameters") or {}).items()},
+            "metadata": {str(k): str(v) for k, v in (item.get("metadata") or {}).items()},
+            "boundaries": [str(b) for b in (item.get("boundaries") or [])],
+        })
+    return entries
+
+def binding_matches(binding, entry):
+    """True if an existing binding already grants the manifest entry (same policy, parameters and boundaries)."""
+    return (
+        binding.get("policyUuid") == entry["policy"]
+        and (binding.get("parameters") or {}) == entry["parameters"]
+        and sorted(binding.get("boundaries") or []) == sorted(entry["boundaries"])
+    )
+
+def apply_binding_manifest(access_token, account_id, environment_id, entries, dry_run=False):
+    """Bind every manifest entry that is not already bound, then validate with one batched read.
+
+    Current bindings of every targeted group/scope are read once up front and diffed against the
+    manifest; only missing bindings are POSTed, MAX_WORKERS at a time. Returns the list of
+    entries with a "status" field (bound, already bound, would bind, failed, not found, invalid).
+    Raises ApiRequestError if the current bindings could not be read.
+    """
+    for entry in entries:
+        entry["status"] = None
+        entry["scope_path"] = get_scope_path(entry["scope"], account_id, environment_id)
+        if entry["scope_path"] is None:
+            entry["status"] = f"invalid scope '{entry['scope']}'"
+            continue
+        entry["group_id"] = resolve_group_id(access_token, account_id, entry["group"], offline=False)
+        if not entry["group_id"]:
+            entry["status"] = "group not found"
+
+    valid_entries = [entry for entry in entries if entry["status"] is None]
+    targets = sorted({(entry["scope_path"], entry["group_id"]) for entry in valid_entries})
+
+    def read_targets():
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(
+                lambda target: get_group_bindings_for_scope(access_token, target[0], target[1], offline=False), targets
+            )
+            return dict(zip(targets, results))
+
+    current = read_targets()
+    to_bind = []
+    for entry in valid_entries:
+        existing = current[(entry["scope_path"], entry["group_id"])]
+        if any(binding_matches(binding, entry) for binding in existing):
+            entry["status"] = "already bound"
+        elif dry_run:
+            entry["status"] = "would bind"
+        else:
+            to_bind.append(entry)
+
+    if to_bind:
+        log(f"\n Binding {len(to_bind)} policies ({len(valid_entries) - len(to_bind)} already bound)...\n")
+
+        def bind(entry):
+            try:
+                response = create_binding(
+                    access_token, entry["scope_path"], entry["policy"], entry["group_id"],
+                    entry["parameters"], entry["metadata"], entry["boundaries"]
+                )
+            except ApiRequestError as e:
+                return f"failed ({e})"
+            if response.status_code not in BINDING_SUCCESS_CODES:
+                return f"failed ({response.status_code}: {response.text[:100]})"
+            return None
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for entry, error in zip(to_bind, executor.map(bind, to_bind)):
+                entry["status"] = error
+
+        # Validate every successful POST with a single batched re-read of the affected groups/scopes
+        log("\n Validating bindings by retrieving updated group policies...\n")
+        updated = read_targets()
+        for entry in to_bind:
+            if entry["status"] is None:
+                existing = updated[(entry["scope_path"], entry["group_id"])]
+                bound = any(binding_matches(binding, entry) for binding in existing)
+                entry["status"] = "bound" if bound else "not found after binding"
+
+    return entries
+
+def apply_binding_manifest_from_menu(access_token, account_id, environment_id):
+    """Menu Option 14: prompt for a manifest path and apply it (optionally as a dry run)."""
+    path = input("\nEnter the manifest path (.yaml, .json or .csv): ").strip()
+    if not path:
+        print("\n No manifest provided.")
+        return
+    dry_run = input("Dry run only (show what would change)? (yes/no): ").strip().lower() == "yes"
+
+    try:
+        entries = load_binding_manifest(path)
+    except (OSError, ValueError) as e:
+        print(f"\n Could not read manifest: {e}")
+        return
+    if not entries:
+        print("\n No bindings to apply.")
+        return
+
+    try:
+        entries = apply_binding_manifest(access_token, account_id, environment_id, entries, dry_run)
+    except ApiRequestError as e:
+        print(f"\n Failed to read the current bindings. {e}\n")
+        return
+    print_binding_results(entries)
+
+def print_binding_results(entries):
+    """Print the outcome of apply_binding_manifest as a table."""
+    table_data = [[entry["group"], entry["policy"], entry["scope"], entry["status"]] for entry in entries]
+    print(tabulate(table_data, headers=["Group", "Policy", "Scope", "Status"], tablefmt="grid"))
 
 ############################################################################################
 ## Menu Option 7: Get Policy permissions by name
@@ -372,44 +1834,27 @@ def get_all_policies(access_token, environment_id,account_id):
     print("\nOptional: Enter policy name to filter by (or press Enter to list all):")
     policy_name = input("Policy name: ").strip()
 
-    if choice == "1":
-        scope_label = "global"
-        url = "https://api.dynatrace.com/iam/v1/repo/global/global/policies"
-    elif choice == "2":
-        scope_label = f"account/{account_id}"
-        url = f"https://api.dynatrace.com/iam/v1/repo/account/{account_id}/policies"
-    elif choice == "3":
-        scope_label = f"environment/{environment_id}"
-        url = f"https://api.dynatrace.com/iam/v1/repo/environment/{environment_id}/policies"
-    else:
+    scope_label = get_scope_path({"1": "global", "2": "account", "3": "environment"}.get(choice), account_id, environment_id)
+    if scope_label is None:
         print("\n Invalid choice.")
         return
 
-    if policy_name:
-        url += f"?name={policy_name}"
-
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {access_token}"
-    }
-
-    response = requests.get(url, headers=headers, verify=False)
-
-    if response.status_code == 200:
-        policies = response.json().get("policies", [])
+    level_type, level_id = parse_scope(scope_label)
+    table_data = (
+        [p.get("uuid", "N/A"), p.get("name", "N/A"), p.get("description", "N/A"), p.get("category", "N/A")]
+        for p in iter_policies(access_token, level_type, level_id, policy_name)
+    )
+
+    try:
+        total = print_table_stream(
+            table_data, ["Policy UUID", "Name", "Description", "Category"], title=f"\n Policies at {scope_label} level:\n"
+        )
+    except ApiRequestError as e:
+        print(f"\n Failed to retrieve policies. {e}")
+        return
 
-        if not policies:
-            print(f"\n No policies found at {scope_label} level.")
-            return
-
-        print(f"\n Policies at {scope_label} level:\n")
-        table_data = [
-            [p.get("uuid", "N/A"), p.get("name", "N/A"), p.get("description", "N/A"), p.get("category", "N/A")]
-            for p in policies
-        ]
-        print(tabulate(table_data, headers=["Policy UUID", "Name", "Description", "Category"], tablefmt="grid"))
-    else:
-        print(f"\n Failed to retrieve policies. Status Code: {response.status_code}, Response: {response.text}")
+    if not total:
+        print(f"\n No policies found at {scope_label} level.")
 
 ############################################################################################
 ## Menu Option 8: Get Policy metadata by ID
@@ -420,16 +1865,13 @@ def get_policy_metadata(access_token, account_id):
         print("\n No policy ID provided.")
         return
 
-    url = f"https://api.dynatrace.com/iam/v1/repo/account/{account_id}/policies/{policy_id}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {access_token}"
-    }
-
-    response = requests.get(url, headers=headers, verify=False)
+    try:
+        data = get_policy_details(access_token, account_id, policy_id)
+    except ApiRequestError as e:
+        print(f"\n Failed to retrieve policy metadata. {e}")
+        return
 
-    if response.status_code == 200:
-        data = response.json()
+    if data:
         print("\nPolicy Metadata:\n")
         print(f"UUID:        {data.get('uuid')}")
         print(f"Name:        {data.get('name')}")
@@ -446,96 +1888,1312 @@ def get_policy_metadata(access_token, account_id):
             for cond in stmt.get("conditions", []):
                 print(f"    • Condition: {cond.get('name')} {cond.get('operator')} {', '.join(cond.get('values', []))}")
     else:
-        print(f"\n Failed to retrieve policy metadata. Status Code: {response.status_code}, Response: {response.text}")
+        print(f"\n Policy '{policy_id}' was not found.")
 
 ############################################################################################
 ## Menu Option 7: Helper for 7/8
 ############################################################################################  
-def get_permissions_for_policy(access_token, policy_uuid, level_type, level_id, account_id, environment_id):
+def get_permissions_for_policy(access_token, policy_uuid, level_type, level_id, account_id, environment_id, offline=None):
     """Retrieve detailed permissions for a policy based on its scope (global, account, environment)."""
-    
+    level_id = get_policy_level_id(level_type, level_id, account_id, environment_id)
+    if level_id is None:
+        return None
+
+    policy_data = get_policy(access_token, level_type, level_id, policy_uuid, offline)
+    if not policy_data:
+        log(f"\n Policy {policy_uuid} ({level_type}) was not found, skipping its permissions.\n")
+        return []
+    return get_policy_permission_rows(policy_data, policy_uuid, level_type, level_id)
+
+def get_policy_level_id(level_type, level_id, account_id, environment_id):
+    """Return the level ID a policy is stored under ("global", or the account/environment ID), or None for an unknown level."""
     if level_type == "global":
-        url = f"https://api.dynatrace.com/iam/v1/repo/global/global/policies/{policy_uuid}"
+        return "global"
     elif level_type == "account":
-        url = f"https://api.dynatrace.com/iam/v1/repo/account/{account_id}/policies/{policy_uuid}"
+        return level_id or account_id
     elif level_type == "environment":
-        url = f"https://api.dynatrace.com/iam/v1/repo/environment/{environment_id}/policies/{policy_uuid}"
+        return level_id or environment_id
+    return None
+
+def get_policy_permission_rows(policy_data, policy_uuid, level_type, level_id):
+    """Flatten a policy definition into one PermissionRow per permission of each statement."""
+    policy_uuid, level_type, level_id = intern_text(policy_uuid), intern_text(level_type), intern_text(level_id)
+    permissions = []
+    for statement in policy_data.get("statements", []):
+        effect = intern_text(statement.get("effect", "N/A"))
+        permission_list = statement.get("permissions", [])
+        conditions = statement.get("conditions", [])
+
+        # One condition string per statement, shared by all of its permissions (None without conditions)
+        condition_str = None
+        if conditions:
+            condition_str = intern_text("; ".join([
+                f"{cond['name']} {cond['operator']} {', '.join(cond['values'])}"
+                for cond in conditions
+            ]))
+
+        for permission in permission_list:
+            permissions.append(PermissionRow(policy_uuid, level_type, level_id, effect, intern_text(permission), condition_str))
+
+    return permissions
+
+############################################################################################
+## Policy cache: shared policy definitions for 2/7/8
+############################################################################################
+def get_policy_url(level_type, level_id, policy_uuid):
+    """Build the policy repo URL for a policy at the global, account or environment level."""
+    if level_type == "global":
+        return f"{API_BASE_URL}/iam/v1/repo/global/global/policies/{policy_uuid}"
+    elif level_type in ("account", "environment"):
+        return f"{API_BASE_URL}/iam/v1/repo/{level_type}/{level_id}/policies/{policy_uuid}"
+    return None
+
+def get_policy(access_token, level_type, level_id, policy_uuid, offline=None):
+    """Return a policy definition, served from the in-process cache while it is fresh.
+
+    Concurrent lookups of the same policy share a single API call. Failed lookups are not cached.
+    Returns None if the policy does not exist; raises ApiRequestError if the lookup failed.
+    """
+    if is_offline(offline):
+        return snapshot_get_policy(level_type, level_id, policy_uuid)
+
+    key = (level_type, level_id, policy_uuid)
+
+    with policy_cache_lock:
+        cached = get_cached_policy(key)
+        if cached is not None:
+            return cached
+
+        in_flight = policy_requests_in_flight.get(key)
+        if in_flight is None:
+            in_flight = Future()
+            policy_requests_in_flight[key] = in_flight
+            is_owner = True
+        else:
+            is_owner = False
+
+    # Another thread is already downloading this policy, wait for its result
+    if not is_owner:
+        return in_flight.result()
+
+    policy_data = None
+    try:
+        url = get_policy_url(level_type, level_id, policy_uuid)
+        if url:
+            response = api_request("GET", url, access_token)
+            if response.status_code == 200:
+                policy_data = response.json()
+            elif response.status_code != 404:
+                raise ApiRequestError(response)
+    except Exception as e:
+        with policy_cache_lock:
+            policy_requests_in_flight.pop(key, None)
+        in_flight.set_exception(e)
+        raise
+
+    with policy_cache_lock:
+        if policy_data is not None:
+            cache_policy(key, policy_data)
+        policy_requests_in_flight.pop(key, None)
+    in_flight.set_result(policy_data)
+
+    return policy_data
+
+def get_cached_policy(key):
+    """Return a cached policy definition while it is fresh, else None. Call with policy_cache_lock held."""
+    cached = policy_cache.get(key)
+    if cached and time.time() - cached[0] < POLICY_CACHE_TTL:
+        policy_cache.move_to_end(key)
+        return cached[1]
+    return None
+
+def cache_policy(key, policy_data):
+    """Store a policy definition, evicting the least recently used beyond POLICY_CACHE_MAX_SIZE. Call with policy_cache_lock held."""
+    policy_cache[key] = (time.time(), policy_data)
+    policy_cache.move_to_end(key)
+    while len(policy_cache) > POLICY_CACHE_MAX_SIZE:
+        policy_cache.popitem(last=False)
+
+############################################################################################
+## Menu Option 10/11: Local snapshot of the IAM graph for offline queries
+############################################################################################
+SNAPSHOT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot_meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS groups (
+    uuid TEXT PRIMARY KEY, name TEXT, updated_at TEXT, data TEXT, synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS group_users (
+    group_uuid TEXT, uid TEXT, email TEXT, name TEXT, surname TEXT,
+    PRIMARY KEY (group_uuid, uid)
+);
+CREATE INDEX IF NOT EXISTS idx_group_users_email ON group_users (email COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS bindings (
+    group_uuid TEXT, level_type TEXT, level_id TEXT, position INTEGER, policy_uuid TEXT, data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bindings_group ON bindings (group_uuid, level_type, level_id);
+CREATE TABLE IF NOT EXISTS policies (
+    level_type TEXT, level_id TEXT, uuid TEXT, name TEXT, summary TEXT, definition TEXT, synced_at REAL,
+    PRIMARY KEY (level_type, level_id, uuid)
+);
+CREATE TABLE IF NOT EXISTS entity_hashes (
+    kind TEXT, entity_key TEXT, content_hash TEXT, synced_at REAL,
+    PRIMARY KEY (kind, entity_key)
+);
+"""
+
+def open_snapshot(path=None):
+    """Open (and create if needed) the local SQLite snapshot."""
+    conn = sqlite3.connect(path or SNAPSHOT_DB_PATH)
+    conn.executescript(SNAPSHOT_SCHEMA)
+    return conn
+
+def open_snapshot_read_only(path):
+    """Open an existing snapshot without creating or changing it. Raises ValueError if it cannot be opened."""
+    try:
+        conn = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+        conn.execute("SELECT 1 FROM entity_hashes LIMIT 1")
+    except sqlite3.Error as e:
+        raise ValueError(f"Snapshot '{path}' cannot be read ({e}).") from e
+    return conn
+
+def content_hash(content):
+    """Stable SHA-256 of a JSON-serializable entity, used to detect changes between syncs."""
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def sync_snapshot(access_token, account_id, environment_id, incremental=False, keep_previous=False):
+    """Pull groups, memberships, bindings (all three scopes) and policies into the local snapshot.
+
+    A full sync re-fetches everything. An incremental sync re-fetches the bindings of every group
+    (binding changes do not touch a group's updatedAt) but only the members of groups that are new,
+    whose updatedAt changed or that are older than SNAPSHOT_MAX_AGE, and only policy definitions
+    that are missing or stale. Every entity is content-hashed, so unchanged ones are not rewritten.
+    With keep_previous, the existing snapshot is first copied to SNAPSHOT_PREVIOUS_PATH for drift
+    reports. Groups or policy listings that fail to download keep their previous rows.
+    Returns True when the snapshot was written, False if the group list could not be retrieved.
+    """
+    started_at = time.time()
+    if keep_previous:
+        try:
+            shutil.copyfile(SNAPSHOT_DB_PATH, SNAPSHOT_PREVIOUS_PATH)
+        except FileNotFoundError:
+            pass  # First sync: nothing to keep yet
+
+    try:
+        groups = fetch_groups(access_token, account_id, offline=False)
+    except ApiRequestError as e:
+        log(f"\n Sync aborted: could not retrieve groups. {e}")
+        return False
+
+    scopes = get_policy_scopes(account_id, environment_id)
+
+    with closing(open_snapshot()) as conn:
+        known_groups = {
+            uuid: (updated_at, synced_at)
+            for uuid, updated_at, synced_at in conn.execute("SELECT uuid, updated_at, synced_at FROM groups")
+        }
+
+        def needs_refresh(group):
+            known = known_groups.get(group["uuid"])
+            return (
+                not incremental or known is None
+                or known[0] != group.get("updatedAt")
+                or started_at - (known[1] or 0) > SNAPSHOT_MAX_AGE
+            )
+
+        stale_groups = {group["uuid"] for group in groups if needs_refresh(group)}
+        log(f"\n Syncing bindings of {len(groups)} groups and members of {len(stale_groups)}...\n")
+
+        def fetch_group_details(group):
+            """Return (group, users, bindings); users is None when the membership is kept, both when the group failed."""
+            try:
+                users = None
+                if group["uuid"] in stale_groups:
+                    users = fetch_group_users(access_token, account_id, group["uuid"], offline=False)
+                bindings = [get_group_bindings_for_scope(access_token, scope, group["uuid"], offline=False) for scope in scopes]
+            except ApiRequestError as e:
+                log(f"\n Could not sync group {group['uuid']}, keeping its previous data. {e}")
+                return group, None, None
+            return group, users, bindings
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            group_details = list(executor.map(fetch_group_details, groups))
+
+        known_hashes = {
+            (kind, key): digest
+            for kind, key, digest in conn.execute("SELECT kind, entity_key, content_hash FROM entity_hashes")
+        }
+        changed_entities = 0
+
+        def write_if_changed(kind, key, content, write):
+            """Run `write` and record the new hash only if the entity's content hash changed."""
+            nonlocal changed_entities
+            digest = content_hash(content)
+            if known_hashes.get((kind, key)) == digest:
+                return
+            write()
+            conn.execute(
+                "INSERT OR REPLACE INTO entity_hashes (kind, entity_key, content_hash, synced_at) VALUES (?, ?, ?, ?)",
+                (kind, key, digest, started_at)
+            )
+            changed_entities += 1
+
+        with conn:
+            # Drop groups that no longer exist in the account
+            current_uuids = {group["uuid"] for group in groups}
+            for uuid in set(known_groups) - current_uuids:
+                conn.execute("DELETE FROM groups WHERE uuid = ?", (uuid,))
+                conn.execute("DELETE FROM group_users WHERE group_uuid = ?", (uuid,))
+                conn.execute("DELETE FROM bindings WHERE group_uuid = ?", (uuid,))
+                conn.execute(
+                    "DELETE FROM entity_hashes WHERE (kind IN ('group', 'members') AND entity_key = ?) "
+                    "OR (kind = 'bindings' AND entity_key LIKE ?)",
+                    (uuid, f"{uuid}|%")
+                )
+
+            for group, users, bindings in group_details:
+                if bindings is None:
+                    continue  # Keep the previous data rather than recording an empty group
+                group_uuid = group["uuid"]
+
+                if users is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO groups (uuid, name, updated_at, data, synced_at) VALUES (?, ?, ?, ?, ?)",
+                        (group_uuid, group.get("name"), group.get("updatedAt"), json.dumps(group), started_at)
+                    )
+                    write_if_changed("group", group_uuid, group, lambda: None)
+
+                    def write_members():
+                        conn.execute("DELETE FROM group_users WHERE group_uuid = ?", (group_uuid,))
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO group_users (group_uuid, uid, email, name, surname) VALUES (?, ?, ?, ?, ?)",
+                            [(group_uuid, user.get("uid"), user.get("email"), user.get("name"), user.get("surname")) for user in users]
+                        )
+                    members = sorted(
+                        ([user.get("uid"), user.get("email")] for user in users),
+                        key=lambda member: (member[0] or "", member[1] or "")
+                    )
+                    write_if_changed("members", group_uuid, members, write_members)
+
+                for scope, scope_bindings in zip(scopes, bindings):
+                    level_type, level_id = parse_scope(scope)
+
+                    def write_bindings():
+                        conn.execute(
+                            "DELETE FROM bindings WHERE group_uuid = ? AND level_type = ? AND level_id = ?",
+                            (group_uuid, level_type, level_id)
+                        )
+                        conn.executemany(
+                            "INSERT INTO bindings (group_uuid, level_type, level_id, position, policy_uuid, data) VALUES (?, ?, ?, ?, ?, ?)",
+                            [
+                                (group_uuid, level_type, level_id, position, binding.get("policyUuid"), json.dumps(binding))
+                                for position, binding in enumerate(scope_bindings)
+                            ]
+                        )
+                    write_if_changed(
+                        "bindings", f"{group_uuid}|{level_type}|{level_id}",
+                        sorted(json.dumps(binding, sort_keys=True) for binding in scope_bindings), write_bindings
+                    )
+
+        # Policy listings for every scope, plus any bound policy that is not listed
+        listed_policies = {}
+        listing_failed = False
+        for scope in scopes:
+            level_type, level_id = parse_scope(scope)
+            try:
+                policies = fetch_policies(access_token, level_type, level_id, offline=False)
+            except ApiRequestError as e:
+                log(f"\n Could not list {scope} policies, keeping the previous ones. {e}")
+                listing_failed = True
+                continue
+            for policy in policies:
+                listed_policies[(level_type, level_id, policy.get("uuid"))] = policy
+
+        bound_policies = {
+            (level_type, level_id, policy_uuid)
+            for level_type, level_id, policy_uuid in conn.execute("SELECT DISTINCT level_type, level_id, policy_uuid FROM bindings")
+        }
+        known_policies = {
+            (level_type, level_id, uuid): synced_at
+            for level_type, level_id, uuid, synced_at in conn.execute(
+                "SELECT level_type, level_id, uuid, synced_at FROM policies WHERE definition IS NOT NULL"
+            )
+        }
+        stale_policies = [
+            key for key in sorted(set(listed_policies) | bound_policies)
+            if not incremental or started_at - known_policies.get(key, 0) > SNAPSHOT_MAX_AGE
+        ]
+        log(f"\n Syncing {len(stale_policies)} policy definitions...\n")
+
+        def fetch_definition(key):
+            try:
+                return get_policy(access_token, *key, offline=False)
+            except ApiRequestError as e:
+                log(f"\n Could not sync policy {key[2]}, keeping its previous definition. {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            definitions = list(executor.map(fetch_definition, stale_policies))
+
+        with conn:
+            # Drop policies that are neither listed nor bound any more (only when every listing succeeded)
+            current_policies = set(listed_policies) | bound_policies
+            stored_policies = set(conn.execute("SELECT level_type, level_id, uuid FROM policies").fetchall())
+            for key in set() if listing_failed else stored_policies - current_policies:
+                conn.execute("DELETE FROM policies WHERE level_type = ? AND level_id = ? AND uuid = ?", key)
+                conn.execute("DELETE FROM entity_hashes WHERE kind = 'policy' AND entity_key = ?", ("|".join(key),))
+
+            for key, summary in listed_policies.items():
+                conn.execute(
+                    "INSERT INTO policies (level_type, level_id, uuid, name, summary) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (level_type, level_id, uuid) DO UPDATE SET name = excluded.name, summary = excluded.summary",
+                    (*key, summary.get("name"), json.dumps(summary))
+                )
+            for key, definition in zip(stale_policies, definitions):
+                if definition is None:
+                    continue
+                conn.execute(
+                    "UPDATE policies SET synced_at = ? WHERE level_type = ? AND level_id = ? AND uuid = ?", (started_at, *key)
+                )
+                write_if_changed("policy", "|".join(key), definition, lambda: conn.execute(
+                    "INSERT INTO policies (level_type, level_id, uuid, name, definition, synced_at) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (level_type, level_id, uuid) DO UPDATE SET definition = excluded.definition, synced_at = excluded.synced_at",
+                    (*key, definition.get("name"), json.dumps(definition), started_at)
+                ))
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO snapshot_meta (key, value) VALUES (?, ?)",
+                [("account_id", account_id), ("environment_id", environment_id), ("synced_at", str(started_at))]
+            )
+
+    log(f"\n Snapshot written to {SNAPSHOT_DB_PATH} in {time.time() - started_at:.1f}s ({changed_entities} entities changed).")
+    return True
+
+def snapshot_get_user_groups(email):
+    """Return a user's groups from the snapshot, or None if the user is not in it."""
+    with closing(open_snapshot()) as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT g.uuid, g.name FROM group_users gu JOIN groups g ON g.uuid = gu.group_uuid "
+            "WHERE gu.email = ? COLLATE NOCASE",
+            (email,)
+        ).fetchall()
+
+    if not rows:
+        return None
+    return sort_user_groups({"uuid": uuid, "groupName": name} for uuid, name in rows)
+
+def snapshot_get_group_users(group_id):
+    """Return the members of a group from the snapshot."""
+    with closing(open_snapshot()) as conn:
+        rows = conn.execute(
+            "SELECT uid, email, name, surname FROM group_users WHERE group_uuid = ? ORDER BY email", (group_id,)
+        ).fetchall()
+    return [{"uid": uid, "email": email, "name": name, "surname": surname} for uid, email, name, surname in rows]
+
+def snapshot_get_groups():
+    """Return every group from the snapshot."""
+    with closing(open_snapshot()) as conn:
+        rows = conn.execute("SELECT data FROM groups ORDER BY name").fetchall()
+    return [json.loads(data) for (data,) in rows]
+
+def snapshot_get_bindings(scope, group_id):
+    """Return a group's bindings for one scope from the snapshot, in API order."""
+    level_type, level_id = parse_scope(scope)
+    with closing(open_snapshot()) as conn:
+        rows = conn.execute(
+            "SELECT data FROM bindings WHERE group_uuid = ? AND level_type = ? AND level_id = ? ORDER BY position",
+            (group_id, level_type, level_id)
+        ).fetchall()
+    return [compact_binding(json.loads(data)) for (data,) in rows]
+
+def snapshot_get_policy(level_type, level_id, policy_uuid):
+    """Return a policy definition from the snapshot, or None if it was not synced."""
+    with closing(open_snapshot()) as conn:
+        row = conn.execute(
+            "SELECT definition FROM policies WHERE level_type = ? AND level_id = ? AND uuid = ? AND definition IS NOT NULL",
+            (level_type, level_id, policy_uuid)
+        ).fetchone()
+
+    if row is None:
+        return None
+    return json.loads(row[0])
+
+def snapshot_get_policies(level_type, level_id, policy_name=None):
+    """Return the policies listed at a level from the snapshot, optionally filtered by name."""
+    query = "SELECT summary FROM policies WHERE level_type = ? AND level_id = ? AND summary IS NOT NULL"
+    params = [level_type, level_id]
+    if policy_name:
+        query += " AND name LIKE ?"
+        params.append(f"%{policy_name}%")
+
+    with closing(open_snapshot()) as conn:
+        rows = conn.execute(query + " ORDER BY name", params).fetchall()
+    return [json.loads(summary) for (summary,) in rows]
+
+def get_snapshot_info():
+    """Return the snapshot metadata (account_id, environment_id, synced_at) as a dict."""
+    with closing(open_snapshot()) as conn:
+        return dict(conn.execute("SELECT key, value FROM snapshot_meta").fetchall())
+
+############################################################################################
+## Menu Option 15: Drift report between two snapshots
+############################################################################################
+def describe_entity(conn, kind, key):
+    """Load the comparable content of one snapshot entity as a set of readable lines."""
+    if kind == "group":
+        row = conn.execute("SELECT name FROM groups WHERE uuid = ?", (key,)).fetchone()
+        return {f"name: {row[0]}"} if row else set()
+    if kind == "members":
+        return {email or uid for uid, email in conn.execute("SELECT uid, email FROM group_users WHERE group_uuid = ?", (key,))}
+    if kind == "bindings":
+        group_uuid, level_type, level_id = key.split("|", 2)
+        rows = conn.execute(
+            "SELECT data FROM bindings WHERE group_uuid = ? AND level_type = ? AND level_id = ?", (group_uuid, level_type, level_id)
+        )
+        lines = set()
+        for (data,) in rows:
+            binding = json.loads(data)
+            parameters = ", ".join(f"{k}={v}" for k, v in sorted((binding.get("parameters") or {}).items()))
+            boundaries = ", ".join(sorted(binding.get("boundaries") or []))
+            lines.add(f"{binding.get('policyUuid')} params[{parameters}] boundaries[{boundaries}]")
+        return lines
+    if kind == "policy":
+        level_type, level_id, uuid = key.split("|", 2)
+        row = conn.execute(
+            "SELECT definition FROM policies WHERE level_type = ? AND level_id = ? AND uuid = ?", (level_type, level_id, uuid)
+        ).fetchone()
+        if not row or not row[0]:
+            return set()
+        lines = set()
+        for statement in json.loads(row[0]).get("statements", []):
+            conditions = "; ".join(
+                f"{cond.get('name')} {cond.get('operator')} {', '.join(cond.get('values', []))}"
+                for cond in statement.get("conditions", [])
+            )
+            for permission in statement.get("permissions", []):
+                lines.add(f"{statement.get('effect')} {permission}" + (f" WHERE {conditions}" if conditions else ""))
+        return lines
+    return set()
+
+def diff_snapshots(old_path, new_path):
+    """Compare two snapshots and return only the entities that changed.
+
+    Entities are matched by their content hashes, so unchanged groups, memberships, bindings and
+    policies are skipped without loading them. For every added, removed or changed entity the
+    returned dict lists the lines that were added and removed. Both snapshots are opened read-only;
+    raises ValueError if either is missing or is not a snapshot.
+    """
+    with closing(open_snapshot_read_only(old_path)) as old_conn, closing(open_snapshot_read_only(new_path)) as new_conn:
+        old_hashes = {(kind, key): digest for kind, key, digest in old_conn.execute("SELECT kind, entity_key, content_hash FROM entity_hashes")}
+        new_hashes = {(kind, key): digest for kind, key, digest in new_conn.execute("SELECT kind, entity_key, content_hash FROM entity_hashes")}
+
+        deltas = []
+        for kind, key in sorted(set(old_hashes) | set(new_hashes)):
+            old_digest = old_hashes.get((kind, key))
+            new_digest = new_hashes.get((kind, key))
+            if old_digest == new_digest:
+                continue
+
+            change = "added" if old_digest is None else "removed" if new_digest is None else "changed"
+            old_lines = describe_entity(old_conn, kind, key) if old_digest else set()
+            new_lines = describe_entity(new_conn, kind, key) if new_digest else set()
+            deltas.append({
+                "kind": kind,
+                "key": key,
+                "change": change,
+                "added": sorted(new_lines - old_lines),
+                "removed": sorted(old_lines - new_lines),
+            })
+    return deltas
+
+def print_drift_report(deltas):
+    """Print the result of diff_snapshots as a table."""
+    if not deltas:
+        print("\n No changes between the snapshots.")
+        return
+
+    table_data = [
+        [delta["kind"], delta["key"], delta["change"], "\n".join("+ " + line for line in delta["added"]),
+         "\n".join("- " + line for line in delta["removed"])]
+        for delta in deltas
+    ]
+    print(tabulate(table_data, headers=["Entity", "Key", "Change", "Added", "Removed"], tablefmt="grid"))
+
+def drift_report_from_menu():
+    """Menu Option 15: compare a previous snapshot with the current one."""
+    old_path = input(f"\nEnter the previous snapshot path (or press Enter for {SNAPSHOT_PREVIOUS_PATH}): ").strip() or SNAPSHOT_PREVIOUS_PATH
+    new_path = input(f"Enter the current snapshot path (or press Enter for {SNAPSHOT_DB_PATH}): ").strip() or SNAPSHOT_DB_PATH
+
+    try:
+        deltas = diff_snapshots(old_path, new_path)
+    except ValueError as e:
+        print(f"\n {e} Sync with 'keep previous snapshot' first (option 10).")
+        return
+    print_drift_report(deltas)
+
+def sync_snapshot_from_menu(access_token, account_id, environment_id):
+    """Menu Option 10: prompt for full or incremental sync and write the snapshot."""
+    print("\nChoose sync type:")
+    print("1. Full sync")
+    print("2. Incremental refresh (only new, changed or stale entities)")
+    choice = input("Enter your choice: ").strip()
+
+    if choice not in ("1", "2"):
+        print("\n Invalid choice. Please enter '1' or '2'.")
+        return
+    keep_previous = input(f"Keep the previous snapshot for drift reports ({SNAPSHOT_PREVIOUS_PATH})? (yes/no): ").strip().lower() == "yes"
+
+    if not sync_snapshot(access_token, account_id, environment_id, incremental=(choice == "2"), keep_previous=keep_previous):
+        print("\n Sync failed: could not retrieve groups.")
+
+def toggle_offline_mode():
+    """Menu Option 11: switch Options 2-5, 7 and 8 between the live API and the local snapshot."""
+    global use_snapshot
+
+    if not use_snapshot:
+        info = get_snapshot_info()
+        if "synced_at" not in info:
+            print("\n No local snapshot found. Run option 10 first.")
+            return
+        synced_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(info["synced_at"])))
+        use_snapshot = True
+        print(f"\n Offline mode ON. Answering from snapshot taken {synced_at}.")
     else:
+        use_snapshot = False
+        print("\n Offline mode OFF. Answering from the live API.")
+
+############################################################################################
+## Menu Option 12: Effective-permission evaluation engine
+############################################################################################
+def substitute_bind_parameters(value, parameters):
+    """Replace ${bindParam:name} placeholders in a condition value with the binding's parameters."""
+    return re.sub(r"\$\{bindParam:([^}]+)\}", lambda m: str(parameters.get(m.group(1), m.group(0))), value)
+
+def get_binding_policy(access_token, binding, account_id, environment_id):
+    """Return the (cached) policy definition referenced by a binding."""
+    level_type = binding["levelType"]
+    level_id = get_policy_level_id(level_type, binding.get("levelId"), account_id, environment_id)
+    return get_policy(access_token, level_type, level_id, binding["policyUuid"])
+
+def compile_permission_index(access_token, account_id, environment_id, bindings, executor=None):
+    """Compile the statements of every bound policy into an index keyed by permission.
+
+    Each grant records effect, policy, level, conditions (with bind parameters filled in),
+    boundaries and, if the binding carries a "groupUuid", the group it came from.
+    Permissions containing '*' are kept in a separate wildcard list.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+    try:
+        definitions = list(executor.map(
+            lambda binding: get_binding_policy(access_token, binding, account_id, environment_id),
+            bindings
+        ))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    return index_grants(bindings, definitions)
+
+def index_grants(bindings, definitions):
+    """Build the permission index from bindings and their policy definitions (None for missing policies)."""
+    index = {"exact": {}, "wildcard": []}
+    compiled = {}  # (policy definition, bind parameters) -> statements, shared by every binding of that policy
+    shared = {}  # Identical condition and boundary tuples are kept once
+    for binding, definition in zip(bindings, definitions):
+        if not definition:
+            continue
+
+        parameters = binding.get("parameters") or {}
+        key = (id(definition), tuple(sorted(parameters.items())))
+        statements = compiled.get(key)
+        if statements is None:
+            statements = compiled[key] = compile_statements(definition, parameters, shared)
+
+        boundaries = tuple(binding.get("boundaries") or [])
+        boundaries = shared.setdefault(boundaries, boundaries)
+        policy_uuid, level_type = intern_text(binding["policyUuid"]), intern_text(binding["levelType"])
+        level_id, group_uuid = intern_text(binding.get("levelId")), intern_text(binding.get("groupUuid"))
+        for effect, permission, conditions in statements:
+            grant = Grant(effect, permission, policy_uuid, level_type, level_id, conditions, boundaries, group_uuid)
+            if "*" in permission:
+                index["wildcard"].append(grant)
+            else:
+                index["exact"].setdefault(permission, []).append(grant)
+    return index
+
+def compile_statements(definition, parameters, shared):
+    """Flatten a policy's statements into (effect, permission, conditions) tuples, bind parameters filled in."""
+    statements = []
+    for statement in definition.get("statements", []):
+        conditions = tuple(
+            (
+                intern_text(cond.get("name")),
+                intern_text(cond.get("operator")),
+                tuple(substitute_bind_parameters(str(value), parameters) for value in cond.get("values", []))
+            )
+            for cond in statement.get("conditions", [])
+        )
+        conditions = shared.setdefault(conditions, conditions)
+        effect = intern_text(statement.get("effect", "N/A").upper())
+        statements.extend((effect, intern_text(permission), conditions) for permission in statement.get("permissions", []))
+    return statements
+
+def evaluate_condition(condition, context):
+    """Evaluate one statement condition against the request context.
+
+    Returns True/False, or None when the context does not provide the attribute or the operator
+    is not supported (the condition cannot be decided offline).
+    """
+    name, operator, values = condition
+    if name not in context:
         return None
 
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {access_token}"
+    actual = str(context[name])
+    op = (operator or "").strip().lower().replace("-", " ").replace("_", " ")
+    if op in ("=", "==", "equals", "in"):
+        return actual in values
+    if op in ("!=", "<>", "not equals", "not in"):
+        return actual not in values
+    if op in ("startswith", "starts with"):
+        return any(actual.startswith(value) for value in values)
+    if op in ("not startswith", "not starts with"):
+        return not any(actual.startswith(value) for value in values)
+    if op in ("match", "matches", "like"):
+        return any(fnmatch.fnmatchcase(actual, value) for value in values)
+    return None
+
+def evaluate_permission(index, permission, environment_id=None, context=None):
+    """Decide whether a compiled index grants `permission` in `environment_id`.
+
+    DENY takes precedence over ALLOW. Grants bound at environment level only apply to that
+    environment; global and account grants apply everywhere. Grants with undecidable conditions
+    or with boundaries make the result CONDITIONAL. Returns a dict with the decision
+    (ALLOW, DENY, CONDITIONAL or NOT_ALLOWED) and the Grant records that were considered.
+    """
+    context = context or {}
+    grants = list(index["exact"].get(permission, []))
+    grants.extend(grant for grant in index["wildcard"] if fnmatch.fnmatchcase(permission, grant.permission))
+
+    decided = {"ALLOW": [], "DENY": []}
+    undecided = {"ALLOW": [], "DENY": []}
+    for grant in grants:
+        if environment_id and grant.level_type == "environment" and grant.level_id != environment_id:
+            continue
+        if grant.effect not in decided:
+            continue
+
+        results = [evaluate_condition(condition, context) for condition in grant.conditions]
+        if False in results:
+            continue
+        if None in results or grant.boundaries:
+            undecided[grant.effect].append(grant)
+        else:
+            decided[grant.effect].append(grant)
+
+    if decided["DENY"]:
+        decision, matched = "DENY", decided["DENY"]
+    elif decided["ALLOW"] and not undecided["DENY"]:
+        decision, matched = "ALLOW", decided["ALLOW"]
+    elif decided["ALLOW"] or undecided["ALLOW"]:
+        decision, matched = "CONDITIONAL", decided["ALLOW"] + undecided["ALLOW"] + undecided["DENY"]
+    else:
+        decision, matched = "NOT_ALLOWED", undecided["DENY"]
+
+    return {"permission": permission, "environment": environment_id, "decision": decision, "grants": matched}
+
+def get_user_permission_index(access_token, account_id, environment_id, email, refresh=False):
+    """Return the compiled permission index of a user in one environment (its global, account and
+    `environment_id` bindings), cached for USER_INDEX_TTL seconds. None if the user does not exist."""
+    key = (email.lower(), account_id, environment_id, is_offline())
+    if not refresh:
+        with user_index_cache_lock:
+            index = get_cached_user_index(key)
+        if index is not None:
+            return index
+
+    groups = fetch_user_groups(access_token, account_id, email)
+    if groups is None:
+        return None
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        bindings = resolve_user_bindings(access_token, account_id, environment_id, groups, None, executor)
+        index = compile_permission_index(access_token, account_id, environment_id, bindings, executor)
+
+    with user_index_cache_lock:
+        cache_user_index(key, index)
+    return index
+
+def get_cached_user_index(key):
+    """Return a cached user permission index while it is fresh, else None. Call with user_index_cache_lock held."""
+    cached = user_index_cache.get(key)
+    if cached and time.time() - cached[0] < USER_INDEX_TTL:
+        user_index_cache.move_to_end(key)
+        return cached[1]
+    return None
+
+def cache_user_index(key, index):
+    """Store a user permission index, evicting the least recently used beyond USER_INDEX_CACHE_MAX_SIZE. Call with user_index_cache_lock held."""
+    user_index_cache[key] = (time.time(), index)
+    user_index_cache.move_to_end(key)
+    while len(user_index_cache) > USER_INDEX_CACHE_MAX_SIZE:
+        user_index_cache.popitem(last=False)
+
+def check_user_permission(access_token, account_id, environment_id, email, permission, context=None):
+    """Answer "can `email` do `permission` in `environment_id`?" Returns the evaluate_permission result
+    (grants as dicts), or None if the user does not exist."""
+    index = get_user_permission_index(access_token, account_id, environment_id, email)
+    if index is None:
+        return None
+    result = evaluate_permission(index, permission, environment_id, context)
+    return {**result, "grants": as_dicts(result["grants"])}
+
+def parse_context(pairs):
+    """Parse "name=value" strings into a condition context dict."""
+    context = {}
+    for pair in pairs:
+        name, separator, value = pair.partition("=")
+        if separator:
+            context[name.strip()] = value.strip()
+    return context
+
+def check_permission_from_menu(access_token, account_id, environment_id):
+    """Menu Option 12: prompt for a user, permission, environment and condition values, then print the decision."""
+    email = input("\nEnter the User's Email: ").strip()
+    permission = input("Enter the Permission (e.g. storage:logs:read): ").strip()
+    if not email or not permission:
+        print("\n Email and permission are required.")
+        return
+    target_environment = input(f"Enter the Environment ID (or press Enter for {environment_id}): ").strip() or environment_id
+    context = parse_context(input("Optional condition values as name=value, comma separated: ").split(","))
+
+    try:
+        result = check_user_permission(access_token, account_id, target_environment, email, permission, context)
+    except ApiRequestError as e:
+        print(f"\n Failed to check permission. {e}\n")
+        return
+    if result is None:
+        print(f"\n User '{email}' was not found.")
+        return
+
+    print(f"\n Decision for '{email}' -> {permission} in {target_environment}: {result['decision']}\n")
+    if result["grants"]:
+        table_data = [
+            [
+                grant["effect"], grant["policy_uuid"], grant["level_type"], grant["level_id"],
+                "; ".join(f"{name} {operator} {', '.join(values)}" for name, operator, values in grant["conditions"]) or "None",
+                ", ".join(grant["boundaries"]) or "None",
+            ]
+            for grant in result["grants"]
+        ]
+        print(tabulate(table_data, headers=["Effect", "Policy UUID", "Level Type", "Level ID", "Conditions", "Boundaries"], tablefmt="grid"))
+
+############################################################################################
+## Menu Option 13: Reverse lookup - which users and groups hold a permission
+############################################################################################
+def build_reverse_index(access_token, account_id, environment_id, refresh=False):
+    """Crawl every group's members and bindings once and compile them into an account-wide index
+    for `environment_id` (global, account and that environment's bindings).
+
+    The result holds the compiled permission index (grants tagged with their group), the groups
+    by UUID, group -> member UIDs and users by UID. It is cached for REVERSE_INDEX_TTL seconds.
+    Raises ApiRequestError if any group, membership or binding could not be retrieved.
+    """
+    key = (account_id, environment_id, is_offline())
+    with reverse_index_lock:
+        cached = reverse_indexes.get(key)
+        if cached and not refresh and time.time() - cached["built_at"] < REVERSE_INDEX_TTL:
+            return cached
+
+        directory = load_group_directory(access_token, account_id, refresh=refresh)
+
+        groups = directory["groups"]
+        scopes = get_policy_scopes(account_id, environment_id)
+        log(f"\n Crawling members and bindings of {len(groups)} groups...\n")
+
+        def crawl_group(group):
+            users = fetch_group_users(access_token, account_id, group["uuid"])
+            bindings = [
+                {**binding, "groupUuid": group["uuid"]}
+                for scope in scopes
+                for binding in get_group_bindings_for_scope(access_token, scope, group["uuid"])
+            ]
+            return group["uuid"], users, bindings
+
+        users_by_uid = {}
+        group_members = {}
+        all_bindings = []
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for group_uuid, users, bindings in executor.map(crawl_group, groups):
+                # A user in many groups is listed under one shared UID string
+                group_members[group_uuid] = [intern_text(user.get("uid")) for user in users]
+                for user in users:
+                    users_by_uid.setdefault(intern_text(user.get("uid")), user)
+                all_bindings.extend(bindings)
+
+            permission_index = compile_permission_index(access_token, account_id, environment_id, all_bindings, executor)
+
+        reverse_index = {
+            "permission_index": permission_index,
+            "groups": directory["by_uuid"],
+            "group_members": group_members,
+            "users": users_by_uid,
+            "built_at": time.time(),
+        }
+        reverse_indexes[key] = reverse_index
+        return reverse_index
+
+def find_permission_holders(reverse_index, permission, environment_id=None, context=None, include_denied=False):
+    """Return who holds `permission` in `environment_id`: one dict per user with their decision and groups.
+
+    Every grant for the permission (ALLOW and DENY) is collected per user across all of their
+    groups and evaluated with evaluate_permission, so a DENY from one group overrides an ALLOW
+    from another. Users whose decision is DENY/NOT_ALLOWED are only returned with include_denied.
+    """
+    permission_index = reverse_index["permission_index"]
+    grants = list(permission_index["exact"].get(permission, []))
+    grants.extend(grant for grant in permission_index["wildcard"] if fnmatch.fnmatchcase(permission, grant.permission))
+
+    grants_by_group = {}
+    for grant in grants:
+        grants_by_group.setdefault(grant.group_uuid, []).append(grant)
+
+    grants_by_user = {}
+    for group_uuid, group_grants in grants_by_group.items():
+        for uid in reverse_index["group_members"].get(group_uuid, []):
+            grants_by_user.setdefault(uid, []).extend(group_grants)
+
+    holders = []
+    for uid, user_grants in grants_by_user.items():
+        result = evaluate_permission({"exact": {permission: user_grants}, "wildcard": []}, permission, environment_id, context)
+        if result["decision"] in ("DENY", "NOT_ALLOWED") and not include_denied:
+            continue
+
+        user = reverse_index["users"].get(uid, {})
+        group_uuids = list(dict.fromkeys(grant.group_uuid for grant in result["grants"]))
+        holders.append({
+            "uid": uid,
+            "email": user.get("email"),
+            "decision": result["decision"],
+            "groups": [reverse_index["groups"].get(g, {}).get("name", g) for g in group_uuids],
+            "policies": list(dict.fromkeys(grant.policy_uuid for grant in result["grants"])),
+        })
+
+    holders.sort(key=lambda holder: (holder["email"] or "").lower())
+    return holders
+
+def find_permission_holders_from_menu(access_token, account_id, environment_id):
+    """Menu Option 13: prompt for a permission and environment, then list every user holding it."""
+    permission = input("\nEnter the Permission (e.g. storage:logs:read): ").strip()
+    if not permission:
+        print("\n No permission provided.")
+        return
+    target_environment = input(f"Enter the Environment ID (or press Enter for {environment_id}): ").strip() or environment_id
+    context = parse_context(input("Optional condition values as name=value, comma separated: ").split(","))
+    refresh = input("Rebuild the index from the API? (yes/no): ").strip().lower() == "yes"
+
+    try:
+        reverse_index = build_reverse_index(access_token, account_id, target_environment, refresh=refresh)
+    except ApiRequestError as e:
+        print(f"\n Failed to build the permission index. {e}\n")
+        return
+
+    holders = find_permission_holders(reverse_index, permission, target_environment, context)
+    if not holders:
+        print(f"\n No users hold '{permission}' in {target_environment}.")
+        return
+
+    print(f"\n Users holding '{permission}' in {target_environment}:\n")
+    table_data = [
+        [holder["email"], holder["decision"], ", ".join(holder["groups"]), ", ".join(holder["policies"])]
+        for holder in holders
+    ]
+    print(tabulate(table_data, headers=["Email", "Decision", "Via Groups", "Policies"], tablefmt="grid"))
+
+############################################################################################
+## Library API: structured results for Options 2-8 (no prompts, no printing)
+## Options 10-15 are already callable: sync_snapshot, check_user_permission,
+## build_reverse_index/find_permission_holders, apply_binding_manifest and diff_snapshots.
+## Failed API calls raise ApiRequestError; lookups of something that does not exist return None.
+############################################################################################
+def get_user_permissions(access_token, account_id, environment_id, email, binding_cache=None, executor=None, offline=None):
+    """Option 2: return a user's groups and permissions, or None if the user does not exist.
+
+    The result is {"email", "groups", "permissions"}; each permission is a dict keyed by PERMISSION_FIELDS.
+    `binding_cache` and `executor` are passed on to resolve_user_permissions.
+    """
+    groups = fetch_user_groups(access_token, account_id, email, offline)
+    if groups is None:
+        return None
+
+    rows = resolve_user_permissions(
+        access_token, account_id, environment_id, groups, binding_cache, executor, offline
+    ) if groups else []
+    return {"email": email, "groups": groups, "permissions": as_dicts(rows)}
+
+def list_group_users(access_token, account_id, group, offline=None):
+    """Option 3: return the members of a group (UUID or name), or None if no group matches."""
+    group_id = resolve_group_id(access_token, account_id, group, offline)
+    if not group_id:
+        return None
+    return fetch_group_users(access_token, account_id, group_id, offline)
+
+def list_group_bindings(access_token, account_id, environment_id, group, offline=None, binding_cache=None):
+    """Option 4: return a group's policy bindings (Global, Account, Environment order), or None if no group matches.
+
+    With a `binding_cache` (see get_group_bindings_cached), bindings are read from and stored in it.
+    """
+    group_id = resolve_group_id(access_token, account_id, group, offline)
+    if not group_id:
+        return None
+
+    def get_bindings(scope):
+        if binding_cache is not None:
+            return get_group_bindings_cached(access_token, scope, group_id, binding_cache, offline)
+        return get_group_bindings_for_scope(access_token, scope, group_id, offline)
+
+    # Query all three scopes in parallel; map() returns them in Global, Account, Environment order
+    scopes = get_policy_scopes(account_id, environment_id)
+    with ThreadPoolExecutor(max_workers=len(scopes)) as executor:
+        return [binding for bindings in executor.map(get_bindings, scopes) for binding in bindings]
+
+def lookup_group(access_token, account_id, query, refresh=False, offline=None):
+    """Option 5: return the group whose UUID or name is `query`, or None."""
+    return find_group(load_group_directory(access_token, account_id, refresh, offline), query)
+
+def find_groups(access_token, account_id, text, limit=50, refresh=False, offline=None):
+    """Option 5: return the groups whose name starts with (first) or contains `text`."""
+    return search_groups(load_group_directory(access_token, account_id, refresh, offline), text, limit)
+
+def bind_policy(access_token, account_id, environment_id, group, policy_id, parameters=None, metadata=None,
+                boundaries=None, scope="environment"):
+    """Option 6: bind a policy to a group (UUID or name) unless the same binding exists, then validate it.
+
+    Returns the binding entry with its "status" (see apply_binding_manifest).
+    """
+    entry = {
+        "group": group,
+        "policy": policy_id,
+        "scope": scope,
+        "parameters": {str(k): str(v) for k, v in (parameters or {}).items()},
+        "metadata": {str(k): str(v) for k, v in (metadata or {}).items()},
+        "boundaries": [str(b) for b in (boundaries or [])],
     }
+    return apply_binding_manifest(access_token, account_id, environment_id, [entry])[0]
 
-    response = requests.get(url, headers=headers, verify=False)
+def list_policies(access_token, account_id, environment_id, scope="global", name=None):
+    """Option 7: return the policies defined at a scope (global, account or environment), optionally filtered by name."""
+    scope_path = get_scope_path(scope, account_id, environment_id)
+    if scope_path is None:
+        raise ValueError(f"Invalid scope '{scope}', expected global, account or environment")
+    return fetch_policies(access_token, *parse_scope(scope_path), name)
 
-    if response.status_code == 200:
-        policy_data = response.json()
-        statements = policy_data.get("statements", [])
-        
-        permissions = []
-        for statement in statements:
-            effect = statement.get("effect", "N/A")
-            permission_list = statement.get("permissions", [])
-            conditions = statement.get("conditions", [])
-
-            for permission in permission_list:
-                condition_str = "None"
-                if conditions:
-                    condition_str = "; ".join([
-                        f"{cond['name']} {cond['operator']} {', '.join(cond['values'])}"
-                        for cond in conditions
-                    ])
-
-                permissions.append([policy_uuid, level_type, level_id, effect, permission, condition_str])
-
-        return permissions
-    else:
-        print(f"\n Failed to get permissions for policy {policy_uuid} ({level_type}). Response: {response.text}\n")
-        return []
+def get_policy_details(access_token, account_id, policy_id):
+    """Option 8: return an account-level policy definition, or None if it does not exist."""
+    return get_policy(access_token, "account", account_id, policy_id)
+
+############################################################################################
+## Fan-out: run Options 2, 4 and 12 across several accounts and environments in one go
+## Group bindings are shared between the environments of a run and policy definitions
+## (notably global ones) come from the process-wide policy cache, so each is fetched once.
+############################################################################################
+def load_targets(path):
+    """Load the accounts and environments to fan out to from a YAML or JSON file.
+
+    The file holds a list of accounts (or {"accounts": [...]}); each has account_id, environments
+    (list of environment IDs) and optionally client_id/client_secret (default CLIENT_ID/CLIENT_SECRET).
+    Returns a list of target dicts; raises OSError or ValueError if the file cannot be used.
+    """
+    with open(path, encoding="utf-8") as targets_file:
+        if path.lower().endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ValueError("PyYAML is not installed. Use a JSON targets file or run: pip install pyyaml")
+            try:
+                data = yaml.safe_load(targets_file) or []
+            except yaml.YAMLError as e:
+                raise ValueError(f"invalid YAML: {e}") from e
+        else:
+            data = json.load(targets_file)
+
+    if isinstance(data, dict):
+        data = data.get("accounts") or []
+    if not isinstance(data, list):
+        raise ValueError("expected a list of accounts (or an 'accounts' list)")
+
+    targets = []
+    for number, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Targets entry {number} is not a mapping")
+        if not isinstance(item.get("environments") or [], list):
+            raise ValueError(f"Targets entry {number}: 'environments' must be a list")
+        account_id = str(item.get("account_id") or "").strip()
+        environments = [str(environment).strip() for environment in item.get("environments") or []]
+        if not account_id or not environments:
+            raise ValueError(f"Targets entry {number} needs an account_id and at least one environment")
+        targets.append({
+            "account_id": account_id,
+            "environments": environments,
+            "client_id": item.get("client_id") or CLIENT_ID,
+            "client_secret": item.get("client_secret") or CLIENT_SECRET,
+        })
+    return targets
+
+def get_default_targets(environments=None):
+    """Return ACCOUNT_ID with the given environment IDs (default ENVIRONMENT_ID) as a single target."""
+    return [{
+        "account_id": ACCOUNT_ID,
+        "environments": environments or [ENVIRONMENT_ID],
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+    }]
+
+def get_target_tokens(targets):
+    """Get an access token for every target account at once. Returns account_id -> token; raises ApiRequestError."""
+    with ThreadPoolExecutor(max_workers=max(1, len(targets))) as executor:
+        tokens = executor.map(
+            lambda target: request_access_token(target["client_id"], target["client_secret"], target["account_id"]),
+            targets
+        )
+        return {target["account_id"]: token for target, token in zip(targets, tokens)}
+
+def fan_out(targets, tokens, lookup):
+    """Call lookup(token, account_id, environment_id) for every target environment, ENVIRONMENT_WORKERS at a time.
+
+    Yields {"account_id", "environment_id", "result"} per environment in target order, or "error"
+    instead of "result" when an API call failed, so one broken environment does not stop the run.
+    """
+    pairs = [(target["account_id"], environment_id) for target in targets for environment_id in target["environments"]]
+
+    def run(pair):
+        account_id, environment_id = pair
+        try:
+            result = lookup(tokens.get(account_id), account_id, environment_id)
+        except ApiRequestError as e:
+            log(f" {account_id}/{environment_id}: failed ({e})")
+            return {"account_id": account_id, "environment_id": environment_id, "error": str(e)}
+        return {"account_id": account_id, "environment_id": environment_id, "result": result}
+
+    with ThreadPoolExecutor(max_workers=ENVIRONMENT_WORKERS) as executor:
+        yield from executor.map(run, pairs)
+
+def get_user_permissions_across(targets, tokens, email):
+    """Option 2 in every target environment (see fan_out). Each result is like get_user_permissions'.
+
+    The user's groups are fetched once per account and each group's global and account bindings
+    once per run, whatever the number of environments.
+    """
+    user_groups = {}
+    binding_cache = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        def lookup(token, account_id, environment_id):
+            groups = run_once(user_groups, account_id, lambda: fetch_user_groups(token, account_id, email))
+            if groups is None:
+                return None
+            rows = resolve_user_permissions(token, account_id, environment_id, groups, binding_cache, executor) if groups else []
+            return {"email": email, "groups": groups, "permissions": as_dicts(rows)}
+
+        yield from fan_out(targets, tokens, lookup)
+
+def list_group_bindings_across(targets, tokens, group):
+    """Option 4 in every target environment (see fan_out). The group is resolved by ID or name in each account."""
+    binding_cache = {}
+    yield from fan_out(
+        targets, tokens,
+        lambda token, account_id, environment_id: list_group_bindings(
+            token, account_id, environment_id, group, binding_cache=binding_cache
+        )
+    )
+
+def check_user_permission_across(targets, tokens, email, permissions, context=None):
+    """Option 12 in every target environment (see fan_out): each result is a list of check_user_permission-like
+    results (one per permission, evaluated in that environment), or None if the user does not exist."""
+    user_groups = {}
+    binding_cache = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        def lookup(token, account_id, environment_id):
+            groups = run_once(user_groups, account_id, lambda: fetch_user_groups(token, account_id, email))
+            if groups is None:
+                return None
+            bindings = resolve_user_bindings(token, account_id, environment_id, groups, binding_cache, executor)
+            index = compile_permission_index(token, account_id, environment_id, bindings, executor)
+            results = [evaluate_permission(index, permission, environment_id, context) for permission in permissions]
+            return [{**result, "grants": as_dicts(result["grants"])} for result in results]
+
+        yield from fan_out(targets, tokens, lookup)
+
+############################################################################################
+## Service mode: answer lookups over local HTTP with the token and caches kept warm
+############################################################################################
+def handle_service_request(access_token, path, query, executor):
+    """Route one service request to the library functions. Returns (HTTP status, JSON-serializable body).
+
+    Routes (all GET, JSON responses; group and policy values are URL-encoded IDs or names):
+      /health                                  token and cache status
+      /metrics                                 IAM API request totals (Prometheus text, not JSON)
+      /users/<email>/permissions               Option 2
+      /groups/<group>/users                    Option 3
+      /groups/<group>/policies                 Option 4
+      /groups?query=<id or name>               Option 5 (or ?search=<text>&limit=<n>)
+      /policies/<policy id>                    Option 8
+      /check?email=&permission=[&environment=][&context=name=value...]   Option 12
+    """
+    parts = [unquote(part) for part in path.strip("/").split("/") if part]
+
+    def first(name):
+        return (query.get(name) or [None])[0]
+
+    if parts == ["health"]:
+        return 200, {
+            "status": "ok",
+            "offline": use_snapshot,
+            "token_expires_in": max(0, int(token_expires_at - time.time())) if access_token else None,
+            "cached_policies": len(policy_cache),
+            "cached_users": len(user_index_cache),
+        }
+
+    if parts == ["metrics"]:
+        return 200, format_request_metrics()
+
+    if len(parts) == 3 and parts[0] == "users" and parts[2] == "permissions":
+        result = get_user_permissions(
+            access_token, ACCOUNT_ID, ENVIRONMENT_ID, parts[1], get_shared_binding_cache(), executor
+        )
+        return (404, {"error": f"User '{parts[1]}' was not found"}) if result is None else (200, result)
+
+    if len(parts) == 3 and parts[0] == "groups" and parts[2] in ("users", "policies"):
+        if parts[2] == "users":
+            result = list_group_users(access_token, ACCOUNT_ID, parts[1])
+        else:
+            result = list_group_bindings(access_token, ACCOUNT_ID, ENVIRONMENT_ID, parts[1], binding_cache=get_shared_binding_cache())
+        return (404, {"error": f"No group found with ID or Name '{parts[1]}'"}) if result is None else (200, result)
+
+    if parts == ["groups"]:
+        if first("search") is not None:
+            return 200, find_groups(access_token, ACCOUNT_ID, first("search"), int(first("limit") or 50))
+        if not first("query"):
+            raise ValueError("Pass ?query=<group ID or name> or ?search=<text>")
+        group = lookup_group(access_token, ACCOUNT_ID, first("query"))
+        return (404, {"error": f"No group found with ID or Name '{first('query')}'"}) if group is None else (200, group)
+
+    if len(parts) == 2 and parts[0] == "policies":
+        policy = get_policy_details(access_token, ACCOUNT_ID, parts[1])
+        return (404, {"error": f"Policy '{parts[1]}' was not found"}) if policy is None else (200, policy)
+
+    if parts == ["check"]:
+        if not first("email") or not first("permission"):
+            raise ValueError("Pass ?email=<user email>&permission=<permission>")
+        result = check_user_permission(
+            access_token, ACCOUNT_ID, first("environment") or ENVIRONMENT_ID, first("email"), first("permission"),
+            parse_context(query.get("context", []))
+        )
+        if result is None:
+            return 404, {"error": f"User '{first('email')}' was not found"}
+        return 200, {"email": first("email"), **result}
+
+    return 404, {"error": f"Unknown path '{path}'"}
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler for the service mode; every request runs on its own thread (ThreadingHTTPServer)."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse one connection
+    disable_nagle_algorithm = True  # Send small JSON answers immediately instead of waiting on delayed ACKs
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        started_at = time.monotonic()
+        try:
+            status, body = handle_service_request(
+                self.server.access_token, url.path, parse_qs(url.query), self.server.executor
+            )
+        except ApiRequestError as e:
+            status, body = 502, {"error": str(e)}
+        except ValueError as e:
+            status, body = 400, {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": f"{e.__class__.__name__}: {e}"}
+
+        if isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            payload, content_type = json.dumps(body).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        log(f" {self.command} {self.path} -> {status} ({(time.monotonic() - started_at) * 1000:.0f} ms)")
+
+    def log_message(self, format, *args):
+        pass  # Requests are logged by do_GET once the response is sent
+
+def serve(access_token, host=SERVE_HOST, port=SERVE_PORT):
+    """Serve handle_service_request over HTTP until interrupted.
+
+    The token manager refreshes the token in the background and the group directory, policy,
+    binding and permission-index caches stay warm between requests, so repeated lookups skip
+    token acquisition and most API calls. Returns 0 when stopped with Ctrl+C.
+    """
+    with ThreadingHTTPServer((host, port), ServiceRequestHandler) as server, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        server.access_token = access_token
+        server.executor = executor
+        log(f"\n Serving IAM lookups on http://{host}:{server.server_port} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            log("\n Stopping the service.")
+    return 0
 
 ############################################################################################
 ## Main Function
 ############################################################################################        
 def main():
-    global access_token, stop_token_refresh
+    global access_token, stop_token_refresh, verbose
+    verbose = True
 
     while True:
         print("\n--- Dynatrace API Menu ---")
         print("1. Get Access Token")
         print("2. User/Group: Get User's Groups & Permissions") 
-        print("3. User/Group: Get Users in Group (Enter Group ID)")
+        print("3. User/Group: Get Users in Group (Enter Group ID or Name)")
         print("4. Group: Get Policies for a Group")
         print("5. Group: Look up Group by ID or Name")
         print("6. Policy: Bind a Policy to a Group")
         print("7. Policy: Get Policy metadata by name")
         print("8. Policy: Get Policy metadata by ID")           
         print("9. Exit")
+        print("10. Snapshot: Sync IAM data to local store")
+        print(f"11. Snapshot: Toggle offline mode (currently {'ON' if use_snapshot else 'OFF'})")
+        print("12. Permission: Check if a user has a permission")
+        print("13. Permission: Who has a permission")
+        print("14. Policy: Bulk bind policies from a manifest")
+        print("15. Snapshot: Drift report against the previous snapshot")
 
         user_input = input("Enter your choice: ").strip()
+        operation = begin_operation()
 
         if user_input == "1":
             access_token = get_token(CLIENT_ID, CLIENT_SECRET)
             if access_token:
                 start_token_refresh_thread()
         elif user_input == "2":
-            if access_token:
+            if access_token or use_snapshot:
                 get_user_groups_and_permissions(access_token, ACCOUNT_ID, ENVIRONMENT_ID)
             else:
                 print("\n You need to get an access token first. Choose option 1.")
         elif user_input == "3":
-            if access_token:
+            if access_token or use_snapshot:
                 get_users_in_group(access_token, ACCOUNT_ID)
             else:
                 print("\n You need to get an access token first. Choose option 1.")
         elif user_input == "4":
-            if access_token:
-                get_policies_for_group(access_token, ACCOUNT_ID, ENVIRONMENT_ID, is_from_menu=True)
+            if access_token or use_snapshot:
+                get_policies_for_group(access_token, ACCOUNT_ID, ENVIRONMENT_ID)
             else:
                 print("\n You need to get an access token first. Choose option 1.")
         elif user_input == "5":
-            if access_token:
+            if access_token or use_snapshot:
                 lookup_group_by_id_or_name(access_token, ACCOUNT_ID)
             else:
                 print("\n You need to get an access token first. Choose option 1.")
@@ -545,12 +3203,12 @@ def main():
             else:
                 print("\n You need to get an access token first. Choose option 1.")
         elif user_input == "7":
-            if access_token:
+            if access_token or use_snapshot:
                 get_all_policies(access_token, ENVIRONMENT_ID, ACCOUNT_ID)
             else:
                 print("\n You need to get an access token first. Choose option 1.")
         elif user_input == "8":
-                if access_token:
+                if access_token or use_snapshot:
                     get_policy_metadata(access_token, ACCOUNT_ID)
                 else:
                     print("\n You need to get an access token first. Choose option 1.")
@@ -558,8 +3216,465 @@ def main():
             stop_token_refresh = True
             print("\nExiting program. Goodbye!\n")
             break
+        elif user_input == "10":
+            if access_token:
+                sync_snapshot_from_menu(access_token, ACCOUNT_ID, ENVIRONMENT_ID)
+            else:
+                print("\n You need to get an access token first. Choose option 1.")
+        elif user_input == "11":
+            toggle_offline_mode()
+        elif user_input == "12":
+            if access_token or use_snapshot:
+                check_permission_from_menu(access_token, ACCOUNT_ID, ENVIRONMENT_ID)
+            else:
+                print("\n You need to get an access token first. Choose option 1.")
+        elif user_input == "13":
+            if access_token or use_snapshot:
+                find_permission_holders_from_menu(access_token, ACCOUNT_ID, ENVIRONMENT_ID)
+            else:
+                print("\n You need to get an access token first. Choose option 1.")
+        elif user_input == "14":
+            if access_token:
+                apply_binding_manifest_from_menu(access_token, ACCOUNT_ID, ENVIRONMENT_ID)
+            else:
+                print("\n You need to get an access token first. Choose option 1.")
+        elif user_input == "15":
+            drift_report_from_menu()
+        else:
+            print("\nInvalid choice. Please enter a number between 1 and 15.")
+
+        end_operation(f"Option {user_input}", operation)
+
+############################################################################################
+## Command line: no arguments opens the menu, subcommands run non-interactively
+############################################################################################
+def run_cli(argv):
+    """Parse command line arguments and run the requested subcommand (or the menu with --profile)."""
+    global verbose, profile_requests
+
+    parser = argparse.ArgumentParser(description="Dynatrace IAM user, group and policy checks.")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Do not print progress messages to stderr")
+    parser.add_argument("--profile", action="store_true", help="Print per-endpoint API request timings to stderr at the end (without a subcommand: after every menu option)")
+    parser.add_argument("--metrics-file", help="Write API request totals in the Prometheus text format to this file at the end")
+    parser.add_argument("--trace-file", help="Write every API request as a Chrome trace (chrome://tracing, Perfetto) to this file at the end")
+    parser.add_argument("--backend", choices=["threads", "async"], default="threads", help="Run lookups on a thread pool (default) or as asyncio tasks on one thread (needs httpx; see async_client.py)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Shared by every subcommand that can answer from the local snapshot
+    offline_parser = argparse.ArgumentParser(add_help=False)
+    offline_parser.add_argument("--offline", action="store_true", help="Answer from the local snapshot instead of the live API")
+
+    # Shared by every subcommand that returns rows
+    format_parser = argparse.ArgumentParser(add_help=False)
+    format_parser.add_argument("--format", "-f", choices=OUTPUT_FORMATS, help="Row output format (default jsonl; parquet needs pyarrow)")
+    format_parser.add_argument("--output", "-o", default="-", help="Output file ('-' for stdout)")
+
+    # Shared by every subcommand that can run across several accounts/environments at once
+    targets_parser = argparse.ArgumentParser(add_help=False)
+    targets_choice = targets_parser.add_mutually_exclusive_group()
+    targets_choice.add_argument("--targets", "-t", help="YAML/JSON file of accounts and environments to run in (one result per environment)")
+    targets_choice.add_argument("--environments", help="Comma separated environment IDs of ACCOUNT_ID to run in")
+
+    subparsers.add_parser("token", help="Print a new access token (Option 1)")
+
+    user_parser = subparsers.add_parser(
+        "user-permissions", parents=[offline_parser, format_parser, targets_parser],
+        help="A user's groups and permissions as JSON, or only the permission rows with --format (Option 2)"
+    )
+    user_parser.add_argument("--email", "-e", required=True, help="User email")
+
+    group_users_parser = subparsers.add_parser("group-users", parents=[offline_parser, format_parser], help="Members of a group (Option 3)")
+    group_users_parser.add_argument("--group", "-g", required=True, help="Group ID or name")
+
+    members_parser = subparsers.add_parser(
+        "group-members", parents=[offline_parser, format_parser],
+        help="Members of several groups, one row per user with the groups they are in (Option 3 for many groups)"
+    )
+    members_target = members_parser.add_mutually_exclusive_group(required=True)
+    members_target.add_argument("--group", "-g", action="append", help="Group ID or name (repeatable)")
+    members_target.add_argument("--groups-file", help="File with one group ID or name per line ('-' for stdin)")
+    members_target.add_argument("--search", help="Every group whose name contains this text")
+    members_target.add_argument("--all", action="store_true", help="Every group in the account")
+    members_parser.add_argument("--refresh", action="store_true", help="Re-download member lists and the group list instead of using cached ones")
+
+    group_policies_parser = subparsers.add_parser("group-policies", parents=[offline_parser, format_parser, targets_parser], help="Policies bound to a group (Option 4)")
+    group_policies_parser.add_argument("--group", "-g", required=True, help="Group ID or name")
+
+    lookup_parser = subparsers.add_parser("group-lookup", parents=[offline_parser], help="Look up a group by ID or name, or search names (Option 5)")
+    lookup_target = lookup_parser.add_mutually_exclusive_group(required=True)
+    lookup_target.add_argument("--query", help="Exact group ID or name (JSON output)")
+    lookup_target.add_argument("--search", help="Part of a group name (JSON lines output)")
+    lookup_parser.add_argument("--limit", type=int, default=50, help="Max search results (default 50)")
+    lookup_parser.add_argument("--refresh", action="store_true", help="Reload the group list instead of using the cached one")
+
+    bind_policy_parser = subparsers.add_parser("bind-policy", help="Bind one policy to a group (Option 6)")
+    bind_policy_parser.add_argument("--group", "-g", required=True, help="Group ID or name")
+    bind_policy_parser.add_argument("--policy", "-p", required=True, help="Policy UUID")
+    bind_policy_parser.add_argument("--scope", choices=["global", "account", "environment"], default="environment", help="Binding level")
+    bind_policy_parser.add_argument("--param", action="append", default=[], help="Bind parameter as name=value (repeatable)")
+    bind_policy_parser.add_argument("--metadata", action="append", default=[], help="Metadata as name=value (repeatable)")
+    bind_policy_parser.add_argument("--boundary", action="append", default=[], help="Boundary ID (repeatable)")
+
+    policies_parser = subparsers.add_parser("policies", parents=[offline_parser, format_parser], help="Policies at a level (Option 7)")
+    policies_parser.add_argument("--scope", choices=["global", "account", "environment"], default="global", help="Policy level")
+    policies_parser.add_argument("--name", help="Only policies whose name matches")
+
+    policy_parser = subparsers.add_parser("policy", parents=[offline_parser], help="A policy definition by ID as JSON (Option 8)")
+    policy_parser.add_argument("--id", required=True, help="Policy UUID")
+
+    bulk_parser = subparsers.add_parser("bulk", parents=[offline_parser], help="Check the permissions of many users from a file or stdin")
+    bulk_parser.add_argument("--input", "-i", default="-", help="File with one email per line ('-' for stdin)")
+    bulk_parser.add_argument("--output", "-o", default="-", help="Output file ('-' for stdout)")
+    bulk_parser.add_argument("--format", "-f", choices=OUTPUT_FORMATS, default="csv", help="Output format (parquet needs pyarrow)")
+
+    check_parser = subparsers.add_parser("check", parents=[offline_parser, targets_parser], help="Check whether a user has one or more permissions (JSON lines output)")
+    check_parser.add_argument("--email", "-e", required=True, help="User email")
+    check_parser.add_argument("--permission", "-p", required=True, action="append", help="Permission to check (repeatable)")
+    check_parser.add_argument("--environment", help=f"Environment ID to check in (default {ENVIRONMENT_ID})")
+    check_parser.add_argument("--context", "-c", action="append", default=[], help="Condition value as name=value (repeatable)")
+
+    who_parser = subparsers.add_parser("who-has", parents=[offline_parser, format_parser], help="List every user holding a permission")
+    who_parser.add_argument("--permission", "-p", required=True, help="Permission to look up")
+    who_parser.add_argument("--environment", help=f"Environment ID to check in (default {ENVIRONMENT_ID})")
+    who_parser.add_argument("--context", "-c", action="append", default=[], help="Condition value as name=value (repeatable)")
+    who_parser.add_argument("--include-denied", action="store_true", help="Also list users whose grants are denied")
+
+    bind_parser = subparsers.add_parser("bind", help="Bind policies to groups from a YAML/JSON/CSV manifest")
+    bind_parser.add_argument("--manifest", "-m", required=True, help="Manifest file (.yaml, .json or .csv)")
+    bind_parser.add_argument("--dry-run", action="store_true", help="Only show which bindings would be created")
+
+    serve_parser = subparsers.add_parser("serve", parents=[offline_parser], help="Serve the lookups over local HTTP with warm caches")
+    serve_parser.add_argument("--host", default=SERVE_HOST, help=f"Address to listen on (default {SERVE_HOST})")
+    serve_parser.add_argument("--port", type=int, default=SERVE_PORT, help=f"Port to listen on (default {SERVE_PORT})")
+
+    sync_parser = subparsers.add_parser("sync", help="Write the local snapshot used by --offline and drift reports")
+    sync_parser.add_argument("--incremental", action="store_true", help="Only re-fetch new, changed or stale entities")
+    sync_parser.add_argument("--keep-previous", action="store_true", help=f"Copy the existing snapshot to {SNAPSHOT_PREVIOUS_PATH} first")
+
+    drift_parser = subparsers.add_parser("drift", help="Report what changed between two snapshots (JSON lines output)")
+    drift_parser.add_argument("--old", default=SNAPSHOT_PREVIOUS_PATH, help=f"Previous snapshot (default {SNAPSHOT_PREVIOUS_PATH})")
+    drift_parser.add_argument("--new", default=SNAPSHOT_DB_PATH, help=f"Current snapshot (default {SNAPSHOT_DB_PATH})")
+
+    args = parser.parse_args(argv)
+    verbose = not args.quiet
+    profile_requests = args.profile
+    if args.profile or args.trace_file:
+        start_request_recording()
+
+    if args.command is None and not (args.profile or args.metrics_file or args.trace_file):
+        parser.print_help()
+        return 1
+
+    try:
+        if args.command is None:
+            main()  # The menu, profiled option by option
+            return 0
+        operation = begin_operation()
+        try:
+            return run_cli_command(args)
+        finally:
+            end_operation(args.command, operation)
+    finally:
+        write_request_reports(args.metrics_file, args.trace_file)
+
+def write_request_reports(metrics_file=None, trace_file=None):
+    """Write the --metrics-file and --trace-file reports, when asked for."""
+    if metrics_file:
+        with open(metrics_file, "w", encoding="utf-8") as output:
+            output.write(format_request_metrics())
+    if trace_file:
+        write_request_trace(trace_file)
+
+def run_cli_command(args):
+    """Run a parsed subcommand: read its input, open its output, then run it (see run_cli_backend).
+    Failures are reported on stderr. Returns the exit status."""
+    if args.command == "drift":
+        try:
+            deltas = diff_snapshots(args.old, args.new)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        for delta in deltas:
+            print(json.dumps(delta))
+        return 0
+
+    # "check" reports lookup failures as 3, since 1 and 2 are permission decisions
+    failure_code = 3 if args.command == "check" else 1
+
+    # Input files are read and the output opened before the token request, so a wrong path fails at once
+    try:
+        read_input_files(args)
+        output = open_output(args.output, args.format or "jsonl") if hasattr(args, "output") else nullcontext()
+    except (OSError, ValueError) as e:
+        print(f"Could not open input or output: {e}", file=sys.stderr)
+        return failure_code
+
+    try:
+        with output as args.output_file:
+            return run_cli_backend(args, failure_code)
+    except BrokenPipeError:
+        # The reader of stdout went away (e.g. `| head`): stop quietly
+        silence_stdout()
+        return 0
+    except ApiRequestError as e:
+        print(f"Request failed. {e}", file=sys.stderr)
+        return failure_code
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return failure_code
+
+def run_cli_backend(args, failure_code):
+    """Run a subcommand on the async backend, across --targets/--environments or with one token. Returns the exit status."""
+    global use_snapshot
+
+    if args.backend == "async":
+        # async_client imports this module as "main": make that the running script, not a second copy
+        sys.modules.setdefault("main", sys.modules[__name__])
+        import async_client
+        return asyncio.run(async_client.run_command(args))
+
+    if getattr(args, "targets", None) or getattr(args, "environments", None):
+        return run_fan_out_command(args)
+
+    use_snapshot = getattr(args, "offline", False)
+    token = None
+    if not use_snapshot:
+        try:
+            token = request_access_token(CLIENT_ID, CLIENT_SECRET)
+        except ApiRequestError as e:
+            print(f"Failed to get token. {e}", file=sys.stderr)
+            return failure_code
+        start_token_refresh_thread()
+    return run_command(args, token)
+
+def read_input_files(args):
+    """Read the input file of a subcommand (bulk --input, group-members --groups-file) into `args`.
+    Raises OSError or ValueError."""
+    if args.command == "bulk":
+        args.emails = read_lines_from(args.input)
+    elif args.command == "group-members" and args.groups_file:
+        args.groups_from_file = read_lines_from(args.groups_file)
+
+def run_fan_out_command(args):
+    """Run user-permissions, group-policies or check in every --targets/--environments environment.
+
+    Rows and JSON lines carry account_id and environment_id. Environments whose lookups fail are
+    reported on stderr and make the exit status non-zero, after every other environment ran.
+    """
+    if args.offline:
+        raise ValueError("--targets and --environments work against the live API only (the snapshot holds one environment).")
+    if args.command == "check" and args.environment:
+        raise ValueError("--environment cannot be combined with --targets or --environments: each environment is checked in itself.")
+
+    if args.targets:
+        targets = load_targets(args.targets)
+    else:
+        targets = get_default_targets([environment.strip() for environment in args.environments.split(",") if environment.strip()])
+    tokens = get_target_tokens(targets)
+    start_token_refresh_thread()
+
+    failed = []
+
+    def report(outcome, missing):
+        """Return the outcome's result; log failures and "not found" lookups."""
+        where = f"{outcome['account_id']}/{outcome['environment_id']}"
+        if "error" in outcome:
+            failed.append(where)
+            print(f"{where}: request failed. {outcome['error']}", file=sys.stderr)
+            return None
+        if outcome["result"] is None:
+            failed.append(where)
+            print(f"{where}: {missing}", file=sys.stderr)
+        return outcome["result"]
+
+    if args.command == "user-permissions":
+        outcomes = get_user_permissions_across(targets, tokens, args.email)
+        missing = f"User '{args.email}' was not found."
+        if args.format:
+            rows = (
+                {"account_id": outcome["account_id"], "environment_id": outcome["environment_id"], **permission}
+                for outcome in outcomes
+                for permission in (report(outcome, missing) or {}).get("permissions", [])
+            )
+            write_output(args, rows, TARGET_FIELDS + PERMISSION_FIELDS)
+        else:
+            for outcome in outcomes:
+                result = report(outcome, missing)
+                if result is not None:
+                    print(json.dumps({"account_id": outcome["account_id"], "environment_id": outcome["environment_id"], **result}))
+
+    elif args.command == "group-policies":
+        rows = (
+            {"account_id": outcome["account_id"], "environment_id": outcome["environment_id"], **binding}
+            for outcome in list_group_bindings_across(targets, tokens, args.group)
+            for binding in report(outcome, f"No group found with ID or Name '{args.group}'.") or []
+        )
+        write_output(args, rows, TARGET_FIELDS + BINDING_FIELDS)
+
+    elif args.command == "check":
+        # Same exit status as check, over every environment: 3 if any lookup failed
+        decisions = set()
+        context = parse_context(args.context)
+        for outcome in check_user_permission_across(targets, tokens, args.email, args.permission, context):
+            for result in report(outcome, f"User '{args.email}' was not found.") or []:
+                decisions.add(result["decision"])
+                print(json.dumps({"account_id": outcome["account_id"], "email": args.email, **result}))
+        if failed:
+            return 3
+        if decisions & {"DENY", "NOT_ALLOWED"}:
+            return 1
+        return 2 if "CONDITIONAL" in decisions else 0
+
+    log(f"\n Ran in {sum(len(target['environments']) for target in targets)} environments, {len(failed)} failed.")
+    return 1 if failed else 0
+
+def write_output(args, rows, fieldnames):
+    """Stream rows to the subcommand's --output (opened by run_cli_command) in its --format (default jsonl).
+    Returns the number of rows."""
+    output_format = args.format or "jsonl"
+    with RowWriter(args.output_file, fieldnames, output_format) as writer:
+        return writer.write(rows)
+
+def run_command(args, token):
+    """Run one parsed subcommand with an access token (None when offline). Returns the exit status."""
+    if args.command == "token":
+        print(token)
+        return 0
+
+    if args.command == "user-permissions":
+        if args.format:
+            # Only the permission rows, streamed as policies are resolved
+            groups = fetch_user_groups(token, ACCOUNT_ID, args.email)
+            if groups is None:
+                print(f"User '{args.email}' was not found.", file=sys.stderr)
+                return 1
+            rows = iter_user_permissions(token, ACCOUNT_ID, ENVIRONMENT_ID, groups) if groups else []
+            write_output(args, (row._asdict() for row in rows), PERMISSION_FIELDS)
+            return 0
+
+        result = get_user_permissions(token, ACCOUNT_ID, ENVIRONMENT_ID, args.email)
+        if result is None:
+            print(f"User '{args.email}' was not found.", file=sys.stderr)
+            return 1
+        print(json.dumps(result))
+        return 0
+
+    if args.command in ("group-users", "group-policies"):
+        group_id = resolve_group_id(token, ACCOUNT_ID, args.group)
+        if not group_id:
+            print(f"No group found with ID or Name '{args.group}'.", file=sys.stderr)
+            return 1
+        if args.command == "group-users":
+            # Members are written page by page as they are downloaded
+            write_output(args, iter_group_users(token, ACCOUNT_ID, group_id), USER_FIELDS)
+        else:
+            write_output(args, list_group_bindings(token, ACCOUNT_ID, ENVIRONMENT_ID, group_id), BINDING_FIELDS)
+        return 0
+
+    if args.command == "group-members":
+        if args.refresh:
+            load_group_directory(token, ACCOUNT_ID, refresh=True)
+        if args.groups_file:
+            groups = args.groups_from_file  # Read by read_input_files
+        elif args.search is not None:
+            directory = load_group_directory(token, ACCOUNT_ID)
+            groups = [group["uuid"] for group in search_groups(directory, args.search, len(directory["groups"]))]
         else:
-            print("\nInvalid choice. Please enter a number between 1 and 7.")
+            groups = args.group  # None with --all
+
+        expansion = expand_group_memberships(token, ACCOUNT_ID, groups, args.refresh)
+        for value in expansion["missing"]:
+            print(f"No group found with ID or Name '{value}'.", file=sys.stderr)
+        write_output(args, iter_member_rows(expansion), MEMBER_FIELDS)
+        return 1 if expansion["missing"] else 0
+
+    if args.command == "group-lookup":
+        if args.search is not None:
+            for group in find_groups(token, ACCOUNT_ID, args.search, args.limit, args.refresh):
+                print(json.dumps(group))
+            return 0
+        group = lookup_group(token, ACCOUNT_ID, args.query, args.refresh)
+        if group is None:
+            print(f"No group found with ID or Name '{args.query}'.", file=sys.stderr)
+            return 1
+        print(json.dumps(group))
+        return 0
+
+    if args.command == "bind-policy":
+        result = bind_policy(
+            token, ACCOUNT_ID, ENVIRONMENT_ID, args.group, args.policy,
+            parse_context(args.param), parse_context(args.metadata), args.boundary, args.scope
+        )
+        print(json.dumps({key: result[key] for key in ("group", "group_id", "policy", "scope", "status") if key in result}))
+        return 0 if result["status"] in ("bound", "already bound") else 1
+
+    if args.command == "policies":
+        level_type, level_id = parse_scope(get_scope_path(args.scope, ACCOUNT_ID, ENVIRONMENT_ID))
+        write_output(args, iter_policies(token, level_type, level_id, args.name), POLICY_FIELDS)
+        return 0
+
+    if args.command == "policy":
+        policy = get_policy_details(token, ACCOUNT_ID, args.id)
+        if policy is None:
+            print(f"Policy '{args.id}' was not found.", file=sys.stderr)
+            return 1
+        print(json.dumps(policy))
+        return 0
+
+    if args.command == "check":
+        # Exit status: 0 = every permission ALLOWed, 1 = any DENY/NOT_ALLOWED, 2 = otherwise CONDITIONAL, 3 = lookup failed
+        environment_id = args.environment or ENVIRONMENT_ID
+        index = get_user_permission_index(token, ACCOUNT_ID, environment_id, args.email)
+        if index is None:
+            print(f"User '{args.email}' was not found.", file=sys.stderr)
+            return 3
+
+        context = parse_context(args.context)
+        decisions = set()
+        for permission in args.permission:
+            result = evaluate_permission(index, permission, environment_id, context)
+            decisions.add(result["decision"])
+            print(json.dumps({"email": args.email, **result, "grants": as_dicts(result["grants"])}))
+
+        if decisions & {"DENY", "NOT_ALLOWED"}:
+            return 1
+        return 2 if "CONDITIONAL" in decisions else 0
+
+    if args.command == "who-has":
+        environment_id = args.environment or ENVIRONMENT_ID
+        reverse_index = build_reverse_index(token, ACCOUNT_ID, environment_id)
+        holders = find_permission_holders(
+            reverse_index, args.permission, environment_id, parse_context(args.context), args.include_denied
+        )
+        write_output(args, holders, HOLDER_FIELDS)
+        return 0
+
+    if args.command == "serve":
+        return serve(token, args.host, args.port)
+
+    if args.command == "sync":
+        synced = sync_snapshot(token, ACCOUNT_ID, ENVIRONMENT_ID, args.incremental, args.keep_previous)
+        return 0 if synced else 1
+
+    if args.command == "bind":
+        try:
+            entries = load_binding_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            print(f"Could not read manifest: {e}", file=sys.stderr)
+            return 1
+
+        entries = apply_binding_manifest(token, ACCOUNT_ID, ENVIRONMENT_ID, entries, args.dry_run)
+        print_binding_results(entries)
+        ok_statuses = ("bound", "already bound", "would bind")
+        return 0 if all(entry["status"] in ok_statuses for entry in entries) else 1
+
+    if args.command == "bulk":
+        failed = bulk_check_permissions(token, ACCOUNT_ID, ENVIRONMENT_ID, args.emails, args.output_file, args.format)
+        return 1 if failed else 0
+
+    return 1
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     main()
@@ -0,0 +1,373 @@
+############################################################################################
+# Local mock of the Dynatrace IAM and SSO endpoints used by main.py
+# Synthesizes an account with N groups, M users and K policies, with configurable latency,
+# rate limiting (HTTP 429 + Retry-After), page size and ETags (304 on If-None-Match), and counts
+# every request it serves.
+#
+# Run:   python mock_server.py --groups 200 --users 5000 --policies 300 --latency 40
+# Point: DT_API_BASE_URL=http://127.0.0.1:8999 DT_SSO_TOKEN_URL=http://127.0.0.1:8999/sso/oauth2/token python main.py
+# Stats: GET /mock/stats (request counts per endpoint), POST /mock/reset
+############################################################################################
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Defaults
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8999
+MOCK_ACCOUNT_ID = "mock-account"
+MOCK_ENVIRONMENT_ID = "mock-env"
+MOCK_TOKEN_TTL = 300  # Seconds, returned as expires_in by the token endpoint
+
+PERMISSIONS = [
+    "storage:logs:read", "storage:logs:write", "storage:events:read", "storage:metrics:read",
+    "storage:spans:read", "storage:buckets:read", "storage:bucket-definitions:write",
+    "settings:objects:read", "settings:objects:write", "settings:schemas:read",
+    "environment:roles:viewer", "environment:roles:manage-settings", "app-engine:apps:run",
+    "app-engine:apps:install", "document:documents:read", "document:documents:write",
+    "automation:workflows:read", "automation:workflows:write", "iam:users:read", "iam:groups:read",
+]
+
+# Routes: (method, regex, handler name). Regexes match the path without the query string.
+ROUTES = [
+    ("POST", r"^/sso/oauth2/token$", "token"),
+    ("GET", r"^/iam/v1/accounts/(?P<account>[^/]+)/users/(?P<email>[^/]+)$", "user"),
+    ("GET", r"^/iam/v1/accounts/(?P<account>[^/]+)/groups$", "groups"),
+    ("GET", r"^/iam/v1/accounts/(?P<account>[^/]+)/groups/(?P<group>[^/]+)/users$", "group_users"),
+    ("GET", r"^/iam/v1/repo/(?P<level_type>[^/]+)/(?P<level_id>[^/]+)/bindings/groups/(?P<group>[^/]+)$", "bindings"),
+    ("POST", r"^/iam/v1/repo/(?P<level_type>[^/]+)/(?P<level_id>[^/]+)/bindings/(?P<policy>[^/]+)/(?P<group>[^/]+)$", "bind"),
+    ("POST", r"^/iam/v1/repo/global/bindings/(?P<policy>[^/]+)/(?P<group>[^/]+)$", "bind_global"),
+    ("GET", r"^/iam/v1/repo/global/bindings/groups/(?P<group>[^/]+)$", "bindings_global"),
+    ("GET", r"^/iam/v1/repo/(?P<level_type>[^/]+)/(?P<level_id>[^/]+)/policies$", "policies"),
+    ("GET", r"^/iam/v1/repo/(?P<level_type>[^/]+)/(?P<level_id>[^/]+)/policies/(?P<policy>[^/]+)$", "policy"),
+    ("GET", r"^/mock/stats$", "stats"),
+    ("POST", r"^/mock/reset$", "reset"),
+]
+
+
+def mock_uuid(kind, number):
+    """Deterministic UUID-shaped ID, so names and IDs are stable across runs with the same seed."""
+    return f"{kind:08x}-0000-4000-8000-{number:012x}"
+
+
+class MockAccount:
+    """Synthetic IAM data: groups, users with group memberships, policies at three levels and bindings."""
+
+    def __init__(self, groups=100, users=1000, policies=60, groups_per_user=3, policies_per_group=4,
+                 account_id=MOCK_ACCOUNT_ID, environment_id=MOCK_ENVIRONMENT_ID, seed=42):
+        rng = random.Random(seed)
+        self.account_id = account_id
+        self.environment_id = environment_id
+        self.lock = threading.Lock()
+
+        self.groups = [
+            {"uuid": mock_uuid(1, i), "name": f"Group {i:04d}", "owner": "LOCAL", "updatedAt": "2025-01-01T00:00:00Z"}
+            for i in range(groups)
+        ]
+        self.groups_by_uuid = {group["uuid"]: group for group in self.groups}
+
+        levels = [("global", "global"), ("account", account_id), ("environment", environment_id)]
+        self.policies = {}  # (level_type, level_id) -> {uuid: definition}
+        for i in range(policies):
+            level_type, level_id = levels[i % 3]
+            statements = []
+            for _ in range(rng.randint(1, 3)):
+                statement = {
+                    "effect": "DENY" if rng.random() < 0.1 else "ALLOW",
+                    "permissions": rng.sample(PERMISSIONS, rng.randint(1, 4)),
+                    "conditions": [],
+                }
+                if rng.random() < 0.3:
+                    statement["conditions"].append(
+                        {"name": "storage:bucket-name", "operator": "=", "values": ["${bindParam:bucket}"]}
+                    )
+                statements.append(statement)
+            uuid = mock_uuid(2, i)
+            self.policies.setdefault((level_type, level_id), {})[uuid] = {
+                "uuid": uuid,
+                "name": f"Policy {i:04d}",
+                "description": f"Synthetic policy {i}",
+                "category": "CUSTOM",
+                "statementQuery": "; ".join(
+                    f"{s['effect']} {', '.join(s['permissions'])}" for s in statements
+                ),
+                "statements": statements,
+                "levelType": level_type,
+                "levelId": level_id,
+            }
+
+        all_policies = [policy for level in self.policies.values() for policy in level.values()]
+        self.bindings = {}  # (level_type, level_id, group uuid) -> [binding]
+        for group in self.groups:
+            for policy in rng.sample(all_policies, min(policies_per_group, len(all_policies))):
+                parameters = {"bucket": "default_logs"} if "bindParam" in json.dumps(policy["statements"]) else {}
+                self.add_binding(policy["levelType"], policy["levelId"], policy["uuid"], group["uuid"], parameters, {}, [])
+
+        self.users = {}  # email (lower case) -> (user, [group uuid])
+        self.group_members = {group["uuid"]: [] for group in self.groups}
+        for i in range(users):
+            user = {"uid": mock_uuid(3, i), "email": f"user{i:05d}@example.com", "name": "User", "surname": f"{i:05d}"}
+            user_groups = rng.sample(self.groups, min(groups_per_user, len(self.groups)))
+            self.users[user["email"].lower()] = (user, [group["uuid"] for group in user_groups])
+            for group in user_groups:
+                self.group_members[group["uuid"]].append(user)
+
+    def add_binding(self, level_type, level_id, policy_uuid, group_uuid, parameters, metadata, boundaries):
+        """Record a binding (replacing an identical one, like the real API)."""
+        binding = {
+            "policyUuid": policy_uuid,
+            "levelType": level_type,
+            "levelId": level_id,
+            "groups": [group_uuid],
+            "parameters": parameters,
+            "metadata": metadata,
+            "boundaries": boundaries,
+        }
+        with self.lock:
+            bindings = self.bindings.setdefault((level_type, level_id, group_uuid), [])
+            bindings[:] = [b for b in bindings if (b["policyUuid"], b["parameters"]) != (policy_uuid, parameters)]
+            bindings.append(binding)
+
+    def user_groups(self, email):
+        """Return the groups of a user as the users endpoint does, or None if the user does not exist."""
+        if email.lower() not in self.users:
+            return None
+        user, group_uuids = self.users[email.lower()]
+        return {**user, "groups": [{"uuid": uuid, "groupName": self.groups_by_uuid[uuid]["name"]} for uuid in group_uuids]}
+
+
+class MockIamServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering the IAM/SSO endpoints from a MockAccount."""
+
+    daemon_threads = True
+
+    def __init__(self, address, account, latency=0.0, rate_limit=None, throttle_probability=0.0, page_size=100):
+        super().__init__(address, MockRequestHandler)
+        self.account = account
+        self.latency = latency  # Mean seconds added to every response (uniform 0.5x-1.5x, with a slow 1% tail)
+        self.rate_limit = rate_limit  # Requests per second before answering 429 (None = unlimited)
+        self.throttle_probability = throttle_probability  # Extra random 429s
+        self.page_size = page_size
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        self.recent_requests = deque()
+        self.token_counter = 0
+        self.revoked_tokens = set()  # Bearer tokens answered with 401, as if they had expired or been revoked
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def is_throttled(self):
+        """True if this request exceeds the rate limit (sliding one-second window) or is randomly throttled."""
+        if self.throttle_probability and random.random() < self.throttle_probability:
+            return True
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.stats_lock:
+            while self.recent_requests and now - self.recent_requests[0] > 1:
+                self.recent_requests.popleft()
+            if len(self.recent_requests) >= self.rate_limit:
+                return True
+            self.recent_requests.append(now)
+            return False
+
+    def simulate_latency(self):
+        if self.latency:
+            delay = self.latency * random.uniform(0.5, 1.5)
+            if random.random() < 0.01:
+                delay *= 5
+            time.sleep(delay)
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Dispatches one request to the matching route method."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body are separate writes; do not let them wait on delayed ACKs
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        for route_method, pattern, name in ROUTES:
+            match = re.match(pattern, url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self.send_json(404, {"error": {"code": 404, "message": f"No mock route for {method} {url.path}"}})
+
+        server = self.server
+        if name not in ("stats", "reset"):
+            server.count(f"{method} {name}")
+            if server.is_throttled():
+                server.count("429")
+                return self.send_json(429, {"error": {"code": 429, "message": "Too many requests"}}, {"Retry-After": "1"})
+            authorization = self.headers.get("Authorization") or ""
+            if name != "token" and not authorization.startswith("Bearer "):
+                server.count("401")
+                return self.send_json(401, {"error": {"code": 401, "message": "Missing bearer token"}})
+            if name != "token" and authorization[len("Bearer "):] in server.revoked_tokens:
+                server.count("401")
+                return self.send_json(401, {"error": {"code": 401, "message": "Token expired"}})
+            server.simulate_latency()
+
+        params = {key: unquote(value) for key, value in match.groupdict().items()}
+        status, body = getattr(self, f"route_{name}")(**params)
+        headers = None
+        if method == "GET" and status == 200 and name != "stats":
+            # Conditional GETs: an unchanged answer is a 304 without a body
+            etag = '"%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                server.count("304")
+                return self.send_json(304, None, {"ETag": etag})
+            headers = {"ETag": etag}
+        self.send_json(status, body, headers)
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def paginate(self, items, items_key):
+        """Return one page of `items`; nextPageKey is the offset of the next page."""
+        offset = int(self.query.get("nextPageKey") or 0)
+        size = int(self.query.get("pageSize") or self.server.page_size)
+        page = {items_key: items[offset:offset + size], "totalCount": len(items)}
+        if offset + size < len(items):
+            page["nextPageKey"] = str(offset + size)
+        return 200, page
+
+    # Routes
+    def route_token(self):
+        with self.server.stats_lock:
+            self.server.token_counter += 1
+            number = self.server.token_counter
+        return 200, {"access_token": f"mock-token-{number}", "token_type": "Bearer", "expires_in": MOCK_TOKEN_TTL}
+
+    def route_user(self, account, email):
+        user = self.server.account.user_groups(email)
+        if user is None:
+            return 404, {"error": {"code": 404, "message": f"User {email} not found"}}
+        return 200, user
+
+    def route_groups(self, account):
+        return self.paginate(self.server.account.groups, "items")
+
+    def route_group_users(self, account, group):
+        members = self.server.account.group_members.get(group)
+        if members is None:
+            return 404, {"error": {"code": 404, "message": f"Group {group} not found"}}
+        return self.paginate(members, "items")
+
+    def route_bindings(self, level_type, level_id, group):
+        with self.server.account.lock:
+            bindings = list(self.server.account.bindings.get((level_type, level_id, group), []))
+        return 200, {"bindingsDetails": bindings}
+
+    def route_bindings_global(self, group):
+        return self.route_bindings("global", "global", group)
+
+    def route_bind(self, level_type, level_id, policy, group):
+        payload = json.loads(self.body or b"{}")
+        self.server.account.add_binding(
+            level_type, level_id, policy, group,
+            payload.get("parameters") or {}, payload.get("metadata") or {}, payload.get("boundaries") or []
+        )
+        return 204, None
+
+    def route_bind_global(self, policy, group):
+        return self.route_bind("global", "global", policy, group)
+
+    def route_policies(self, level_type, level_id):
+        policies = list(self.server.account.policies.get((level_type, level_id), {}).values())
+        name = self.query.get("name")
+        if name:
+            policies = [policy for policy in policies if name.lower() in policy["name"].lower()]
+        summaries = [{key: policy[key] for key in ("uuid", "name", "description", "category")} for policy in policies]
+        return self.paginate(summaries, "policies")
+
+    def route_policy(self, level_type, level_id, policy):
+        definition = self.server.account.policies.get((level_type, level_id), {}).get(policy)
+        if definition is None:
+            return 404, {"error": {"code": 404, "message": f"Policy {policy} not found"}}
+        return 200, definition
+
+    def route_stats(self):
+        with self.server.stats_lock:
+            return 200, dict(self.server.stats)
+
+    def route_reset(self):
+        with self.server.stats_lock:
+            self.server.stats.clear()
+        return 204, None
+
+
+def start_mock_server(account=None, host=MOCK_HOST, port=0, **options):
+    """Start a MockIamServer on a background thread (port 0 = any free port) and return it.
+
+    Call server.shutdown() to stop it. `options` are passed to MockIamServer.
+    """
+    server = MockIamServer((host, port), account or MockAccount(), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Dynatrace IAM/SSO API for benchmarks.")
+    parser.add_argument("--host", default=MOCK_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--groups", type=int, default=100, help="Number of groups")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users")
+    parser.add_argument("--policies", type=int, default=60, help="Number of policies (split across global/account/environment)")
+    parser.add_argument("--groups-per-user", type=int, default=3)
+    parser.add_argument("--policies-per-group", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=30, help="Mean response latency in milliseconds")
+    parser.add_argument("--rate-limit", type=int, help="Requests per second before answering 429")
+    parser.add_argument("--throttle-probability", type=float, default=0.0, help="Probability of a random 429")
+    parser.add_argument("--page-size", type=int, default=100, help="Default items per page on list endpoints")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    account = MockAccount(args.groups, args.users, args.policies, args.groups_per_user, args.policies_per_group, seed=args.seed)
+    server = MockIamServer(
+        (args.host, args.port), account, args.latency / 1000, args.rate_limit, args.throttle_probability, args.page_size
+    )
+    print(f"Mock IAM API on {server.base_url} (account {account.account_id}, environment {account.environment_id})")
+    print(f"  DT_API_BASE_URL={server.base_url} DT_SSO_TOKEN_URL={server.base_url}/sso/oauth2/token")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
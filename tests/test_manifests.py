@@ -0,0 +1,70 @@
+"""Tests for the manifest and target-file loaders."""
+import json
+
+import pytest
+
+import main
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_binding_manifest_json(tmp_path):
+    path = write(tmp_path, "bindings.json", json.dumps({"bindings": [
+        {"group": "Admins", "policy": "p1", "parameters": {"bucket": "logs"}, "boundaries": ["b1"]},
+        {"group": "", "policy": "p2"},
+    ]}))
+    assert main.load_binding_manifest(path) == [{
+        "group": "Admins", "policy": "p1", "scope": "environment",
+        "parameters": {"bucket": "logs"}, "metadata": {}, "boundaries": ["b1"],
+    }]
+
+
+def test_binding_manifest_csv(tmp_path):
+    path = write(tmp_path, "bindings.csv", "group,policy,scope,parameters,metadata,boundaries\nAdmins,p1,account,bucket=logs,,b1;b2\n")
+    [entry] = main.load_binding_manifest(path)
+    assert entry["scope"] == "account"
+    assert entry["parameters"] == {"bucket": "logs"}
+    assert entry["boundaries"] == ["b1", "b2"]
+
+
+@pytest.mark.parametrize("name, text, message", [
+    ("bad.yaml", "bindings:\n  - group: [a\n", "invalid YAML"),
+    ("bad.json", "[1, 2", "Expecting"),
+    ("bad.json", '"bindings"', "expected a list"),
+    ("bad.yaml", "- just a string\n", "entry 1 is not a mapping"),
+    ("bad.yaml", "- group: g\n  policy: p\n- group: g\n  policy: p\n  parameters: [1]\n", "entry 2: 'parameters'"),
+    ("bad.yaml", "- group: g\n  policy: p\n  metadata: text\n", "entry 1: 'metadata'"),
+    ("bad.json", '[{"group": "g", "policy": "p", "boundaries": "b1"}]', "entry 1: 'boundaries'"),
+])
+def test_malformed_binding_manifest_raises_value_error(tmp_path, name, text, message):
+    if name.endswith(".yaml") and main.yaml is None:
+        pytest.skip("PyYAML is not installed")
+    with pytest.raises(ValueError, match=message):
+        main.load_binding_manifest(write(tmp_path, name, text))
+
+
+def test_targets_file(tmp_path):
+    path = write(tmp_path, "targets.json", json.dumps({"accounts": [
+        {"account_id": "a1", "environments": ["e1", "e2"], "client_id": "id", "client_secret": "secret"},
+    ]}))
+    assert main.load_targets(path) == [
+        {"account_id": "a1", "environments": ["e1", "e2"], "client_id": "id", "client_secret": "secret"},
+    ]
+
+
+@pytest.mark.parametrize("name, text, message", [
+    ("bad.yaml", "accounts:\n  - account_id: [a\n", "invalid YAML"),
+    ("bad.json", '{"accounts": "a1"}', "expected a list"),
+    ("bad.yaml", "- a1\n", "entry 1 is not a mapping"),
+    ("bad.json", '[{"account_id": "a1", "environments": "e1"}]', "entry 1: 'environments'"),
+    ("bad.json", '[{"account_id": "a1", "environments": ["e1"]}, {"account_id": "a2"}]', "entry 2 needs"),
+])
+def test_malformed_targets_file_raises_value_error(tmp_path, name, text, message):
+    if name.endswith(".yaml") and main.yaml is None:
+        pytest.skip("PyYAML is not installed")
+    with pytest.raises(ValueError, match=message):
+        main.load_targets(write(tmp_path, name, text))
@@ -0,0 +1,239 @@
+"""Tests for the concurrent API paths against mock_server.py, started in-process.
+
+Each test gets a fresh mock account and empty caches; request counts come from the mock's stats.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+import mock_server
+
+PERMISSION = "storage:logs:read"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    account = mock_server.MockAccount(groups=12, users=60, policies=15, seed=7)
+    server = mock_server.start_mock_server(account, latency=0.01, page_size=10)
+    monkeypatch.setattr(main, "API_BASE_URL", server.base_url)
+    monkeypatch.setattr(main, "SSO_TOKEN_URL", f"{server.base_url}/sso/oauth2/token")
+    monkeypatch.setattr(main, "ACCOUNT_ID", account.account_id)
+    monkeypatch.setattr(main, "ENVIRONMENT_ID", account.environment_id)
+    # Client-side budgets off, so the tests run at mock speed (the buckets themselves are still used)
+    monkeypatch.setattr(main, "RATE_LIMIT_PER_SECOND", 10 ** 6)
+    monkeypatch.setattr(main, "RATE_LIMIT_BURST", 10 ** 6)
+    monkeypatch.setattr(main, "ENDPOINT_RATE_LIMITS", {})
+    for name in ("policy_cache", "membership_cache", "user_index_cache"):
+        monkeypatch.setattr(main, name, OrderedDict())
+    for name in ("policy_requests_in_flight", "group_directories", "group_directory_requests_in_flight",
+                 "reverse_indexes", "rate_limiters", "account_tokens", "token_accounts"):
+        monkeypatch.setattr(main, name, {})
+    main.clear_binding_caches()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def token(server):
+    return main.request_access_token("client", "secret")
+
+
+def stats(server):
+    with server.stats_lock:
+        return dict(server.stats)
+
+
+def account_policies(server):
+    account = server.account
+    return sorted(account.policies[("account", account.account_id)])
+
+
+def test_concurrent_policy_lookups_share_one_request(server, token):
+    policy_uuid = account_policies(server)[0]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda _: main.get_policy(token, "account", main.ACCOUNT_ID, policy_uuid), range(16)
+        ))
+
+    assert all(result["uuid"] == policy_uuid for result in results)
+    assert stats(server)["GET policy"] == 1
+    assert not main.policy_requests_in_flight
+
+
+def test_policy_cache_evicts_least_recently_used(server, token, monkeypatch):
+    monkeypatch.setattr(main, "POLICY_CACHE_MAX_SIZE", 2)
+    first, second, third = account_policies(server)[:3]
+    for policy_uuid in (first, second, first, third, first, second):
+        main.get_policy(token, "account", main.ACCOUNT_ID, policy_uuid)
+
+    # first stays cached (used most recently); second was evicted by third and fetched again
+    assert stats(server)["GET policy"] == 4
+    assert [key[2] for key in main.policy_cache] == [first, second]
+
+
+def test_concurrent_group_list_loads_share_one_download(server, token):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        directories = list(executor.map(lambda _: main.load_group_directory(token, main.ACCOUNT_ID), range(8)))
+
+    assert all(directory is directories[0] for directory in directories)
+    assert stats(server)["GET groups"] == 2  # One download of the two pages
+    assert not main.group_directory_requests_in_flight
+
+
+def test_list_endpoints_follow_next_page_key(server, token, monkeypatch):
+    groups = main.fetch_groups(token, main.ACCOUNT_ID)
+    assert [group["uuid"] for group in groups] == [group["uuid"] for group in server.account.groups]
+    assert stats(server)["GET groups"] == 2
+
+    # PAGE_SIZE is sent on the first request only; follow-ups carry just the page key
+    monkeypatch.setattr(main, "PAGE_SIZE", 5)
+    assert len(main.fetch_groups(token, main.ACCOUNT_ID)) == 12
+    assert stats(server)["GET groups"] == 2 + 2
+
+
+def test_429_is_retried_after_retry_after(server, token):
+    policies = account_policies(server)
+    server.rate_limit = 1  # The second request in the same second gets a 429 with Retry-After: 1
+    main.get_policy(token, "account", main.ACCOUNT_ID, policies[0])
+
+    started = time.monotonic()
+    policy = main.get_policy(token, "account", main.ACCOUNT_ID, policies[1])
+
+    assert policy["uuid"] == policies[1]
+    assert stats(server)["429"] >= 1
+    assert time.monotonic() - started >= 0.9
+
+
+def test_429_pauses_only_the_endpoint_bucket(server, token, monkeypatch):
+    monkeypatch.setattr(main, "MAX_RETRIES", 1)
+    monkeypatch.setattr(main, "RETRY_BACKOFF_MAX", 0.05)
+    server.throttle_probability = 1.0
+
+    with pytest.raises(main.ApiRequestError):
+        main.get_policy(token, "account", main.ACCOUNT_ID, account_policies(server)[0])
+
+    assert stats(server)["429"] == 2
+    now = time.monotonic()
+    assert main.get_rate_limiter("policies", main.ACCOUNT_ID).paused_until > now - 1
+    assert main.get_rate_limiter("global", main.ACCOUNT_ID).paused_until == 0
+    assert main.get_rate_limiter("users", main.ACCOUNT_ID).paused_until == 0
+
+
+def test_token_bucket_limits_rate_and_burst():
+    bucket = main.TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert 0 < bucket.try_acquire() <= 0.1
+
+    bucket.pause(0.5)
+    assert bucket.try_acquire() > 0.4
+
+
+def test_401_refreshes_the_token_once_for_all_threads(server, token):
+    server.revoked_tokens.add(token)
+    policies = account_policies(server)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda policy_uuid: main.get_policy(token, "account", main.ACCOUNT_ID, policy_uuid), policies
+        ))
+
+    assert [result["uuid"] for result in results] == policies
+    assert stats(server)["POST token"] == 2
+    assert 1 <= stats(server)["401"] <= len(policies)
+    # Callers keep the token they were handed; it maps to the account's new token
+    assert main.get_current_token(token) == main.account_tokens[main.ACCOUNT_ID]["token"] != token
+
+
+def test_refresh_backs_off_after_a_failure(server, token, monkeypatch):
+    monkeypatch.setattr(main, "MAX_RETRIES", 0)
+    server.throttle_probability = 1.0
+
+    assert main.refresh_access_token(token) is None
+    assert main.refresh_access_token(token) is None
+    assert stats(server)["POST token"] == 2  # The first token and one failed refresh
+
+    server.throttle_probability = 0.0
+    monkeypatch.setattr(main, "TOKEN_REFRESH_RETRY_DELAY", 0)
+    new_token = main.refresh_access_token(token)
+    assert new_token and new_token != token
+    assert "failed_at" not in main.account_tokens[main.ACCOUNT_ID]
+
+
+def test_refreshes_do_not_grow_the_token_map(server, token):
+    for _ in range(5):
+        main.refresh_access_token(main.account_tokens[main.ACCOUNT_ID]["token"])
+
+    assert len(main.token_accounts) == 2
+    assert main.get_token_account(token) == main.ACCOUNT_ID
+
+
+def test_find_permission_holders_matches_per_user_checks(server, token):
+    reverse_index = main.build_reverse_index(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID)
+    holders = main.find_permission_holders(reverse_index, PERMISSION, main.ENVIRONMENT_ID, include_denied=True)
+
+    expected = {}
+    for email in (user["email"] for user, _ in server.account.users.values()):
+        result = main.check_user_permission(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID, email, PERMISSION)
+        if result["grants"]:
+            expected[email] = result["decision"]
+    assert expected and {holder["email"]: holder["decision"] for holder in holders} == expected
+
+    # One crawl: every group's members and its bindings at three scopes, then served from the cache
+    counts = stats(server)
+    assert counts["GET group_users"] >= 12
+    assert counts["GET bindings"] + counts.get("GET bindings_global", 0) >= 12 * 3
+    assert main.build_reverse_index(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID) is reverse_index
+    assert stats(server)["GET group_users"] == counts["GET group_users"]
+
+
+def test_group_members_are_revalidated_by_etag(server, token, monkeypatch):
+    monkeypatch.setattr(main, "MEMBERSHIP_CACHE_TTL", 0)
+    # Page size 100: the member list fits on one page, so its ETag is kept
+    server.page_size = 100
+    group_id = server.account.groups[0]["uuid"]
+
+    users = main.get_group_members_cached(token, main.ACCOUNT_ID, group_id)
+    assert main.get_group_members_cached(token, main.ACCOUNT_ID, group_id) == users
+    assert stats(server)["GET group_users"] == 2
+    assert stats(server)["304"] == 1
+
+    main.get_group_members_cached(token, main.ACCOUNT_ID, group_id, refresh=True)
+    assert stats(server)["304"] == 1
+
+
+def test_async_client_matches_threaded_results(server, token):
+    async_client = pytest.importorskip("async_client")
+    pytest.importorskip("httpx")
+    email = next(iter(server.account.users))
+    expected = main.get_user_permissions(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID, email)
+    expected_holders = main.find_permission_holders(
+        main.build_reverse_index(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID), PERMISSION, main.ENVIRONMENT_ID
+    )
+
+    async def run():
+        async with async_client.AsyncIamClient() as client:
+            permissions = await client.get_user_permissions(main.ACCOUNT_ID, main.ENVIRONMENT_ID, email)
+            reverse_index = await client.build_reverse_index(main.ACCOUNT_ID, main.ENVIRONMENT_ID, refresh=True)
+            return permissions, main.find_permission_holders(reverse_index, PERMISSION, main.ENVIRONMENT_ID)
+
+    permissions, holders = asyncio.run(run())
+    assert permissions == expected
+    assert holders == expected_holders
+
+
+def test_offline_user_permissions_match_the_live_api(server, token, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SNAPSHOT_DB_PATH", str(tmp_path / "snapshot.db"))
+    assert main.sync_snapshot(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID)
+    email = next(iter(server.account.users))
+
+    live = main.get_user_permissions(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID, email, offline=False)
+    requests_made = sum(stats(server).values())
+    offline = main.get_user_permissions(token, main.ACCOUNT_ID, main.ENVIRONMENT_ID, email, offline=True)
+
+    assert offline == live
+    assert sum(stats(server).values()) == requests_made
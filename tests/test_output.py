@@ -0,0 +1,83 @@
+"""Tests for the streaming row writers (--format jsonl/csv/table)."""
+import csv
+import io
+import json
+
+import pytest
+
+import main
+
+FIELDS = ["email", "groups", "parameters", "conditions"]
+ROWS = [
+    {"email": "jane@example.com", "groups": ["Admins", "Ops"], "parameters": {"bucket": "logs"}, "conditions": None, "extra": 1},
+    {"email": "joe@example.com", "groups": [], "parameters": {}, "conditions": "storage:bucket-name = logs"},
+]
+
+
+def write(output_format, rows=ROWS, **kwargs):
+    output = io.StringIO()
+    with main.RowWriter(output, FIELDS, output_format, **kwargs) as writer:
+        count = writer.write(iter(rows))
+    assert count == writer.count == len(rows)
+    return output.getvalue()
+
+
+def test_jsonl_keeps_every_field():
+    lines = write("jsonl").splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+
+
+def test_csv_flattens_lists_and_dicts_to_json():
+    header, *rows = list(csv.reader(io.StringIO(write("csv"))))
+    assert header == FIELDS
+    assert rows == [
+        ["jane@example.com", '["Admins", "Ops"]', '{"bucket": "logs"}', ""],
+        ["joe@example.com", "[]", "{}", "storage:bucket-name = logs"],
+    ]
+
+
+def test_csv_header_is_written_without_rows():
+    assert write("csv", rows=[]).splitlines() == [",".join(FIELDS)]
+
+
+def test_table_uses_display_headers_and_json_cells():
+    text = write("table", headers=["Email", "Groups", "Parameters", "Conditions"])
+    assert "| Email " in text and "email" not in text.splitlines()[1]
+    assert '["Admins", "Ops"]' in text
+    assert '{"bucket": "logs"}' in text
+
+
+def test_table_is_printed_in_chunks(monkeypatch):
+    monkeypatch.setattr(main, "TABLE_CHUNK_SIZE", 2)
+    rows = [{"email": f"user{i}@example.com"} for i in range(5)]
+    text = write("table", rows=rows)
+    assert text.count("| email ") == 3  # One grid (with its header) per chunk of 2 rows
+    assert all(row["email"] in text for row in rows)
+
+
+def test_print_table_stream_counts_rows(monkeypatch):
+    monkeypatch.setattr(main, "TABLE_CHUNK_SIZE", 3)
+    output = io.StringIO()
+    assert main.print_table_stream(([i] for i in range(7)), ["n"], title="Numbers", file=output) == 7
+    assert output.getvalue().count("Numbers") == 1
+    assert main.print_table_stream(iter([]), ["n"], title="Nothing", file=output) == 0
+    assert "Nothing" not in output.getvalue()
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Unknown output format"):
+        main.RowWriter(io.StringIO(), FIELDS, "xml")
+
+
+def test_broken_pipe_on_a_file_is_raised_as_is():
+    class ClosedPipe(io.StringIO):
+        def write(self, text):
+            raise BrokenPipeError
+
+        def writelines(self, lines):
+            raise BrokenPipeError
+
+    writer = main.RowWriter(ClosedPipe(), FIELDS, "jsonl")
+    with pytest.raises(BrokenPipeError):
+        writer.write(ROWS)
+    assert writer.count == 0
@@ -0,0 +1,210 @@
+"""Tests for the effective-permission engine (menu Option 12 / `check`)."""
+import pytest
+
+import main
+
+ACCOUNT = "acct-1"
+ENV = "env-a"
+OTHER_ENV = "env-b"
+
+
+def policy(*statements):
+    return {"statements": [dict(statement) for statement in statements]}
+
+
+def allow(*permissions, conditions=()):
+    return {"effect": "ALLOW", "permissions": list(permissions), "conditions": list(conditions)}
+
+
+def deny(*permissions, conditions=()):
+    return {"effect": "DENY", "permissions": list(permissions), "conditions": list(conditions)}
+
+
+def binding(policy_uuid, level_type="account", level_id=ACCOUNT, parameters=None, boundaries=None, group_uuid=None):
+    return {
+        "policyUuid": policy_uuid, "levelType": level_type, "levelId": level_id,
+        "parameters": parameters or {}, "boundaries": boundaries or [], "groupUuid": group_uuid,
+    }
+
+
+def build(*pairs):
+    """Index (binding, policy definition) pairs."""
+    return main.index_grants([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+
+
+def decide(index, permission, environment_id=ENV, context=None):
+    return main.evaluate_permission(index, permission, environment_id, context)["decision"]
+
+
+def test_allow():
+    index = build((binding("p1"), policy(allow("storage:logs:read"))))
+    assert decide(index, "storage:logs:read") == "ALLOW"
+
+
+def test_not_allowed_without_grant():
+    index = build((binding("p1"), policy(allow("storage:logs:read"))))
+    assert decide(index, "storage:logs:write") == "NOT_ALLOWED"
+
+
+def test_deny_takes_precedence_over_allow():
+    index = build(
+        (binding("p1"), policy(allow("storage:logs:read"))),
+        (binding("p2", "global", "global"), policy(deny("storage:logs:read"))),
+    )
+    result = main.evaluate_permission(index, "storage:logs:read", ENV)
+    assert result["decision"] == "DENY"
+    assert [grant.policy_uuid for grant in result["grants"]] == ["p2"]
+
+
+def test_environment_grant_only_applies_to_its_environment():
+    index = build((binding("p1", "environment", ENV), policy(allow("storage:logs:read"))))
+    assert decide(index, "storage:logs:read", ENV) == "ALLOW"
+    assert decide(index, "storage:logs:read", OTHER_ENV) == "NOT_ALLOWED"
+
+
+def test_environment_deny_does_not_leak_into_other_environment():
+    index = build(
+        (binding("p1"), policy(allow("storage:logs:read"))),
+        (binding("p2", "environment", OTHER_ENV), policy(deny("storage:logs:read"))),
+    )
+    assert decide(index, "storage:logs:read", ENV) == "ALLOW"
+    assert decide(index, "storage:logs:read", OTHER_ENV) == "DENY"
+
+
+def test_wildcard_permissions():
+    index = build((binding("p1"), policy(allow("storage:*:read"), deny("settings:*"))))
+    assert decide(index, "storage:logs:read") == "ALLOW"
+    assert decide(index, "storage:logs:write") == "NOT_ALLOWED"
+    assert decide(index, "settings:schemas:read") == "DENY"
+    assert index["wildcard"] and not index["exact"]
+
+
+@pytest.mark.parametrize("context, expected", [
+    ({"storage:bucket-name": "logs"}, "ALLOW"),
+    ({"storage:bucket-name": "other"}, "NOT_ALLOWED"),
+    ({}, "CONDITIONAL"),
+])
+def test_conditions(context, expected):
+    condition = {"name": "storage:bucket-name", "operator": "=", "values": ["logs"]}
+    index = build((binding("p1"), policy(allow("storage:logs:read", conditions=[condition]))))
+    assert decide(index, "storage:logs:read", context=context) == expected
+
+
+@pytest.mark.parametrize("operator, value, expected", [
+    ("startsWith", "prod-eu", True),
+    ("startsWith", "dev-eu", False),
+    ("NOT-IN", "dev", True),
+    ("matches", "prod-1", True),
+    ("unknown-op", "prod", None),
+])
+def test_condition_operators(operator, value, expected):
+    values = ("prod*",) if operator == "matches" else ("prod",)
+    condition = ("storage:bucket-name", operator, values)
+    assert main.evaluate_condition(condition, {"storage:bucket-name": value}) is expected
+
+
+def test_bind_parameters_are_substituted_per_binding():
+    definition = policy(allow("storage:logs:read", conditions=[
+        {"name": "storage:bucket-name", "operator": "=", "values": ["${bindParam:bucket}"]},
+    ]))
+    index = build(
+        (binding("p1", parameters={"bucket": "team-a"}, group_uuid="g1"), definition),
+        (binding("p1", parameters={"bucket": "team-b"}, group_uuid="g2"), definition),
+    )
+    conditions = {grant.group_uuid: grant.conditions for grant in index["exact"]["storage:logs:read"]}
+    assert conditions == {
+        "g1": (("storage:bucket-name", "=", ("team-a",)),),
+        "g2": (("storage:bucket-name", "=", ("team-b",)),),
+    }
+    assert decide(index, "storage:logs:read", context={"storage:bucket-name": "team-b"}) == "ALLOW"
+    assert decide(index, "storage:logs:read", context={"storage:bucket-name": "team-c"}) == "NOT_ALLOWED"
+
+
+def test_missing_bind_parameter_is_left_in_place():
+    assert main.substitute_bind_parameters("${bindParam:bucket}", {}) == "${bindParam:bucket}"
+
+
+def test_boundaries_make_allow_conditional():
+    index = build((binding("p1", boundaries=["boundary-1"]), policy(allow("storage:logs:read"))))
+    result = main.evaluate_permission(index, "storage:logs:read", ENV)
+    assert result["decision"] == "CONDITIONAL"
+    assert result["grants"][0].boundaries == ("boundary-1",)
+
+
+def test_undecided_deny_blocks_allow():
+    condition = {"name": "storage:bucket-name", "operator": "=", "values": ["logs"]}
+    index = build(
+        (binding("p1"), policy(allow("storage:logs:read"))),
+        (binding("p2"), policy(deny("storage:logs:read", conditions=[condition]))),
+    )
+    assert decide(index, "storage:logs:read") == "CONDITIONAL"
+    assert decide(index, "storage:logs:read", context={"storage:bucket-name": "logs"}) == "DENY"
+    assert decide(index, "storage:logs:read", context={"storage:bucket-name": "other"}) == "ALLOW"
+
+
+def test_undecided_deny_alone_is_not_allowed():
+    condition = {"name": "storage:bucket-name", "operator": "=", "values": ["logs"]}
+    index = build((binding("p1"), policy(deny("storage:logs:read", conditions=[condition]))))
+    result = main.evaluate_permission(index, "storage:logs:read", ENV)
+    assert result["decision"] == "NOT_ALLOWED"
+    assert [grant.effect for grant in result["grants"]] == ["DENY"]
+
+
+def test_missing_policy_definitions_are_skipped():
+    index = main.index_grants([binding("gone"), binding("p1")], [None, policy(allow("storage:logs:read"))])
+    assert [grant.policy_uuid for grant in index["exact"]["storage:logs:read"]] == ["p1"]
+
+
+def test_compile_permission_index_fetches_each_bound_policy(monkeypatch):
+    definitions = {
+        ("account", ACCOUNT, "p1"): policy(allow("storage:logs:read")),
+        ("environment", OTHER_ENV, "p2"): policy(deny("storage:logs:read")),
+    }
+    monkeypatch.setattr(main, "get_policy", lambda token, level_type, level_id, uuid: definitions.get((level_type, level_id, uuid)))
+
+    bindings = [binding("p1"), binding("p2", "environment", OTHER_ENV), binding("missing")]
+    index = main.compile_permission_index("token", ACCOUNT, OTHER_ENV, bindings)
+    assert sorted(grant.policy_uuid for grant in index["exact"]["storage:logs:read"]) == ["p1", "p2"]
+    assert decide(index, "storage:logs:read", OTHER_ENV) == "DENY"
+
+
+def test_check_in_non_default_environment_uses_that_environments_bindings(monkeypatch):
+    """A check for another environment must resolve and cache that environment's bindings."""
+    bindings_by_environment = {
+        ENV: [binding("p1")],
+        OTHER_ENV: [binding("p1"), binding("p2", "environment", OTHER_ENV)],
+    }
+    definitions = {
+        "p1": policy(allow("storage:logs:read")),
+        "p2": policy(allow("settings:schemas:read")),
+    }
+    resolved = []
+
+    def resolve_user_bindings(access_token, account_id, environment_id, groups, binding_cache, executor):
+        resolved.append(environment_id)
+        return bindings_by_environment[environment_id]
+
+    monkeypatch.setattr(main, "ENVIRONMENT_ID", ENV)
+    monkeypatch.setattr(main, "user_index_cache", type(main.user_index_cache)())
+    monkeypatch.setattr(main, "fetch_user_groups", lambda *args, **kwargs: [{"uuid": "g1", "groupName": "Team"}])
+    monkeypatch.setattr(main, "resolve_user_bindings", resolve_user_bindings)
+    monkeypatch.setattr(main, "get_policy", lambda token, level_type, level_id, uuid: definitions.get(uuid))
+
+    check = lambda environment_id: main.check_user_permission(
+        "token", ACCOUNT, environment_id, "jane@example.com", "settings:schemas:read"
+    )["decision"]
+    assert check(OTHER_ENV) == "ALLOW"
+    assert check(ENV) == "NOT_ALLOWED"
+    assert check(OTHER_ENV) == "ALLOW"
+    assert resolved == [OTHER_ENV, ENV]
+
+
+def test_user_index_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(main, "user_index_cache", type(main.user_index_cache)())
+    monkeypatch.setattr(main, "USER_INDEX_CACHE_MAX_SIZE", 2)
+    for key in ("a", "b"):
+        main.cache_user_index(key, {"user": key})
+    assert main.get_cached_user_index("a") == {"user": "a"}
+    main.cache_user_index("c", {"user": "c"})
+    assert list(main.user_index_cache) == ["a", "c"]
+    assert main.get_cached_user_index("b") is None
@@ -0,0 +1,40 @@
+"""Tests for snapshot drift reports."""
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import main
+
+
+def make_snapshot(path, hashes):
+    with closing(main.open_snapshot(str(path))) as conn, conn:
+        conn.executemany(
+            "INSERT INTO entity_hashes (kind, entity_key, content_hash, synced_at) VALUES (?, ?, ?, 0)",
+            [(kind, key, digest) for (kind, key), digest in hashes.items()]
+        )
+    return str(path)
+
+
+def test_diff_snapshots_does_not_create_missing_files(tmp_path):
+    old = make_snapshot(tmp_path / "old.db", {})
+    missing = str(tmp_path / "missing.db")
+    with pytest.raises(ValueError, match="missing.db"):
+        main.diff_snapshots(old, missing)
+    assert not os.path.exists(missing)
+
+
+def test_diff_snapshots_rejects_other_databases(tmp_path):
+    other = str(tmp_path / "other.db")
+    with closing(sqlite3.connect(other)) as conn:
+        conn.execute("CREATE TABLE t (x)")
+    with pytest.raises(ValueError, match="other.db"):
+        main.diff_snapshots(other, other)
+
+
+def test_diff_snapshots_reports_only_changed_entities(tmp_path):
+    old = make_snapshot(tmp_path / "old.db", {("group", "g1"): "a", ("group", "g2"): "b"})
+    new = make_snapshot(tmp_path / "new.db", {("group", "g1"): "a", ("group", "g3"): "c"})
+    changes = [(delta["key"], delta["change"]) for delta in main.diff_snapshots(old, new)]
+    assert changes == [("g2", "removed"), ("g3", "added")]